@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Sync (WSGI) vs ASGI load benchmark for Farmer Connect
+
+Starts the app on a local threaded WSGI server and then under uvicorn, and
+drives the JSON APIs from concurrent clients while other clients follow the
+event stream (held open under ASGI, polled under WSGI) and repeatedly download
+earnings exports. Reports latency and throughput of the API requests in each
+mode. Needs uvicorn for the ASGI run.
+
+    python benchmarks/asgi_load.py --db benchmarks/bench.db --clients 32 --streams 200
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_benchmarks import BENCH_DIR, PASSWORDS, percentile, pick_samples
+
+class WSGIServer:
+    """The Flask app on werkzeug's threaded server, one thread per connection"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+class ASGIServer:
+    """app.asgi_app under uvicorn in a background thread"""
+
+    def __init__(self, application):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=0,
+                                                    lifespan='on', log_level='error'))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+def login(base_url, user, role):
+    """A urllib opener holding a signed-in session cookie"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    form = urllib.parse.urlencode({'username_or_email': user['email'], 'password': PASSWORDS[role]}).encode()
+    opener.open(f'{base_url}/auth/login', form).read()
+    return opener
+
+def fetch(opener, url, data=None):
+    """Status code of one request, reading the whole body"""
+    request = urllib.request.Request(url, data, {'Content-Type': 'application/json'} if data else {})
+    try:
+        with opener.open(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 599
+
+def hold_stream(opener, url, stop):
+    """Follow an event stream like EventSource until stop is set, reconnecting after its retry: delay"""
+    while not stop.is_set():
+        delay = 0.1
+        try:
+            with opener.open(url, timeout=5) as response:
+                for line in iter(response.readline, b''):
+                    if stop.is_set():
+                        break
+                    if line.startswith(b'retry:'):
+                        delay = int(line[6:]) / 1000
+        except OSError:
+            pass
+        stop.wait(delay)
+
+def run_mode(name, server, users, ids, args):
+    """Drive one server; returns the API latency summary"""
+    base_url = f'http://127.0.0.1:{server.port}'
+    openers = {role: login(base_url, users[role], role) for role in ('consumer', 'farmer')}
+    calls = [
+        ('consumer', '/api/notifications?since_id=0', None),
+        ('farmer', f"/farmer/api/orders/details?id={ids['farmer_order_id']}", None),
+        ('consumer', '/api/cart/add', json.dumps({'product_id': ids['product_id'], 'quantity': 1}).encode()),
+    ]
+
+    stop = threading.Event()
+    background = [threading.Thread(target=hold_stream, args=(openers['consumer'], f'{base_url}/api/events', stop),
+                                   daemon=True) for _ in range(args.streams)]
+    export_url = f'{base_url}/farmer/api/earnings/export/csv/year'
+    background += [threading.Thread(target=lambda: [fetch(openers['farmer'], export_url)
+                                                    for _ in iter(stop.is_set, True)], daemon=True)
+                   for _ in range(args.exports)]
+    for thread in background:
+        thread.start()
+    time.sleep(1)
+
+    timings, errors, lock = [], [0], threading.Lock()
+
+    def client():
+        for number in range(args.requests):
+            role, path, data = calls[number % len(calls)]
+            start = time.perf_counter()
+            status = fetch(openers[role], base_url + path, data)
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings.append(elapsed)
+                if status >= 400:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(args.clients)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    timings.sort()
+    return {
+        'mode': name,
+        'requests': len(timings),
+        'errors': errors[0],
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--scale', default='small', help='Dataset to generate when --db does not exist')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent API clients')
+    parser.add_argument('--requests', type=int, default=50, help='API requests per client')
+    parser.add_argument('--streams', type=int, default=100, help='Event streams held open during the run')
+    parser.add_argument('--exports', type=int, default=2, help='Clients downloading exports during the run')
+    parser.add_argument('--modes', default='wsgi,asgi', help='Comma-separated modes to run')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        import generate_data
+        generate_data.generate(args.db, **generate_data.SCALES[args.scale])
+
+    # The app opens its database at import time, so point it at the benchmark copy first
+    os.environ['DATABASE_URL'] = f'sqlite:///{args.db}'
+    import app as application
+    application.app.logger.disabled = True
+
+    users, ids, counts = pick_samples(args.db)
+    import sqlite3
+    conn = sqlite3.connect(args.db)
+    ids['farmer_order_id'] = conn.execute('SELECT MAX(order_id) FROM order_items WHERE farmer_id = ?',
+                                          (users['farmer']['id'],)).fetchone()[0]
+    conn.close()
+
+    print(f"{args.clients} clients x {args.requests} API requests, {args.streams} open streams, "
+          f"{args.exports} export clients ({counts['orders']} orders)")
+    print(f"{'mode':6} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'errors':>7}")
+    results = []
+    for mode in args.modes.split(','):
+        if mode == 'asgi':
+            try:
+                server = ASGIServer(application.asgi_app)
+            except ImportError:
+                print("asgi   skipped: pip install uvicorn")
+                continue
+        else:
+            server = WSGIServer(application.app)
+        try:
+            summary = run_mode(mode, server, users, ids, args)
+        finally:
+            server.close()
+        results.append(summary)
+        print(f"{mode:6} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f} {summary['p99_ms']:8.2f} "
+              f"{summary['throughput_rps']:8.1f} {summary['errors']:7d}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark: render a grid of 1,000 product cards
+
+Compares resolving ratings, wishlist membership and stock badges per product
+(the old one-helper-per-card approach) with the batched get_product_card_data
+mapping, counting the SQL statements each approach issues.
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+
+CARDS = int(os.environ.get('BENCH_CARDS', 1000))
+
+def build_database(path, cards):
+    """Create a throwaway database with one farmer, one consumer and N products"""
+    database.DATABASE = path
+    database.init_db()
+
+    conn = database.get_db_connection()
+    farmer_id = conn.execute('''
+        INSERT INTO users (username, email, password_hash, user_type, full_name,
+                           farm_name, location, is_approved)
+        VALUES ('bench_farmer', 'farmer@bench.local', 'x', 'farmer', 'Bench Farmer',
+                'Bench Farm', 'Pune', 1)
+    ''').lastrowid
+    consumer_id = conn.execute('''
+        INSERT INTO users (username, email, password_hash, user_type, full_name, is_approved)
+        VALUES ('bench_consumer', 'consumer@bench.local', 'x', 'consumer', 'Bench Consumer', 1)
+    ''').lastrowid
+
+    rng = random.Random(42)
+    conn.executemany('''
+        INSERT INTO products (farmer_id, name, description, category, price, unit,
+                              quantity, is_approved)
+        VALUES (?, ?, ?, ?, ?, 'kg', ?, 1)
+    ''', [(farmer_id, f'Product {i}', 'Fresh from the farm', rng.choice(['Vegetables', 'Fruits']),
+           rng.randint(10, 500), rng.randint(0, 50)) for i in range(cards)])
+
+    product_ids = [row[0] for row in conn.execute('SELECT id FROM products')]
+    conn.executemany('''
+        INSERT INTO reviews (product_id, consumer_id, order_id, rating) VALUES (?, ?, ?, ?)
+    ''', [(pid, consumer_id, n, rng.randint(1, 5)) for pid in product_ids for n in range(3)])
+    conn.executemany('INSERT INTO wishlists (user_id, product_id) VALUES (?, ?)',
+                     [(consumer_id, pid) for pid in product_ids[::7]])
+    conn.commit()
+    conn.close()
+    return consumer_id
+
+def count_queries():
+    """Wrap get_db_connection so every statement is counted"""
+    counter = {'queries': 0}
+    original = database.get_db_connection
+
+    def counting_connection():
+        conn = original()
+        conn.set_trace_callback(lambda statement: counter.__setitem__('queries', counter['queries'] + 1))
+        return conn
+
+    return counter, original, counting_connection
+
+def per_product_cards(products, user_id):
+    """The one-product-at-a-time approach the grid helpers were built for"""
+    from modules.utils import get_product_rating, get_product_availability_status
+
+    cards = {}
+    for product in products:
+        rating, review_count = get_product_rating(product['id'])
+        conn = database.get_db_connection()
+        in_wishlist = conn.execute(
+            'SELECT 1 FROM wishlists WHERE user_id = ? AND product_id = ?',
+            (user_id, product['id'])
+        ).fetchone() is not None
+        conn.close()
+        cards[product['id']] = {
+            'rating': rating,
+            'review_count': review_count,
+            'in_wishlist': in_wishlist,
+            'availability': get_product_availability_status(product)
+        }
+    return cards
+
+def main():
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    try:
+        consumer_id = build_database(path, CARDS)
+
+        from app import app
+        from flask import render_template, session
+        from modules.utils import get_product_card_data
+
+        conn = database.get_db_connection()
+        products = conn.execute('''
+            SELECT p.*, u.farm_name, u.location
+            FROM products p JOIN users u ON p.farmer_id = u.id
+        ''').fetchall()
+        conn.close()
+
+        print(f"Rendering {len(products)} product cards")
+        print("-" * 50)
+
+        for label, builder in (('per-product helpers', per_product_cards),
+                               ('batched mapping', get_product_card_data)):
+            counter, original, counting_connection = count_queries()
+            database.get_db_connection = counting_connection
+            try:
+                with app.test_request_context('/products'):
+                    session['user_id'] = consumer_id
+                    session['user_type'] = 'consumer'
+
+                    start = time.perf_counter()
+                    cards = builder(products, consumer_id)
+                    lookup_time = time.perf_counter() - start
+                    html = render_template('products.html', products=products,
+                                           product_cards=cards, categories=[], locations=[])
+                    total_time = time.perf_counter() - start
+            finally:
+                database.get_db_connection = original
+
+            print(f"{label:22} lookups {lookup_time * 1000:8.1f} ms   "
+                  f"lookups+render {total_time * 1000:8.1f} ms   "
+                  f"queries {counter['queries']:5d}   html {len(html) // 1024} KB")
+
+    finally:
+        database.DATABASE = 'farmer_connect.db'
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for Farmer Connect
+
+Starts a fresh Python process per trial, imports the app and times the first
+request to the home page, the product listing and each dashboard. Trials run
+with no template cache, with a populated Jinja bytecode cache, and with the
+bytecode cache plus startup warm-up, so the first-hit cost of compiling
+templates shows up directly.
+
+    python benchmarks/cold_start.py --db benchmarks/bench.db --trials 5
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import statistics
+import subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# (name, role, path) requested once each, in order, by every cold worker
+ROUTES = [
+    ('home', None, '/'),
+    ('products', None, '/products'),
+    ('consumer_dashboard', 'consumer', '/consumer/dashboard'),
+    ('farmer_dashboard', 'farmer', '/farmer/dashboard'),
+    ('admin_dashboard', 'admin', '/admin/dashboard'),
+]
+
+# (name, use bytecode cache, warm up at startup)
+MODES = [
+    ('no_cache', False, False),
+    ('bytecode_cache', True, False),
+    ('bytecode_cache_warmup', True, True),
+]
+
+def child(db):
+    """Runs inside the fresh process: import the app, then time each first request"""
+    import time
+    import contextlib
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from app import app
+    timings = {'import_ms': (time.perf_counter() - started) * 1000}
+
+    from run_benchmarks import TestClientDriver, pick_samples
+    users, _, _ = pick_samples(db)
+    driver = TestClientDriver(app, users)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, role, path in ROUTES:
+            start = time.perf_counter()
+            driver.get(role, path)
+            timings[name] = (time.perf_counter() - start) * 1000
+    print(json.dumps(timings))
+
+def run_trial(db, cache_dir, warmup):
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{db}',
+               TEMPLATE_CACHE_DIR=cache_dir or '',
+               TEMPLATE_WARMUP='1' if warmup else '0',
+               PYTHONDONTWRITEBYTECODE='1')
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--db', db],
+                            cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--scale', default='small', help='Dataset to generate when --db does not exist')
+    parser.add_argument('--trials', type=int, default=3, help='Fresh processes per mode')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)
+
+    if args.child:
+        child(args.db)
+        return
+
+    if not os.path.exists(args.db):
+        import generate_data
+        generate_data.generate(args.db, **generate_data.SCALES[args.scale])
+
+    cache_dir = tempfile.mkdtemp(prefix='jinja-cache-')
+    results = {}
+    try:
+        # Populate the bytecode cache once, as a previous worker would have
+        run_trial(args.db, cache_dir, True)
+
+        columns = ['import_ms'] + [name for name, _, _ in ROUTES]
+        print(f"Median of {args.trials} cold workers against {args.db} (ms)")
+        print(f"{'mode':24}" + ''.join(f'{column[:18]:>19}' for column in columns))
+        for mode, use_cache, warmup in MODES:
+            trials = [run_trial(args.db, cache_dir if use_cache else None, warmup)
+                      for _ in range(args.trials)]
+            results[mode] = {column: round(statistics.median(t[column] for t in trials), 1)
+                             for column in columns}
+            print(f'{mode:24}' + ''.join(f'{results[mode][column]:19.1f}' for column in columns))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the template date filters
+
+Renders a 10,000-row order table through Jinja with the previous strptime-based
+date_format filter and with modules.dates, for a date-only and a date-and-time
+format, and reports the render time of each.
+
+    python benchmarks/date_filters.py --rows 10000 --repeat 5
+"""
+
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+from timeit import repeat
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment
+from modules import dates
+
+TEMPLATE = '''{% for row in rows %}<tr><td>{{ row.order_number }}</td>
+<td>{{ row.created_at|date_format(fmt) }}</td></tr>
+{% endfor %}'''
+
+FORMATS = [('date', '%b %d, %Y'), ('date_time', '%d %b %Y, %I:%M %p')]
+
+def legacy_format_date(date_string, format_string='%b %d, %Y'):
+    """The filter as it was: up to three strptime attempts per call"""
+    if not date_string:
+        return 'Unknown'
+    if hasattr(date_string, 'strftime'):
+        return date_string.strftime(format_string)
+    try:
+        dt = datetime.strptime(str(date_string), '%Y-%m-%d %H:%M:%S')
+        return dt.strftime(format_string)
+    except (ValueError, TypeError):
+        try:
+            dt = datetime.strptime(str(date_string), '%Y-%m-%d')
+            return dt.strftime(format_string)
+        except (ValueError, TypeError):
+            try:
+                dt = datetime.strptime(str(date_string), '%Y-%m-%d %H:%M:%S.%f')
+                return dt.strftime(format_string)
+            except (ValueError, TypeError):
+                return str(date_string)
+
+def make_rows(count, days=90, seed=7):
+    """Orders spread over the last few months, as SQLite returns them"""
+    rng = random.Random(seed)
+    now = datetime(2024, 6, 1)
+    return [{'order_number': f'FC{i:08d}',
+             'created_at': (now - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')}
+            for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='Renders per variant; the best is reported')
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    variants = [('strptime', legacy_format_date), ('dates', dates.format_date)]
+    print(f"Rendering {args.rows} rows, best of {args.repeat} (ms)")
+    print(f"{'format':12}" + ''.join(f'{name:>12}' for name, _ in variants) + f"{'speedup':>10}")
+    for label, fmt in FORMATS:
+        timings = []
+        for _, filter_func in variants:
+            env = Environment()
+            env.filters['date_format'] = filter_func
+            template = env.from_string(TEMPLATE)
+            # Same starting state for each variant; later renders see a warm cache, as a worker would
+            dates.parse_timestamp.cache_clear()
+            dates._format_cached.cache_clear()
+            timings.append(min(repeat(lambda: template.render(rows=rows, fmt=fmt),
+                                      number=1, repeat=args.repeat)) * 1000)
+        print(f'{label:12}' + ''.join(f'{ms:12.1f}' for ms in timings) + f'{timings[0] / timings[1]:9.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic data generator for Farmer Connect
+
+Builds a database with N farmers, consumers, products and orders. Product
+popularity and consumer activity follow a Zipf-like skew so a few items and
+customers dominate, as in real shops. Everything is written with bulk
+inserts inside a single transaction.
+
+    python benchmarks/generate_data.py --scale medium --db bench.db
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import itertools
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from modules import database
+from modules.geo import load_gazetteer
+
+# Password shared by every generated account
+PASSWORD = 'password123'
+
+SCALES = {
+    'small': {'farmers': 20, 'consumers': 200, 'products_per_farmer': 10, 'orders': 2000},
+    'medium': {'farmers': 200, 'consumers': 5000, 'products_per_farmer': 15, 'orders': 50000},
+    'large': {'farmers': 1000, 'consumers': 50000, 'products_per_farmer': 20, 'orders': 500000},
+}
+
+CATALOG = {
+    'Vegetables': ['Tomato', 'Potato', 'Onion', 'Brinjal', 'Okra', 'Cauliflower', 'Cabbage', 'Carrot'],
+    'Fruits': ['Mango', 'Banana', 'Papaya', 'Guava', 'Pomegranate', 'Grapes', 'Orange', 'Apple'],
+    'Grains': ['Basmati Rice', 'Sona Masoori Rice', 'Wheat', 'Jowar', 'Bajra', 'Ragi'],
+    'Dairy': ['Cow Milk', 'Buffalo Milk', 'Paneer', 'Curd', 'Ghee', 'Butter'],
+    'Herbs': ['Coriander', 'Mint', 'Curry Leaves', 'Fenugreek', 'Basil'],
+    'Spices': ['Turmeric', 'Red Chilli', 'Cumin', 'Coriander Seeds', 'Black Pepper'],
+}
+
+VARIETIES = ['Organic', 'Desi', 'Hybrid', 'Premium', 'Farm Fresh', 'Hill Grown', 'Sun Dried', 'Local']
+
+UNITS = {'Vegetables': 'kg', 'Fruits': 'kg', 'Grains': 'kg', 'Dairy': 'litre', 'Herbs': 'bunch', 'Spices': 'kg'}
+
+STATUSES = ['delivered'] * 70 + ['shipped'] * 8 + ['processing'] * 5 + ['confirmed'] * 5 + \
+           ['pending'] * 7 + ['cancelled'] * 5
+
+def zipf_weights(n, s=1.1):
+    """Cumulative Zipf weights for picking item i with probability ~ 1/(i+1)^s"""
+    return list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+def timestamp(dt):
+    """SQLite CURRENT_TIMESTAMP-style string"""
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def generate(path, farmers, consumers, products_per_farmer, orders, seed=42, days=365):
+    """Create a fresh database at path and fill it; returns row counts per table"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    database.DATABASE = path
+    database.init_db()
+
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    password_hash = generate_password_hash(PASSWORD)
+    places = list(load_gazetteer()[2].items())
+
+    conn = database.get_db_connection()
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+
+    def random_time(start_days_ago=days):
+        # Bias towards recent dates so the shop looks like it is growing
+        return now - timedelta(seconds=int(start_days_ago * 86400 * rng.random() ** 1.5))
+
+    # Users
+    first_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+    user_rows = []
+    for i in range(farmers):
+        place, (lat, lon) = rng.choice(places)
+        user_rows.append((f'farmer{i}', f'farmer{i}@example.com', password_hash, 'farmer',
+                          f'Farmer {i}', f'9{rng.randint(100000000, 999999999)}', place.title(),
+                          f'{place.title()} Farm {i}', 'Family run farm', 1,
+                          lat + rng.uniform(-0.2, 0.2), lon + rng.uniform(-0.2, 0.2),
+                          timestamp(random_time())))
+    for i in range(consumers):
+        place, (lat, lon) = rng.choice(places)
+        user_rows.append((f'consumer{i}', f'consumer{i}@example.com', password_hash, 'consumer',
+                          f'Consumer {i}', f'8{rng.randint(100000000, 999999999)}', place.title(),
+                          None, None, 1, lat + rng.uniform(-0.1, 0.1), lon + rng.uniform(-0.1, 0.1),
+                          timestamp(random_time())))
+    conn.executemany('''
+        INSERT INTO users (username, email, password_hash, user_type, full_name, phone, location,
+                           farm_name, farm_description, is_approved, latitude, longitude, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', user_rows)
+    farmer_ids = list(range(first_id, first_id + farmers))
+    consumer_ids = list(range(first_id + farmers, first_id + farmers + consumers))
+
+    # Products
+    first_product = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM products').fetchone()[0]
+    product_rows = []
+    for farmer_id in farmer_ids:
+        for _ in range(products_per_farmer):
+            category = rng.choice(list(CATALOG))
+            name = f"{rng.choice(VARIETIES)} {rng.choice(CATALOG[category])}"
+            product_rows.append((farmer_id, name, f'{name} grown without middlemen', category,
+                                 rng.randint(20, 800), UNITS[category],
+                                 0 if rng.random() < 0.05 else rng.randint(1, 500),
+                                 1 if rng.random() < 0.95 else 0, 1 if rng.random() < 0.05 else 0,
+                                 1 if 'Organic' in name else 0, timestamp(random_time())))
+    conn.executemany('''
+        INSERT INTO products (farmer_id, name, description, category, price, unit, quantity,
+                              is_approved, is_featured, organic, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', product_rows)
+    products = [(first_product + i, row[0], row[4]) for i, row in enumerate(product_rows)]
+
+    # Orders with skewed product popularity and consumer activity
+    product_order = products[:]
+    rng.shuffle(product_order)
+    product_weights = zipf_weights(len(product_order))
+    consumer_order = consumer_ids[:]
+    rng.shuffle(consumer_order)
+    consumer_weights = zipf_weights(len(consumer_order), s=0.8)
+
+    first_order = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM orders').fetchone()[0]
+    order_rows, item_rows, delivered = [], [], []
+    order_times = sorted(random_time() for _ in range(orders))
+    for n, created_at in enumerate(order_times):
+        order_id = first_order + n
+        consumer_id = rng.choices(consumer_order, cum_weights=consumer_weights)[0]
+        basket = {p[0]: p for p in rng.choices(product_order, cum_weights=product_weights,
+                                               k=rng.randint(1, 5))}
+        total = 0
+        for product_id, farmer_id, price in basket.values():
+            quantity = rng.randint(1, 5)
+            total += quantity * price
+            item_rows.append((order_id, product_id, farmer_id, quantity, price, quantity * price,
+                              timestamp(created_at)))
+        status = rng.choice(STATUSES)
+        payment_status = 'paid' if status in ('delivered', 'shipped') else \
+            'refunded' if status == 'cancelled' else 'pending'
+        order_rows.append((f'FC{created_at:%Y%m%d}{order_id:08d}', consumer_id, total, status,
+                           payment_status, rng.choice(['cod', 'upi', 'online']),
+                           f'House {rng.randint(1, 500)}, Sector {rng.randint(1, 60)}',
+                           timestamp(created_at), timestamp(created_at + timedelta(hours=rng.randint(1, 96)))))
+        if status == 'delivered':
+            delivered.append((order_id, consumer_id, list(basket.values()), created_at))
+    conn.executemany('''
+        INSERT INTO orders (order_number, consumer_id, total_amount, status, payment_status,
+                            payment_method, delivery_address, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', order_rows)
+    conn.executemany('''
+        INSERT INTO order_items (order_id, product_id, farmer_id, quantity, price, subtotal, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', item_rows)
+
+    # Reviews and farmer ratings for a share of delivered orders
+    review_rows, rating_rows = [], []
+    for order_id, consumer_id, items, created_at in delivered:
+        if rng.random() > 0.3:
+            continue
+        reviewed_at = timestamp(created_at + timedelta(days=rng.randint(2, 10)))
+        for product_id, farmer_id, _ in items:
+            review_rows.append((product_id, consumer_id, order_id, rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 10])[0],
+                                'Good quality produce', reviewed_at))
+        for farmer_id in {item[1] for item in items}:
+            rating_rows.append((farmer_id, consumer_id, order_id, rng.choices([1, 2, 3, 4, 5], [1, 1, 2, 6, 8])[0],
+                                reviewed_at))
+    conn.executemany('''
+        INSERT INTO reviews (product_id, consumer_id, order_id, rating, comment, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', review_rows)
+    conn.executemany('''
+        INSERT INTO farmer_ratings (farmer_id, consumer_id, order_id, rating, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rating_rows)
+
+    # Notifications, wishlists and carts
+    notification_rows = []
+    for n, row in enumerate(order_rows):
+        order_id = first_order + n
+        notification_rows.append((row[1], 'Order Update', f'Your order #{order_id} has been updated',
+                                  'order', f'/consumer/orders/{order_id}', 1 if rng.random() < 0.8 else 0))
+    for order_id, product_id, farmer_id, *_ in item_rows[::3]:
+        notification_rows.append((farmer_id, 'New Order Received', 'You have received a new order',
+                                  'order', f'/farmer/orders/{order_id}', 1 if rng.random() < 0.6 else 0))
+    conn.executemany('''
+        INSERT INTO notifications (user_id, title, message, type, link, is_read)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', notification_rows)
+
+    wishlist_rows = {(rng.choice(consumer_ids), rng.choices(product_order, cum_weights=product_weights)[0][0])
+                     for _ in range(consumers * 2)}
+    conn.executemany('INSERT INTO wishlists (user_id, product_id) VALUES (?, ?)', wishlist_rows)
+    cart_rows = {(consumer_id, rng.choices(product_order, cum_weights=product_weights)[0][0])
+                 for consumer_id in rng.sample(consumer_ids, min(len(consumer_ids), consumers // 5))}
+    conn.executemany('INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, 1)', cart_rows)
+
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+    return {'users': len(user_rows), 'products': len(product_rows), 'orders': len(order_rows),
+            'order_items': len(item_rows), 'reviews': len(review_rows), 'farmer_ratings': len(rating_rows),
+            'notifications': len(notification_rows), 'wishlists': len(wishlist_rows), 'cart_items': len(cart_rows)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default='benchmarks/bench.db', help='Database file to (re)create')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--farmers', type=int)
+    parser.add_argument('--consumers', type=int)
+    parser.add_argument('--products-per-farmer', type=int)
+    parser.add_argument('--orders', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    print(f"Generating {args.scale} dataset into {args.db}: {sizes}")
+    start = time.perf_counter()
+    counts = generate(args.db, seed=args.seed, **sizes)
+    print(f"Inserted rows in {time.perf_counter() - start:.1f}s: {counts}")
+
+    from modules.recommendations import refresh_recommendations, refresh_related_products
+    start = time.perf_counter()
+    refresh_recommendations(full=True)
+    refresh_related_products()
+    print(f"Built recommendation tables in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark for password hashing during a login burst
+
+Verifies `--logins` passwords from `--threads` request threads, first hashing
+in the threads themselves and then through the passwords process pool, and
+reports logins per second (overall and per core), the latency of a cheap
+in-process request running alongside the burst, and how many logins a
+pool with a small queue turns away.
+
+    python benchmarks/password_hashing.py --logins 200 --threads 16
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from modules import passwords
+
+def cheap_request():
+    """Stand-in for a catalog page: a little pure-Python work"""
+    return sum(i * i for i in range(2000))
+
+def burst(password_hash, logins, threads):
+    """(seconds, logins verified, logins rejected, cheap-request p95 ms) for one burst"""
+    rejected = [0]
+    done = threading.Event()
+    latencies = []
+
+    def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            cheap_request()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    def login(_):
+        try:
+            assert passwords.verify_password(password_hash, 'market123')
+        except passwords.HashingBusy:
+            rejected[0] += 1
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+    return elapsed, logins - rejected[0], rejected[0], p95
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing processes')
+    parser.add_argument('--method', default=passwords.DEFAULT_METHOD)
+    args = parser.parse_args()
+
+    password_hash = generate_password_hash('market123', args.method)
+    cores = min(args.workers, os.cpu_count() or 1)
+    runs = [
+        ('in request threads', dict(workers=0), 1),
+        (f'pool ({args.workers} workers)', dict(workers=args.workers, queue=args.threads), cores),
+        ('pool, queue of 2', dict(workers=args.workers, queue=2), cores),
+    ]
+
+    print(f"{args.method}, {args.logins} logins from {args.threads} threads")
+    print(f"{'mode':24} {'logins/s':>9} {'per core':>9} {'rejected':>9} {'cheap p95 ms':>13}")
+    for name, config, used in runs:
+        passwords.configure(method=args.method, **config)
+        if config['workers']:
+            # Start the worker processes before timing
+            passwords.verify_password(password_hash, 'market123')
+        elapsed, verified, rejected, p95 = burst(password_hash, args.logins, args.threads)
+        rate = verified / elapsed
+        print(f'{name:24} {rate:9.1f} {rate / used:9.1f} {rejected:9d} {p95:13.2f}')
+    passwords.shutdown()
+
+if __name__ == '__main__':
+    main()
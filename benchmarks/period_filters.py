@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for period filters on a large orders table
+
+Builds a standalone orders table (5M rows by default, spread over three years)
+with the created_at indexes from init_db, then times each period query written
+with DATE()/strftime() expressions against the same query using the half-open
+ranges from dates.period_filter, and shows both query plans.
+
+    python benchmarks/period_filters.py --rows 5000000 --db benchmarks/periods.db
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.dates import period_filter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (period, expression-based filter as previously written in the views)
+EXPRESSIONS = [
+    ('today', "AND DATE(created_at) = DATE('now')"),
+    ('week', "AND DATE(created_at) >= DATE('now', '-7 days')"),
+    ('month', "AND strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')"),
+    ('year', "AND strftime('%Y', created_at) = strftime('%Y', 'now')"),
+]
+
+QUERY = "SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM orders WHERE payment_status = 'paid' {}"
+
+def build(path, rows, days=3 * 365):
+    """Orders table with created_at spread uniformly over the last `days` days"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        DROP TABLE IF EXISTS orders;
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            total_amount DECIMAL(10,2) NOT NULL,
+            payment_status VARCHAR(20) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    started = time.perf_counter()
+    conn.execute(f'''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO orders (id, total_amount, payment_status, created_at)
+        SELECT i, 100 + abs(random() % 5000),
+               CASE WHEN abs(random() % 10) < 8 THEN 'paid' ELSE 'pending' END,
+               datetime('now', '-' || abs(random() % ({days} * 86400)) || ' seconds')
+        FROM n
+    ''', (rows,))
+    conn.execute('CREATE INDEX idx_orders_created ON orders (created_at)')
+    conn.execute('CREATE INDEX idx_orders_payment_created ON orders (payment_status, created_at)')
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    print(f"Built {rows} orders in {time.perf_counter() - started:.1f}s")
+
+def timed(conn, sql, params, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = conn.execute(sql, params).fetchone()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+def plan(conn, sql, params):
+    return '; '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'periods.db'))
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per query; the best is reported')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the table even if it exists')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    existing = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'orders'").fetchone()[0]
+    count = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] if existing else 0
+    conn.close()
+    if args.rebuild or count != args.rows:
+        build(args.db, args.rows)
+
+    conn = sqlite3.connect(args.db)
+    now = datetime.utcnow()
+    print(f"{'period':8} {'expression ms':>14} {'range ms':>10} {'speedup':>8}  plan (range)")
+    for period, expression in EXPRESSIONS:
+        old_result, old_ms = timed(conn, QUERY.format(expression), [], args.repeat)
+        condition, params = period_filter('created_at', period, now)
+        new_result, new_ms = timed(conn, QUERY.format(condition), params, args.repeat)
+        assert old_result == new_result, (period, old_result, new_result)
+        print(f'{period:8} {old_ms:14.1f} {new_ms:10.1f} {old_ms / new_ms:7.0f}x  {plan(conn, QUERY.format(condition), params)}')
+    print(f"\nExpression plan: {plan(conn, QUERY.format(EXPRESSIONS[2][1]), [])}")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Memory and fetch-time comparison of row shapes
+
+Fetches the earnings report join (every paid order item with its order,
+product and customer) from a benchmark database in each row shape and
+reports the bytes per row spent on row containers (exact, from sys.getsizeof),
+the bytes retained overall including values (tracemalloc, approximate because
+of interpreter free lists) and the fetch time.
+
+    python benchmarks/row_memory.py --db benchmarks/bench.db
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import rows
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUERY = '''
+    SELECT o.order_number, o.created_at, o.payment_status,
+           p.name as product_name, p.category, p.unit,
+           oi.quantity, oi.price, oi.subtotal,
+           u.full_name as consumer_name
+    FROM orders o
+    JOIN order_items oi ON o.id = oi.order_id
+    JOIN products p ON oi.product_id = p.id
+    JOIN users u ON o.consumer_id = u.id
+    WHERE o.payment_status = 'paid'
+    ORDER BY o.created_at DESC
+'''
+
+def fetch_rows(conn):
+    conn.row_factory = sqlite3.Row
+    result = conn.execute(QUERY).fetchall()
+    conn.row_factory = None
+    return result
+
+def fetch_dicts(conn):
+    return [dict(row) for row in fetch_rows(conn)]
+
+SHAPES = [
+    ('sqlite3.Row', fetch_rows),
+    ('dict(row)', fetch_dicts),
+    ('tuples', lambda conn: rows.fetch_tuples(conn, QUERY)),
+    ('records', lambda conn: rows.fetch_records(conn, QUERY)),
+    ('columns', lambda conn: rows.fetch_columns(conn, QUERY)),
+]
+
+def container_bytes(result):
+    """Bytes held by the lists, rows and dicts themselves, excluding the values"""
+    if isinstance(result, dict):
+        return sys.getsizeof(result) + sum(sys.getsizeof(column) for column in result.values())
+    if isinstance(result, tuple):
+        result = result[1]
+    total = sys.getsizeof(result)
+    for row in result:
+        total += sys.getsizeof(row)
+        if isinstance(row, sqlite3.Row):
+            # A Row wraps a tuple of its values
+            total += sys.getsizeof(tuple(row))
+    return total
+
+def measure(conn, fetch):
+    """(rows, container bytes, bytes retained, seconds) for one fetch"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fetch(conn)
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if isinstance(result, dict):
+        count = len(next(iter(result.values()), []))
+    elif isinstance(result, tuple):
+        count = len(result[1])
+    else:
+        count = len(result)
+    return count, container_bytes(result), retained, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--scale', default='small', help='Dataset to generate when --db does not exist')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        import generate_data
+        generate_data.generate(args.db, **generate_data.SCALES[args.scale])
+
+    conn = sqlite3.connect(args.db)
+    print(f"{'shape':14} {'rows':>8} {'container B/row':>16} {'retained B/row':>15} {'fetch ms':>9}")
+    for name, fetch in SHAPES:
+        # Warm the page cache so every shape reads from memory
+        fetch(conn)
+        count, containers, retained, elapsed = measure(conn, fetch)
+        count = max(count, 1)
+        print(f'{name:14} {count:8d} {containers / count:16.0f} {retained / count:15.0f} {elapsed * 1000:9.1f}')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
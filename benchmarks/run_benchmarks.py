@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Load-test benchmark suite for Farmer Connect
+
+Drives every hot route through the Flask test client (or a local WSGI server
+with --wsgi) against a synthetic database and reports p50/p95/p99 latency,
+SQL statements per request and throughput. Results are written to a JSON
+baseline; --compare checks a run against an earlier baseline and exits
+non-zero on regressions.
+
+    python benchmarks/generate_data.py --scale medium --db benchmarks/bench.db
+    python benchmarks/run_benchmarks.py --db benchmarks/bench.db --output benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --db benchmarks/bench.db --compare benchmarks/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import sqlite3
+import argparse
+import platform
+import contextlib
+import threading
+import http.cookiejar
+import urllib.parse
+import urllib.request
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (name, role, path) - paths are formatted with the sample ids picked from the data
+ROUTES = [
+    ('home', None, '/'),
+    ('products', None, '/products'),
+    ('products_category', None, '/products?category=Vegetables&sort_by=price_low'),
+    ('products_search', None, '/products?search=Mango'),
+    ('products_near', None, '/products?near=Pune&radius=100&sort_by=distance'),
+    ('product_detail', None, '/product/{product_id}'),
+    ('consumer_dashboard', 'consumer', '/consumer/dashboard'),
+    ('consumer_cart', 'consumer', '/consumer/cart'),
+    ('consumer_orders', 'consumer', '/consumer/orders'),
+    ('consumer_order_detail', 'consumer', '/consumer/orders/{consumer_order_id}'),
+    ('consumer_wishlist', 'consumer', '/consumer/wishlist'),
+    ('consumer_notifications', 'consumer', '/consumer/notifications'),
+    ('farmer_dashboard', 'farmer', '/farmer/dashboard'),
+    ('farmer_products', 'farmer', '/farmer/products'),
+    ('farmer_orders', 'farmer', '/farmer/orders'),
+    ('farmer_earnings', 'farmer', '/farmer/earnings'),
+    ('farmer_inventory', 'farmer', '/farmer/inventory'),
+    ('admin_dashboard', 'admin', '/admin/dashboard'),
+    ('admin_analytics', 'admin', '/admin/analytics'),
+    ('admin_orders', 'admin', '/admin/orders'),
+    ('admin_products', 'admin', '/admin/products'),
+    ('admin_farmers', 'admin', '/admin/farmers'),
+    ('admin_consumers', 'admin', '/admin/consumers'),
+    ('admin_reports', 'admin', '/admin/reports'),
+]
+
+PASSWORDS = {'admin': 'admin123', 'farmer': 'password123', 'consumer': 'password123'}
+
+def install_query_counter():
+    """Count SQL statements issued by every connection opened from now on"""
+    counter = {'queries': 0}
+    connect = sqlite3.connect
+
+    def trace(statement):
+        if not statement.startswith(('BEGIN', 'COMMIT', 'ROLLBACK')):
+            counter['queries'] += 1
+
+    def counting_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(trace)
+        return conn
+
+    sqlite3.connect = counting_connect
+    return counter
+
+def pick_samples(path):
+    """The busiest consumer and farmer plus ids used in parameterised routes"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    consumer = conn.execute('''
+        SELECT u.* FROM users u JOIN orders o ON o.consumer_id = u.id
+        WHERE u.user_type = 'consumer' GROUP BY u.id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()
+    farmer = conn.execute('''
+        SELECT u.* FROM users u JOIN order_items oi ON oi.farmer_id = u.id
+        WHERE u.user_type = 'farmer' GROUP BY u.id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()
+    admin = conn.execute("SELECT * FROM users WHERE user_type = 'admin' ORDER BY id LIMIT 1").fetchone()
+    ids = {
+        'product_id': conn.execute('''
+            SELECT product_id FROM order_items GROUP BY product_id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()[0],
+        'consumer_order_id': conn.execute('''
+            SELECT MAX(id) FROM orders WHERE consumer_id = ?
+        ''', (consumer['id'],)).fetchone()[0],
+    }
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('users', 'products', 'orders', 'order_items', 'reviews', 'notifications')}
+    conn.close()
+    return {'consumer': consumer, 'farmer': farmer, 'admin': admin}, ids, counts
+
+class TestClientDriver:
+    """Issue requests in-process through the Flask test client"""
+
+    def __init__(self, app, users):
+        self.clients = {None: app.test_client()}
+        for role, user in users.items():
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = user['id']
+                session['username'] = user['username']
+                session['user_type'] = user['user_type']
+                session['full_name'] = user['full_name']
+                session['is_approved'] = user['is_approved']
+            self.clients[role] = client
+
+    def get(self, role, path):
+        response = self.clients[role].get(path)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+class WSGIDriver:
+    """Issue requests over HTTP to a local WSGI server running in a thread"""
+
+    def __init__(self, app, users):
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.openers = {None: urllib.request.build_opener()}
+        for role, user in users.items():
+            opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            form = urllib.parse.urlencode({'username_or_email': user['email'],
+                                           'password': PASSWORDS[role]}).encode()
+            opener.open(f'{self.base_url}/auth/login', form).read()
+            self.openers[role] = opener
+
+    def get(self, role, path):
+        try:
+            with self.openers[role].open(self.base_url + path) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        self.server.shutdown()
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_route(driver, counter, role, path, requests, warmup):
+    """Time one route; returns its summary dict"""
+    timings, errors = [], 0
+
+    # Routes print debug output; keep it out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(warmup):
+            driver.get(role, path)
+
+        counter['queries'] = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            start = time.perf_counter()
+            status = driver.get(role, path)
+            timings.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'path': path,
+        'requests': requests,
+        'errors': errors,
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        'queries_per_request': round(counter['queries'] / requests, 1),
+        'throughput_rps': round(requests / elapsed, 1),
+    }
+
+def compare(results, baseline, tolerance):
+    """Print per-route deltas against a baseline; returns the regressed route names"""
+    regressions = []
+    print(f"\n{'route':26} {'p95 base':>9} {'p95 now':>9} {'change':>8} {'queries':>15}")
+    for name, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(name)
+        if not previous:
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] if previous['p95_ms'] else 0
+        slower = change > tolerance
+        more_queries = current['queries_per_request'] > previous['queries_per_request']
+        if slower or more_queries:
+            regressions.append(name)
+        print(f"{name:26} {previous['p95_ms']:9.2f} {current['p95_ms']:9.2f} {change:+8.0%} "
+              f"{previous['queries_per_request']:6.1f} -> {current['queries_per_request']:<6.1f}"
+              f"{'  REGRESSION' if slower or more_queries else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--scale', default='small', help='Dataset to generate when --db does not exist')
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route')
+    parser.add_argument('--routes', help='Comma-separated route names to run')
+    parser.add_argument('--wsgi', action='store_true', help='Go through a local WSGI server')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        import generate_data
+        generate_data.generate(args.db, **generate_data.SCALES[args.scale])
+
+    # The app opens its database at import time, so point it at the benchmark copy first
+    os.environ['DATABASE_URL'] = f'sqlite:///{args.db}'
+    from app import app
+    app.logger.disabled = True
+
+    users, ids, counts = pick_samples(args.db)
+    counter = install_query_counter()
+    driver = (WSGIDriver if args.wsgi else TestClientDriver)(app, users)
+
+    selected = set(args.routes.split(',')) if args.routes else None
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'mode': 'wsgi' if args.wsgi else 'test_client',
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'requests_per_route': args.requests,
+            'rows': counts,
+        },
+        'routes': {},
+    }
+
+    print(f"Benchmarking against {args.db} ({counts['orders']} orders, {counts['products']} products)")
+    print(f"{'route':26} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'req/s':>8} {'errors':>7}")
+    try:
+        for name, role, path in ROUTES:
+            if selected and name not in selected:
+                continue
+            summary = run_route(driver, counter, role, path.format(**ids), args.requests, args.warmup)
+            results['routes'][name] = summary
+            print(f"{name:26} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f} {summary['p99_ms']:8.2f} "
+                  f"{summary['queries_per_request']:8.1f} {summary['throughput_rps']:8.1f} {summary['errors']:7d}")
+    finally:
+        driver.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} route(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+SQLite vs PostgreSQL benchmark for the repository queries
+
+Runs the repository's analytics reads, streamed report exports and writes
+against the SQLite database, then (with --postgres) copies that database into
+PostgreSQL and runs the same suite there. Reports per-query latency and the
+throughput of concurrent clients for each engine. Writes are rolled back so
+both engines see the same data. PostgreSQL needs psycopg2.
+
+    python benchmarks/storage_engines.py --db benchmarks/bench.db
+    python benchmarks/storage_engines.py --db benchmarks/bench.db --postgres postgresql://farm@localhost/farm
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import contextlib
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_benchmarks import BENCH_DIR, percentile
+from modules import database, repository, storage
+
+def sample_ids(engine):
+    """A farmer with a product, and a consumer, for the write queries"""
+    conn = engine.connect()
+    try:
+        product = conn.execute('SELECT id, farmer_id FROM products ORDER BY id LIMIT 1').fetchone()
+        consumer = conn.execute("SELECT id FROM users WHERE user_type = 'consumer' ORDER BY id LIMIT 1").fetchone()
+        return {'product_id': product[0], 'farmer_id': product[1], 'consumer_id': consumer[0]}
+    finally:
+        conn.close()
+
+def operations(ids):
+    """(name, function of a connection) for every query in the suite"""
+    def export(report_type):
+        return lambda conn: sum(1 for _ in repository.report(conn, report_type)[1])
+
+    def write(conn):
+        repository.set_inventory_alert(conn, ids['farmer_id'], ids['product_id'], 'low_stock', 5)
+        repository.add_wishlist_item(conn, ids['consumer_id'], ids['product_id'])
+        repository.set_setting(conn, 'benchmark_marker', str(time.time()))
+        conn.rollback()
+
+    return [
+        ('top_farmers', repository.top_farmers),
+        ('top_products', repository.top_products),
+        ('category_stats', repository.category_stats),
+        ('popular_searches', repository.popular_searches),
+        ('export_orders', export('orders')),
+        ('export_revenue', export('revenue')),
+        ('writes', write),
+    ]
+
+def time_operations(engine, ops, iterations):
+    """p50/p95 latency of each operation in ms"""
+    results = {}
+    conn = engine.connect()
+    try:
+        for name, run in ops:
+            run(conn)
+            conn.rollback()
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                run(conn)
+                timings.append((time.perf_counter() - started) * 1000)
+                conn.rollback()
+            timings.sort()
+            results[name] = (percentile(timings, 50), percentile(timings, 95))
+    finally:
+        conn.close()
+    return results
+
+def throughput(engine, ops, clients, seconds):
+    """Operations per second with `clients` threads cycling through the suite, one connection each"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * clients
+
+    def client(index):
+        conn = engine.connect()
+        try:
+            while time.perf_counter() < deadline:
+                ops[(counts[index] + index) % len(ops)][1](conn)
+                conn.rollback()
+                counts[index] += 1
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+def run_suite(label, engine, args):
+    ops = operations(sample_ids(engine))
+    # The slow-query log prints to stdout; keep it out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        latencies = time_operations(engine, ops, args.iterations)
+        ops_per_second = throughput(engine, ops, args.clients, args.seconds)
+    print(f"\n{label}")
+    print(f"{'query':<18}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, (p50, p95) in latencies.items():
+        print(f"{name:<18}{p50:>10.2f}{p95:>10.2f}")
+    print(f"throughput with {args.clients} clients: {ops_per_second:.0f} ops/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'), help='SQLite database to read')
+    parser.add_argument('--postgres', help='PostgreSQL URL to copy the database into and benchmark')
+    parser.add_argument('--skip-copy', action='store_true', help='Reuse data already copied to PostgreSQL')
+    parser.add_argument('--iterations', type=int, default=30, help='Timed runs per query')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients for the throughput run')
+    parser.add_argument('--seconds', type=float, default=5, help='Length of the throughput run')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found; run benchmarks/generate_data.py first")
+    database.DATABASE = args.db
+    run_suite(f"SQLite ({args.db})", storage.create_engine(), args)
+
+    if not args.postgres:
+        return
+    try:
+        engine = storage.create_engine(args.postgres, max_connections=args.clients + 1)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    try:
+        if not args.skip_copy:
+            started = time.perf_counter()
+            copied = storage.copy_sqlite_to(engine)
+            print(f"\nCopied {copied} rows to PostgreSQL in {time.perf_counter() - started:.1f} s")
+        run_suite(f"PostgreSQL ({args.postgres.rsplit('@', 1)[-1]})", engine, args)
+    finally:
+        engine.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Shared test helpers for Farmer Connect
+Imported by the test scripts, so they work under pytest and when run directly
+"""
+
+import os
+import sys
+import atexit
+import tempfile
+import contextlib
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database
+
+# Files SQLite and the report snapshot create next to a database
+SIDE_FILES = ('-wal', '-shm', '-journal', '-replica')
+
+def remove_database(path):
+    """Delete a database file and any WAL, journal or snapshot files beside it"""
+    for name in (path, *(path + suffix for suffix in SIDE_FILES)):
+        if os.path.exists(name):
+            os.remove(name)
+
+@contextlib.contextmanager
+def temp_database():
+    """Point the database module at a fresh temporary file; restores the previous path and deletes the file"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    previous = database.DATABASE
+    database.DATABASE = path
+    try:
+        database.init_db()
+        yield path
+    finally:
+        database.DATABASE = previous
+        remove_database(path)
+
+def _session_database():
+    """Send everything outside temp_database() to a throwaway file, including app's init_db() at import"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    database.DATABASE = path
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    owner = os.getpid()
+    atexit.register(lambda: os.getpid() == owner and remove_database(path))
+
+# Importing this module is enough to keep the checked-in farmer_connect.db out of the tests
+_session_database()
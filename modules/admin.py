@@ -3,9 +3,11 @@ Admin module for Farmer Connect
 Handles admin-specific functionality
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response
 from modules.database import get_db_connection, get_setting, update_setting
 from modules.utils import require_login, send_notification
+from modules import instrumentation, profiler, repository, rollups, storage
+from modules.dates import period_filter
 from datetime import datetime, date
 
 admin_bp = Blueprint('admin', __name__)
@@ -50,20 +52,22 @@ def dashboard():
         SELECT COUNT(*) FROM orders
     ''').fetchone()[0]
     
-    stats['today_orders'] = conn.execute('''
-        SELECT COUNT(*) FROM orders WHERE DATE(created_at) = DATE('now')
-    ''').fetchone()[0]
+    today_filter, today_params = period_filter('created_at', 'today')
+    stats['today_orders'] = conn.execute(f'''
+        SELECT COUNT(*) FROM orders WHERE 1 = 1 {today_filter}
+    ''', today_params).fetchone()[0]
     
     # Revenue
     stats['total_revenue'] = conn.execute('''
         SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE payment_status = 'paid'
     ''').fetchone()[0]
     
-    stats['month_revenue'] = conn.execute('''
+    month_filter, month_params = period_filter('created_at', 'month')
+    stats['month_revenue'] = conn.execute(f'''
         SELECT COALESCE(SUM(total_amount), 0) FROM orders 
         WHERE payment_status = 'paid' 
-        AND strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-    ''').fetchone()[0]
+        {month_filter}
+    ''', month_params).fetchone()[0]
     
     # Contact messages
     stats['unread_messages'] = conn.execute('''
@@ -98,19 +102,8 @@ def dashboard():
         LIMIT 5
     ''').fetchall()
     
-    # Monthly stats for charts
-    monthly_stats_raw = conn.execute('''
-        SELECT strftime('%Y-%m', created_at) as month,
-               COUNT(CASE WHEN user_type = 'farmer' THEN 1 END) as farmers,
-               COUNT(CASE WHEN user_type = 'consumer' THEN 1 END) as consumers
-        FROM users
-        WHERE created_at >= DATE('now', '-6 months')
-        GROUP BY strftime('%Y-%m', created_at)
-        ORDER BY month
-    ''').fetchall()
-    
-    # Convert Row objects to dictionaries for JSON serialization
-    monthly_stats = [dict(row) for row in monthly_stats_raw]
+    # Monthly registrations for charts (last 6 months), as columns ready for JSON serialization
+    monthly_stats = rollups.series(conn, ['farmer_registrations', 'consumer_registrations'], count=6)
     
     conn.close()
     
@@ -673,7 +666,7 @@ def toggle_featured_product(product_id):
 @require_login(['admin'])
 def analytics():
     """Advanced Analytics Dashboard"""
-    conn = get_db_connection()
+    conn = storage.report_connection()
     
     # Overall platform stats
     stats = {}
@@ -686,99 +679,34 @@ def analytics():
     stats['total_consumers'] = conn.execute('''
         SELECT COUNT(*) FROM users WHERE user_type = 'consumer'
     ''').fetchone()[0]
-    stats['monthly_user_growth'] = conn.execute('''
+    month_filter, month_params = period_filter('created_at', 'month')
+    stats['monthly_user_growth'] = conn.execute(f'''
         SELECT COUNT(*) FROM users 
-        WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-    ''').fetchone()[0]
+        WHERE 1 = 1 {month_filter}
+    ''', month_params).fetchone()[0]
     
     # Revenue analytics
     stats['total_revenue'] = conn.execute('''
         SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE payment_status = 'paid'
     ''').fetchone()[0]
     
-    stats['monthly_revenue'] = conn.execute('''
+    stats['monthly_revenue'] = conn.execute(f'''
         SELECT COALESCE(SUM(total_amount), 0) FROM orders 
         WHERE payment_status = 'paid' 
-        AND strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-    ''').fetchone()[0]
+        {month_filter}
+    ''', month_params).fetchone()[0]
     
-    # Top performing farmers
-    top_farmers = conn.execute('''
-        SELECT u.farm_name, u.full_name, 
-               COUNT(DISTINCT oi.order_id) as total_orders,
-               SUM(oi.subtotal) as total_earnings,
-               AVG(fr.rating) as avg_rating
-        FROM users u
-        LEFT JOIN order_items oi ON u.id = oi.farmer_id
-        LEFT JOIN orders o ON oi.order_id = o.id AND o.payment_status = 'paid'
-        LEFT JOIN farmer_ratings fr ON u.id = fr.farmer_id
-        WHERE u.user_type = 'farmer' AND u.is_approved = 1
-        GROUP BY u.id
-        ORDER BY total_earnings DESC NULLS LAST
-        LIMIT 10
-    ''').fetchall()
+    # Top performing farmers, top selling products and category performance
+    top_farmers = repository.top_farmers(conn)
+    top_products = repository.top_products(conn)
+    category_stats = repository.category_stats(conn)
     
-    # Top selling products
-    top_products = conn.execute('''
-        SELECT p.name, p.category, u.farm_name,
-               SUM(oi.quantity) as total_sold,
-               SUM(oi.subtotal) as revenue
-        FROM products p
-        JOIN order_items oi ON p.id = oi.product_id
-        JOIN orders o ON oi.order_id = o.id
-        JOIN users u ON p.farmer_id = u.id
-        WHERE o.payment_status = 'paid'
-        GROUP BY p.id
-        ORDER BY revenue DESC
-        LIMIT 10
-    ''').fetchall()
-    
-    # Category performance
-    category_stats = conn.execute('''
-        SELECT p.category,
-               COUNT(DISTINCT p.id) as product_count,
-               COUNT(DISTINCT oi.order_id) as order_count,
-               SUM(oi.subtotal) as revenue
-        FROM products p
-        LEFT JOIN order_items oi ON p.id = oi.product_id
-        LEFT JOIN orders o ON oi.order_id = o.id AND o.payment_status = 'paid'
-        GROUP BY p.category
-        ORDER BY revenue DESC NULLS LAST
-    ''').fetchall()
-    
-    # Monthly growth data for charts (last 12 months)
-    monthly_data = conn.execute('''
-        SELECT strftime('%Y-%m', created_at) as month,
-               strftime('%m/%Y', created_at) as month_display,
-               COUNT(CASE WHEN user_type = 'farmer' THEN 1 END) as farmers,
-               COUNT(CASE WHEN user_type = 'consumer' THEN 1 END) as consumers
-        FROM users
-        WHERE created_at >= DATE('now', '-12 months')
-        GROUP BY strftime('%Y-%m', created_at)
-        ORDER BY month
-    ''').fetchall()
-    
-    # Revenue by month
-    revenue_data = conn.execute('''
-        SELECT strftime('%Y-%m', created_at) as month,
-               strftime('%m/%Y', created_at) as month_display,
-               SUM(total_amount) as revenue
-        FROM orders
-        WHERE payment_status = 'paid' 
-        AND created_at >= DATE('now', '-12 months')
-        GROUP BY strftime('%Y-%m', created_at)
-        ORDER BY month
-    ''').fetchall()
+    # Monthly growth and revenue for charts (last 12 months), one list per series
+    monthly_data = rollups.series(conn, ['farmer_registrations', 'consumer_registrations'])
+    revenue_data = rollups.series(conn, 'revenue')
     
     # Search analytics
-    popular_searches = conn.execute('''
-        SELECT query, COUNT(*) as search_count, AVG(results_count) as avg_results
-        FROM search_history
-        WHERE created_at >= DATE('now', '-30 days')
-        GROUP BY query
-        ORDER BY search_count DESC
-        LIMIT 20
-    ''').fetchall()
+    popular_searches = repository.popular_searches(conn)
     
     conn.close()
     
@@ -962,15 +890,15 @@ def toggle_promotion(promotion_id):
 @require_login(['admin'])
 def reports():
     """Reports and data export"""
-    conn = get_db_connection()
+    conn = storage.report_connection()
     
     # Summary stats for report generation
     report_stats = {
-        'total_farmers': conn.execute('SELECT COUNT(*) FROM users WHERE user_type = "farmer"').fetchone()[0],
-        'total_consumers': conn.execute('SELECT COUNT(*) FROM users WHERE user_type = "consumer"').fetchone()[0],
+        'total_farmers': conn.execute("SELECT COUNT(*) FROM users WHERE user_type = 'farmer'").fetchone()[0],
+        'total_consumers': conn.execute("SELECT COUNT(*) FROM users WHERE user_type = 'consumer'").fetchone()[0],
         'total_products': conn.execute('SELECT COUNT(*) FROM products').fetchone()[0],
         'total_orders': conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0],
-        'total_revenue': conn.execute('SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE payment_status = "paid"').fetchone()[0]
+        'total_revenue': conn.execute("SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE payment_status = 'paid'").fetchone()[0]
     }
     
     conn.close()
@@ -985,61 +913,13 @@ def export_report(report_type, format):
     from io import StringIO
     from flask import make_response
     
-    conn = get_db_connection()
+    conn = storage.report_connection()
     
     try:
-        if report_type == 'users':
-            data = conn.execute('''
-                SELECT id, username, email, user_type, full_name, phone, location,
-                       farm_name, is_approved, is_active, created_at
-                FROM users
-                WHERE user_type IN ('farmer', 'consumer')
-                ORDER BY created_at DESC
-            ''').fetchall()
-            
-            headers = ['ID', 'Username', 'Email', 'User Type', 'Full Name', 'Phone', 
-                      'Location', 'Farm Name', 'Approved', 'Active', 'Created At']
-        
-        elif report_type == 'orders':
-            data = conn.execute('''
-                SELECT o.id, o.order_number, o.total_amount, o.status, o.payment_status,
-                       o.created_at, u.full_name as consumer_name, u.email as consumer_email
-                FROM orders o
-                JOIN users u ON o.consumer_id = u.id
-                ORDER BY o.created_at DESC
-            ''').fetchall()
-            
-            headers = ['ID', 'Order Number', 'Total Amount', 'Status', 'Payment Status',
-                      'Created At', 'Consumer Name', 'Consumer Email']
-        
-        elif report_type == 'products':
-            data = conn.execute('''
-                SELECT p.id, p.name, p.category, p.price, p.unit, p.quantity,
-                       p.is_approved, p.created_at, u.farm_name, u.full_name as farmer_name
-                FROM products p
-                JOIN users u ON p.farmer_id = u.id
-                ORDER BY p.created_at DESC
-            ''').fetchall()
-            
-            headers = ['ID', 'Name', 'Category', 'Price', 'Unit', 'Quantity',
-                      'Approved', 'Created At', 'Farm Name', 'Farmer Name']
-        
-        elif report_type == 'revenue':
-            data = conn.execute('''
-                SELECT strftime('%Y-%m', o.created_at) as month,
-                       COUNT(*) as order_count,
-                       SUM(o.total_amount) as total_revenue,
-                       AVG(o.total_amount) as avg_order_value
-                FROM orders o
-                WHERE o.payment_status = 'paid'
-                GROUP BY strftime('%Y-%m', o.created_at)
-                ORDER BY month DESC
-            ''').fetchall()
-            
-            headers = ['Month', 'Order Count', 'Total Revenue', 'Average Order Value']
-        
-        else:
+        report = repository.report(conn, report_type)
+        if report is None:
             return jsonify({'error': 'Invalid report type'})
+        headers, data = report
         
         if format == 'csv':
             output = StringIO()
@@ -1049,8 +929,7 @@ def export_report(report_type, format):
             writer.writerow(headers)
             
             # Write data
-            for row in data:
-                writer.writerow(row)
+            writer.writerows(data)
             
             response = make_response(output.getvalue())
             response.headers['Content-Type'] = 'text/csv'
@@ -1100,6 +979,56 @@ def consumers():
                          current_status=status,
                          current_search=search)
 
+@admin_bp.route('/debug/queries')
+@require_login(['admin'])
+def query_debug():
+    """Recent requests with their SQL counts, DB time and slowest statements"""
+    recent = list(instrumentation.RECENT_REQUESTS)
+    totals = instrumentation.statement_totals()
+    
+    if request.args.get('format') == 'json':
+        return jsonify({'requests': recent, 'statements': totals})
+    
+    return render_template('admin/query_debug.html',
+                         recent_requests=recent,
+                         statement_totals=totals,
+                         slow_query_ms=instrumentation.SLOW_QUERY_MS)
+
+@admin_bp.route('/debug/profile', methods=['GET', 'POST'])
+@require_login(['admin'])
+def profile_debug():
+    """Sampling profiler summary per endpoint, with runtime on/off and reset"""
+    if request.method == 'POST':
+        action = request.form.get('action')
+        if action == 'reset':
+            profiler.reset()
+            flash('Profiles cleared', 'success')
+        elif action == 'configure':
+            try:
+                profiler.configure(enabled=request.form.get('enabled') == 'on',
+                                   rate=float(request.form.get('rate', 0)))
+                flash('Profiler settings updated for this process', 'success')
+            except ValueError:
+                flash('Sample rate must be a number between 0 and 1', 'error')
+        return redirect(url_for('admin.profile_debug'))
+    
+    summaries = profiler.profiles()
+    if request.args.get('format') == 'json':
+        return jsonify({'settings': profiler.settings(), 'endpoints': dict(summaries)})
+    
+    return render_template('admin/profile_debug.html',
+                         profiles=summaries,
+                         settings=profiler.settings())
+
+@admin_bp.route('/debug/profile/download')
+@require_login(['admin'])
+def profile_download():
+    """Collapsed stacks for flamegraph.pl or speedscope, optionally for one endpoint"""
+    endpoint = request.args.get('view')
+    filename = 'profile-{}.collapsed'.format((endpoint or 'all').replace('.', '-'))
+    return Response(profiler.collapsed(endpoint), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @admin_bp.route('/site-settings', methods=['GET', 'POST'])
 @require_login(['admin'])
 def site_settings():
@@ -1112,6 +1041,7 @@ def site_settings():
             'contact_phone': request.form.get('contact_phone', ''),
             'delivery_charge': request.form.get('delivery_charge', '0'),
             'free_delivery_above': request.form.get('free_delivery_above', '0'),
+            'max_delivery_charge': request.form.get('max_delivery_charge', '250'),
             'commission_rate': request.form.get('commission_rate', '0')
         }
         
@@ -1127,7 +1057,7 @@ def site_settings():
     # Get current settings
     current_settings = {}
     settings_keys = ['site_name', 'site_description', 'contact_email', 'contact_phone',
-                    'delivery_charge', 'free_delivery_above', 'commission_rate']
+                    'delivery_charge', 'free_delivery_above', 'max_delivery_charge', 'commission_rate']
     
     for key in settings_keys:
         current_settings[key] = get_setting(key, '')
@@ -1268,7 +1198,7 @@ def settings():
         # Update settings
         settings_to_update = [
             'site_name', 'site_description', 'contact_email', 'contact_phone',
-            'delivery_charge', 'free_delivery_above', 'commission_rate'
+            'delivery_charge', 'free_delivery_above', 'max_delivery_charge', 'commission_rate'
         ]
         
         try:
@@ -1289,7 +1219,7 @@ def settings():
     settings_data = {}
     settings_keys = [
         'site_name', 'site_description', 'contact_email', 'contact_phone',
-        'delivery_charge', 'free_delivery_above', 'commission_rate'
+        'delivery_charge', 'free_delivery_above', 'max_delivery_charge', 'commission_rate'
     ]
     
     for key in settings_keys:
@@ -0,0 +1,267 @@
+"""
+ASGI module for Farmer Connect
+Serves the Flask app from an event loop: views run on bounded thread pools and event streams run as coroutines
+"""
+
+import io
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, session
+from modules import events, metrics
+from modules.database import get_db_connection
+
+# Threads per pool; JSON APIs and exports get their own so page renders cannot starve them
+DEFAULT_THREADS = {'page': 16, 'api': 8, 'export': 2}
+
+API_PREFIXES = ('/api/', '/consumer/api/', '/farmer/api/', '/admin/api/')
+
+# Event streams handled on the loop instead of holding a thread each
+EVENTS_PATH = '/api/events'
+
+# Open event streams per process in ASGI mode
+MAX_STREAMS = 2000
+
+_running = {name: 0 for name in DEFAULT_THREADS}
+_running_lock = threading.Lock()
+
+metrics.register_gauge('asgi_threads_busy', 'Views running on each ASGI thread pool in this process',
+                       lambda: {(('pool', name),): count for name, count in _running.items()}, per_process=True)
+
+def pool_for(path):
+    """'export', 'api' or 'page': which thread pool serves a request path"""
+    if path.startswith(API_PREFIXES):
+        return 'export' if '/export/' in path else 'api'
+    return 'page'
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope and its full request body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[key] = value
+            continue
+        key = 'HTTP_' + key
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+async def read_body(receive):
+    """The whole request body; returns None if the client went away first"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+class AsgiApp:
+    """ASGI application wrapping a Flask app
+
+    Each request body is read on the event loop, then the view runs on the
+    thread pool picked by pool_for(). The whole response is produced on that
+    one thread (Flask's streamed responses keep their context there) and each
+    chunk waits for the client before the next is generated. /api/events is
+    answered by a coroutine that reads the event log on the API pool between
+    waits, so open streams cost no threads.
+    """
+
+    def __init__(self, flask_app, threads=None):
+        self.flask_app = flask_app
+        self.threads = dict(DEFAULT_THREADS, **(threads or {}))
+        self.pools = {}
+        self.streams = 0
+        self._loop = None
+        self._waiter = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Create the thread pools and hook into event wake-ups; idempotent"""
+        with self._lock:
+            if self.pools:
+                return
+            self.pools = {name: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f'asgi-{name}')
+                          for name, count in self.threads.items()}
+            self._loop = asyncio.get_running_loop()
+            self._waiter = self._loop.create_future()
+            events.on_wake(self._notify)
+
+    def shutdown(self):
+        with self._lock:
+            events.remove_listener(self._notify)
+            for pool in self.pools.values():
+                pool.shutdown(wait=True)
+            self.pools = {}
+
+    def _notify(self):
+        """Called by events.wake() from any thread"""
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        """Release every stream waiting on the current waiter and arm a new one"""
+        waiter, self._waiter = self._waiter, self._loop.create_future()
+        waiter.set_result(None)
+
+    async def offload(self, pool, function, *args):
+        """Run function(*args) on a named thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.pools[pool], function, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        self.start()
+        body = await read_body(receive)
+        if body is None:
+            return
+        environ = build_environ(scope, body)
+        if scope['path'] == EVENTS_PATH and scope['method'] == 'GET':
+            if await self._events(environ, receive, send):
+                return
+        pool = pool_for(scope['path'])
+        await self.offload(pool, self._run_view, pool, environ, send, asyncio.get_running_loop())
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _run_view(self, pool, environ, send, loop):
+        """Call the WSGI app on a pool thread and send its response chunk by chunk"""
+        response = {'started': False}
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def write(data):
+            if not response['started']:
+                emit({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+                response['started'] = True
+            if data:
+                emit({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        with _running_lock:
+            _running[pool] += 1
+        iterable = None
+        try:
+            iterable = self.flask_app(environ, start_response)
+            for chunk in iterable:
+                write(chunk)
+            write(b'')
+            emit({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+            with _running_lock:
+                _running[pool] -= 1
+
+    def _stream_start(self, environ):
+        """(user_id, last_id) for an event stream request, read through the Flask session"""
+        with self.flask_app.request_context(environ):
+            user_id = session.get('user_id')
+            last_id = request.headers.get('Last-Event-ID', request.args.get('last_id', type=int), type=int)
+        if user_id is not None and last_id is None:
+            conn = get_db_connection(row_factory=None)
+            last_id = events.latest_id(conn, user_id)
+            conn.close()
+        return user_id, last_id
+
+    def _fetch(self, user_id, last_id):
+        conn = get_db_connection(row_factory=None)
+        rows = events.fetch(conn, user_id, last_id)
+        conn.close()
+        return rows
+
+    async def _events(self, environ, receive, send):
+        """Serve an event stream on the loop; False leaves the request to the Flask view (e.g. a 401)"""
+        user_id, last_id = await self.offload('api', self._stream_start, environ)
+        if user_id is None:
+            return False
+        if self.streams >= MAX_STREAMS:
+            await send({'type': 'http.response.start', 'status': 503,
+                        'headers': [(b'content-type', b'text/event-stream'), (b'retry-after', b'30')]})
+            await send({'type': 'http.response.body', 'body': b'retry: 30000\n\n'})
+            return True
+
+        headers = [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+                   (b'x-accel-buffering', b'no')]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': f'retry: {int(events.POLL_INTERVAL * 1000)}\n\n'.encode(),
+                    'more_body': True})
+
+        disconnected = asyncio.ensure_future(receive())
+        self.streams += 1
+        events._streams[0] += 1
+        started = last_beat = time.monotonic()
+        try:
+            while time.monotonic() - started < events.STREAM_LIFETIME and not disconnected.done():
+                waiter = self._waiter
+                rows = await self.offload('api', self._fetch, user_id, last_id)
+                for event_id, event, data in rows:
+                    last_id = event_id
+                    await send({'type': 'http.response.body', 'more_body': True,
+                                'body': events.format_event(event_id, event, data).encode()})
+                if rows:
+                    last_beat = time.monotonic()
+                    continue
+
+                if time.monotonic() - last_beat >= events.KEEPALIVE:
+                    last_beat = time.monotonic()
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                await asyncio.wait([waiter, disconnected], timeout=events.POLL_INTERVAL,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            self.streams -= 1
+            events._streams[0] -= 1
+        return True
+
+def create_app(flask_app):
+    """AsgiApp configured from ASGI_PAGE_THREADS, ASGI_API_THREADS and ASGI_EXPORT_THREADS"""
+    threads = {name: flask_app.config.setdefault(f'ASGI_{name.upper()}_THREADS', count)
+               for name, count in DEFAULT_THREADS.items()}
+    return AsgiApp(flask_app, threads)
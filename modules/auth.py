@@ -3,13 +3,40 @@ Authentication module for Farmer Connect
 Handles user registration, login, and session management
 """
 
+import math
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from modules.database import get_db_connection
+from modules.passwords import hash_password, verify_password, needs_rehash, HashingBusy
+from modules import ratelimit
+from modules.sessions import current_user, reload_current_user
 from modules.utils import validate_email, validate_phone, save_uploaded_file
+from modules.geo import update_user_location
 
 auth_bp = Blueprint('auth', __name__)
 
+# Shown when the password hashing queue is full
+BUSY_MESSAGE = 'We are handling a lot of sign-ins right now. Please try again in a moment.'
+
+def find_user(conn, login, columns='*'):
+    """Active user whose username or email matches login, ignoring case
+
+    Each probe is one seek on a COLLATE NOCASE index. Emails always contain
+    '@', so anything else can only be a username.
+    """
+    for column in ('email', 'username') if '@' in login else ('username',):
+        user = conn.execute(f'''
+            SELECT {columns} FROM users WHERE {column} = ? COLLATE NOCASE AND is_active = 1
+        ''', (login,)).fetchone()
+        if user:
+            return user
+    return None
+
+def user_exists(conn, username, email):
+    """True if the username or email is taken, ignoring case"""
+    return conn.execute('''
+        SELECT 1 FROM users WHERE username = ? COLLATE NOCASE OR email = ? COLLATE NOCASE
+    ''', (username, email)).fetchone() is not None
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -53,12 +80,7 @@ def register():
         
         # Check if user already exists
         conn = get_db_connection()
-        existing_user = conn.execute(
-            'SELECT id FROM users WHERE username = ? OR email = ?',
-            (username, email)
-        ).fetchone()
-        
-        if existing_user:
+        if user_exists(conn, username, email):
             errors.append("Username or email already exists")
         
         if errors:
@@ -81,7 +103,12 @@ def register():
                 return render_template('auth/register.html')
         
         # Create user
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            conn.close()
+            return render_template('auth/register.html'), 503
         is_approved = 1 if user_type == 'consumer' else 0  # Consumers auto-approved
         
         try:
@@ -94,6 +121,7 @@ def register():
                   phone, location, farm_name, farm_description, is_approved))
             
             user_id = cursor.lastrowid
+            update_user_location(conn, user_id, location)
             conn.commit()
             
             if user_type == 'farmer':
@@ -122,7 +150,7 @@ def register():
 def login():
     """User login"""
     if request.method == 'POST':
-        username_or_email = request.form['username_or_email'].strip().lower()
+        username_or_email = request.form['username_or_email'].strip()
         password = request.form['password']
         remember_me = 'remember_me' in request.form
         
@@ -130,17 +158,34 @@ def login():
             flash('Please enter both username/email and password', 'error')
             return render_template('auth/login.html')
         
+        # Throttle by IP and by account before any lookup or hashing
+        wait = ratelimit.login_attempt(request.remote_addr, username_or_email)
+        if wait:
+            flash(f'Too many login attempts. Please try again in {math.ceil(wait)} seconds.', 'error')
+            return render_template('auth/login.html'), 429, {'Retry-After': str(math.ceil(wait))}
+        
         conn = get_db_connection()
         
         # Find user by username or email
-        user = conn.execute('''
-            SELECT * FROM users 
-            WHERE (username = ? OR email = ?) AND is_active = 1
-        ''', (username_or_email, username_or_email)).fetchone()
+        user = find_user(conn, username_or_email)
         
-        conn.close()
+        try:
+            valid = user is not None and verify_password(user['password_hash'], password)
+            
+            # Upgrade hashes made with older parameters while the password is at hand
+            if valid and needs_rehash(user['password_hash']):
+                conn.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                             (hash_password(password), user['id']))
+                conn.commit()
+        except HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return render_template('auth/login.html'), 503
+        finally:
+            conn.close()
         
-        if user and check_password_hash(user['password_hash'], password):
+        if valid:
+            ratelimit.login_succeeded(username_or_email)
+            
             # Set session
             session['user_id'] = user['id']
             session['username'] = user['username']
@@ -180,15 +225,14 @@ def profile():
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
     
-    conn = get_db_connection()
-    user = conn.execute(
-        'SELECT * FROM users WHERE id = ?', (session['user_id'],)
-    ).fetchone()
+    user = current_user()
     
     if not user:
         flash('User not found', 'error')
         return redirect(url_for('auth.login'))
     
+    conn = get_db_connection()
+    
     if request.method == 'POST':
         # Get form data
         full_name = request.form['full_name'].strip()
@@ -235,6 +279,7 @@ def profile():
                     WHERE id = ?
                 ''', (full_name, phone, location, farm_name, farm_description,
                       profile_image, session['user_id']))
+                update_user_location(conn, session['user_id'], location)
                 
                 conn.commit()
                 
@@ -248,9 +293,8 @@ def profile():
                 print(f"Profile update error: {e}")
     
     # Refresh user data
-    user = conn.execute(
-        'SELECT * FROM users WHERE id = ?', (session['user_id'],)
-    ).fetchone()
+    if request.method == 'POST':
+        user = reload_current_user()
     
     # Calculate user statistics based on user type
     stats = {}
@@ -335,13 +379,20 @@ def change_password():
             (session['user_id'],)
         ).fetchone()
         
-        if not check_password_hash(user['password_hash'], current_password):
+        try:
+            valid = verify_password(user['password_hash'], current_password)
+            new_password_hash = hash_password(new_password) if valid else None
+        except HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            conn.close()
+            return render_template('auth/change_password.html'), 503
+        
+        if not valid:
             flash('Current password is incorrect', 'error')
             conn.close()
             return render_template('auth/change_password.html')
         
         # Update password
-        new_password_hash = generate_password_hash(new_password)
         
         try:
             conn.execute('''
@@ -375,10 +426,7 @@ def forgot_password():
             return render_template('auth/forgot_password.html')
         
         conn = get_db_connection()
-        user = conn.execute(
-            'SELECT id FROM users WHERE email = ? AND is_active = 1',
-            (email,)
-        ).fetchone()
+        user = find_user(conn, email, 'id')
         conn.close()
         
         if user:
@@ -5,7 +5,12 @@ Handles consumer-specific functionality
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from modules.database import get_db_connection
-from modules.utils import require_login, generate_order_number, calculate_delivery_charge, send_notification
+from modules.utils import require_login, generate_order_number, calculate_delivery_charge, send_notification, get_product_card_data, indian_rupee_format
+from modules.recommendations import get_recommended_products
+from modules.geo import geocode, cart_delivery_distance, update_user_location
+from modules.sessions import current_user
+from modules.notifications import inbox, mark_read, unread_count
+from modules import repository
 from datetime import datetime, date
 
 consumer_bp = Blueprint('consumer', __name__)
@@ -49,21 +54,8 @@ def dashboard():
         LIMIT 5
     ''', (session['user_id'],)).fetchall()
     
-    # Recommended products (based on previous purchases)
-    recommended_products = conn.execute('''
-        SELECT DISTINCT p.*, u.farm_name, u.location
-        FROM products p
-        JOIN users u ON p.farmer_id = u.id
-        WHERE p.is_approved = 1 AND p.quantity > 0
-        AND p.category IN (
-            SELECT DISTINCT p2.category FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN products p2 ON oi.product_id = p2.id
-            WHERE o.consumer_id = ?
-        )
-        ORDER BY p.created_at DESC
-        LIMIT 6
-    ''', (session['user_id'],)).fetchall()
+    # Recommended products (precomputed co-purchase neighbors)
+    recommended_products = get_recommended_products(conn, session['user_id'])
     
     # If no recommendations, show featured products
     if not recommended_products:
@@ -81,7 +73,8 @@ def dashboard():
     return render_template('consumer/dashboard.html',
                          stats=stats,
                          recent_orders=recent_orders,
-                         recommended_products=recommended_products)
+                         recommended_products=recommended_products,
+                         product_cards=get_product_card_data(recommended_products, session['user_id']))
 
 @consumer_bp.route('/cart')
 @require_login(['consumer'])
@@ -102,7 +95,7 @@ def cart():
     
     # Calculate totals
     subtotal = sum(float(item['subtotal']) for item in cart_items)
-    delivery_charge = calculate_delivery_charge(subtotal)
+    delivery_charge = calculate_delivery_charge(subtotal, cart_delivery_distance(conn, session['user_id']))
     total = subtotal + delivery_charge
     
     conn.close()
@@ -158,7 +151,7 @@ def update_cart():
         ''', (session['user_id'],)).fetchall()
         
         subtotal = sum(float(item['subtotal']) for item in cart_items)
-        delivery_charge = calculate_delivery_charge(subtotal)
+        delivery_charge = calculate_delivery_charge(subtotal, cart_delivery_distance(conn, session['user_id']))
         total = subtotal + delivery_charge
         
         conn.close()
@@ -205,7 +198,7 @@ def remove_from_cart():
         ''', (session['user_id'],)).fetchall()
         
         subtotal = sum(float(item['subtotal']) for item in cart_items)
-        delivery_charge = calculate_delivery_charge(subtotal)
+        delivery_charge = calculate_delivery_charge(subtotal, cart_delivery_distance(conn, session['user_id']))
         total = subtotal + delivery_charge
         
         conn.close()
@@ -252,7 +245,7 @@ def checkout():
     
     # Calculate totals
     subtotal = sum(float(item['subtotal']) for item in cart_items)
-    delivery_charge = calculate_delivery_charge(subtotal)
+    delivery_charge = calculate_delivery_charge(subtotal, cart_delivery_distance(conn, session['user_id']))
     total = subtotal + delivery_charge
     
     if request.method == 'POST':
@@ -287,6 +280,18 @@ def checkout():
         if payment_method not in ['cod', 'online', 'upi']:
             errors.append("Please select a valid payment method")
         
+        # Charge delivery distance from the address actually given, when it can be located
+        delivery_point = geocode(delivery_address) if delivery_address else None
+        if delivery_point:
+            delivery_charge = calculate_delivery_charge(
+                subtotal, cart_delivery_distance(conn, session['user_id'], delivery_point))
+            total = subtotal + delivery_charge
+        
+        # Never place an order at a delivery charge other than the one shown on the page
+        if not errors and request.form.get('quoted_delivery_charge', type=float) != round(delivery_charge, 2):
+            errors.append(f"Delivery to this address costs {indian_rupee_format(delivery_charge)}. "
+                          f"Please check the new total and place the order again")
+        
         if errors:
             for error in errors:
                 flash(error, 'error')
@@ -349,7 +354,7 @@ def checkout():
                 traceback.print_exc()
     
     # Get user info for pre-filling form
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+    user = current_user()
     conn.close()
     
     return render_template('consumer/checkout.html',
@@ -521,18 +526,9 @@ def add_to_wishlist():
         return jsonify({'success': False, 'message': 'Product not found'})
     
     try:
-        conn.execute('''
-            INSERT OR IGNORE INTO wishlists (user_id, product_id)
-            VALUES (?, ?)
-        ''', (session['user_id'], product_id))
-        
+        wishlist_count = repository.add_wishlist_item(conn, session['user_id'], product_id)
         conn.commit()
         
-        # Get wishlist count
-        wishlist_count = conn.execute('''
-            SELECT COUNT(*) FROM wishlists WHERE user_id = ?
-        ''', (session['user_id'],)).fetchone()[0]
-        
         conn.close()
         
         return jsonify({
@@ -911,6 +907,7 @@ def edit_profile():
                         WHERE id = ?
                     ''', (full_name, phone, location, session['user_id']))
                 
+                update_user_location(conn, session['user_id'], location)
                 conn.commit()
                 flash('Profile updated successfully!', 'success')
                 return redirect(url_for('consumer.dashboard'))
@@ -962,22 +959,15 @@ def notifications():
     """Consumer notifications"""
     conn = get_db_connection()
     
-    # Get notifications
-    notifications_list = conn.execute('''
-        SELECT * FROM notifications 
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT 50
-    ''', (session['user_id'],)).fetchall()
+    # Get notifications, older pages via ?before=<id>
+    notifications_list = inbox(conn, session['user_id'], 50, request.args.get('before', type=int))
     
-    # Mark all as read
-    conn.execute('''
-        UPDATE notifications 
-        SET is_read = 1 
-        WHERE user_id = ? AND is_read = 0
-    ''', (session['user_id'],))
-    
-    conn.commit()
+    # Mark the ones shown as read (only this id range, never the whole inbox)
+    if notifications_list:
+        mark_read(conn, session['user_id'], notifications_list[0]['id'], notifications_list[-1]['id'])
+        conn.commit()
+    unread_total = unread_count(conn, session['user_id'])
     conn.close()
     
-    return render_template('consumer/notifications.html', notifications=notifications_list)
\ No newline at end of file
+    return render_template('consumer/notifications.html', notifications=notifications_list,
+                           unread_total=unread_total)
\ No newline at end of file
@@ -5,20 +5,33 @@ Handles SQLite database operations
 
 import sqlite3
 import os
+import time
 from datetime import datetime
+from modules.instrumentation import InstrumentedConnection
 
-DATABASE = 'farmer_connect.db'
+def database_path(url=None):
+    """SQLite file path from a DATABASE_URL such as sqlite:///farmer_connect.db"""
+    if not url:
+        return 'farmer_connect.db'
+    if url.startswith('sqlite:///'):
+        return url[len('sqlite:///'):]
+    raise ValueError(f"Unsupported DATABASE_URL: {url}")
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
+DATABASE = database_path(os.environ.get('DATABASE_URL'))
+
+def get_db_connection(row_factory=sqlite3.Row):
+    """Get database connection; pass row_factory=None for plain tuples (see modules.rows)"""
+    conn = sqlite3.connect(DATABASE, factory=InstrumentedConnection)
+    conn.row_factory = row_factory
     return conn
 
 def init_db():
     """Initialize database with all required tables"""
     conn = get_db_connection()
     
+    # WAL: readers (report snapshots, long exports) see a consistent view without blocking writers
+    conn.execute('PRAGMA journal_mode = WAL')
+    
     # Users table (farmers, consumers, admin)
     conn.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -35,6 +48,10 @@ def init_db():
             profile_image VARCHAR(200),
             is_approved BOOLEAN DEFAULT 0,
             is_active BOOLEAN DEFAULT 1,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            latitude REAL,
+            longitude REAL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -57,6 +74,8 @@ def init_db():
             harvest_date DATE,
             expiry_date DATE,
             organic BOOLEAN DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (farmer_id) REFERENCES users (id)
@@ -320,6 +339,186 @@ def init_db():
         )
     ''')
     
+    # Sparse item-item co-purchase counts (diagonal holds per-product order counts)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS copurchase_counts (
+            product_id INTEGER NOT NULL,
+            other_id INTEGER NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, other_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # How far the co-purchase model has read the orders table (see modules.recommendations)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recommendation_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            order_watermark INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Older databases kept the watermark in site_settings
+    conn.execute('''
+        INSERT OR IGNORE INTO recommendation_state (id, order_watermark)
+        SELECT 1, COALESCE((SELECT CAST(value AS INTEGER) FROM site_settings
+                            WHERE key = 'recommendations_order_watermark'), 0)
+    ''')
+    conn.execute("DELETE FROM site_settings WHERE key = 'recommendations_order_watermark'")
+
+    # Orders moved into or out of 'cancelled', queued by a trigger for the next refresh
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS copurchase_changes (
+            id INTEGER PRIMARY KEY,
+            order_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL
+        )
+    ''')
+
+    create_recommendation_triggers(conn)
+
+    # Precomputed top-K recommendation neighbors per product
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_neighbors (
+            product_id INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (product_id, neighbor_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Precomputed related products for the product page, best match first
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_related (
+            product_id INTEGER NOT NULL,
+            related_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (product_id, rank)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_copurchase_other ON copurchase_counts (other_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_consumer ON orders (consumer_id, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)')
+
+    # Period filters compare created_at against [start, end) ranges (see dates.period_filter)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_payment_created ON orders (payment_status, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at)')
+
+    # Case-insensitive login lookups (see auth.find_user); unique unless older rows differ only by case
+    for column in ('username', 'email'):
+        try:
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_users_{column}_nocase ON users ({column} COLLATE NOCASE)')
+        except sqlite3.IntegrityError:
+            print(f"Users differing only by case in {column}; index created without uniqueness")
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_users_{column}_nocase ON users ({column} COLLATE NOCASE)')
+
+    # Denormalized rating aggregates (older databases predate these columns)
+    ratings_added = ensure_column(conn, 'products', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0')
+    ensure_column(conn, 'products', 'rating_count', 'INTEGER NOT NULL DEFAULT 0')
+    ratings_added |= ensure_column(conn, 'users', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0')
+    ensure_column(conn, 'users', 'rating_count', 'INTEGER NOT NULL DEFAULT 0')
+    
+    create_rating_triggers(conn)
+    
+    if ratings_added:
+        rebuild_rating_aggregates(conn)
+    
+    # Geocoded user locations with an R*Tree index for radius searches
+    locations_added = ensure_column(conn, 'users', 'latitude', 'REAL')
+    ensure_column(conn, 'users', 'longitude', 'REAL')
+    
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS user_locations
+        USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+    ''')
+    
+    create_location_triggers(conn)
+    
+    if locations_added:
+        from modules.geo import backfill_locations
+        backfill_locations(conn)
+    
+    # Daily and monthly rollups for charts, kept current by triggers on the write paths
+    rollups_added = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollups (
+            metric TEXT NOT NULL,
+            grain TEXT NOT NULL CHECK(grain IN ('day', 'month')),
+            key INTEGER NOT NULL DEFAULT 0,
+            bucket TEXT NOT NULL,
+            value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, grain, key, bucket)
+        ) WITHOUT ROWID
+    ''')
+    
+    create_rollup_triggers(conn)
+    
+    if rollups_added:
+        rebuild_rollups(conn)
+    
+    # Notification inbox: unread counters kept by triggers, old rows archived (see modules.notifications)
+    counts_added = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notification_counts'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notification_counts (
+            user_id INTEGER PRIMARY KEY,
+            unread INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notifications_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title VARCHAR(200) NOT NULL,
+            message TEXT NOT NULL,
+            type VARCHAR(50),
+            is_read BOOLEAN,
+            link VARCHAR(200),
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications (user_id, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_notifications_created ON notifications (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_notifications_archive_user ON notifications_archive (user_id, id)')
+    
+    create_notification_triggers(conn)
+    
+    if counts_added:
+        rebuild_notification_counts(conn)
+    
+    # Events pushed to browsers over SSE, written by triggers (see modules.events)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS event_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_event_log_channel ON event_log (channel, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_event_log_created ON event_log (created_at)')
+    
+    create_event_triggers(conn)
+    
+    # Server-side sessions; user_stamp changes whenever the user's row does (see modules.sessions)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            user_stamp INTEGER NOT NULL DEFAULT 0,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+    
+    create_session_triggers(conn)
+    
     # Insert default categories
     categories = [
         ('Vegetables', 'Fresh seasonal vegetables'),
@@ -356,6 +555,7 @@ def init_db():
         ('contact_phone', '+91-9999999999'),
         ('delivery_charge', '50'),
         ('free_delivery_above', '1000'),
+        ('max_delivery_charge', '250'),
         ('commission_rate', '5')
     ]
     
@@ -369,21 +569,326 @@ def init_db():
     conn.close()
     print("Database initialized successfully!")
 
+def ensure_column(conn, table, column, definition):
+    """Add a column to an existing table if it is missing, return True if added"""
+    columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column in columns:
+        return False
+    
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+def create_rating_triggers(conn):
+    """Keep products/users rating_sum and rating_count in step with reviews"""
+    # Product reviews -> products.rating_sum / rating_count
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS reviews_rating_insert
+        AFTER INSERT ON reviews WHEN NEW.is_approved = 1
+        BEGIN
+            UPDATE products
+            SET rating_sum = rating_sum + NEW.rating, rating_count = rating_count + 1
+            WHERE id = NEW.product_id;
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS reviews_rating_delete
+        AFTER DELETE ON reviews WHEN OLD.is_approved = 1
+        BEGIN
+            UPDATE products
+            SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+            WHERE id = OLD.product_id;
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS reviews_rating_update
+        AFTER UPDATE OF rating, is_approved, product_id ON reviews
+        BEGIN
+            UPDATE products
+            SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+            WHERE id = OLD.product_id AND OLD.is_approved = 1;
+            UPDATE products
+            SET rating_sum = rating_sum + NEW.rating, rating_count = rating_count + 1
+            WHERE id = NEW.product_id AND NEW.is_approved = 1;
+        END
+    ''')
+    
+    # Farmer ratings -> users.rating_sum / rating_count
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS farmer_ratings_insert
+        AFTER INSERT ON farmer_ratings WHEN NEW.is_approved = 1
+        BEGIN
+            UPDATE users
+            SET rating_sum = rating_sum + NEW.rating, rating_count = rating_count + 1
+            WHERE id = NEW.farmer_id;
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS farmer_ratings_delete
+        AFTER DELETE ON farmer_ratings WHEN OLD.is_approved = 1
+        BEGIN
+            UPDATE users
+            SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+            WHERE id = OLD.farmer_id;
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS farmer_ratings_update
+        AFTER UPDATE OF rating, is_approved, farmer_id ON farmer_ratings
+        BEGIN
+            UPDATE users
+            SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+            WHERE id = OLD.farmer_id AND OLD.is_approved = 1;
+            UPDATE users
+            SET rating_sum = rating_sum + NEW.rating, rating_count = rating_count + 1
+            WHERE id = NEW.farmer_id AND NEW.is_approved = 1;
+        END
+    ''')
+
+def rebuild_rating_aggregates(conn):
+    """Recompute rating aggregates from the reviews and farmer_ratings tables"""
+    conn.execute('''
+        UPDATE products SET
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews
+                          WHERE product_id = products.id AND is_approved = 1),
+            rating_count = (SELECT COUNT(*) FROM reviews
+                            WHERE product_id = products.id AND is_approved = 1)
+    ''')
+    
+    conn.execute('''
+        UPDATE users SET
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM farmer_ratings
+                          WHERE farmer_id = users.id AND is_approved = 1),
+            rating_count = (SELECT COUNT(*) FROM farmer_ratings
+                            WHERE farmer_id = users.id AND is_approved = 1)
+    ''')
+
+def create_location_triggers(conn):
+    """Mirror users.latitude/longitude into the user_locations R*Tree"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_location_insert
+        AFTER INSERT ON users
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO user_locations
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_location_update
+        AFTER UPDATE OF latitude, longitude ON users
+        BEGIN
+            DELETE FROM user_locations WHERE id = OLD.id;
+            INSERT INTO user_locations
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_location_delete
+        AFTER DELETE ON users
+        BEGIN
+            DELETE FROM user_locations WHERE id = OLD.id;
+        END
+    ''')
+
+# Each rollup row is added to a day bucket (first 10 characters of the
+# timestamp) and a month bucket (first 7)
+ROLLUP_GRAINS = "(SELECT 'day' AS grain, 10 AS length UNION ALL SELECT 'month', 7) g"
+
+def rollup_upsert(metric, key, timestamp, amount, source='', where='1', group_by=''):
+    """Statement adding amount to a metric's day and month buckets"""
+    return f'''
+        INSERT INTO rollups (metric, grain, key, bucket, value)
+        SELECT {metric}, g.grain, {key}, substr({timestamp}, 1, g.length), {amount}
+        FROM {ROLLUP_GRAINS} {source}
+        WHERE {where} {group_by}
+        ON CONFLICT (metric, grain, key, bucket) DO UPDATE SET value = value + excluded.value;
+    '''
+
+def create_rollup_triggers(conn):
+    """Keep registrations, orders, revenue and per-farmer earnings rollups in step with writes"""
+    def registrations(row, sign):
+        return rollup_upsert(f"{row}.user_type || '_registrations'", 0, f'{row}.created_at', sign,
+                             where=f"{row}.user_type IN ('farmer', 'consumer')")
+    
+    def order_totals(row, sign):
+        return (rollup_upsert("'orders'", 0, f'{row}.created_at', sign) +
+                rollup_upsert("'revenue'", 0, f'{row}.created_at', f'{sign} * {row}.total_amount',
+                              where=f"{row}.payment_status = 'paid'"))
+    
+    def order_earnings(row, sign):
+        return rollup_upsert("'farmer_earnings'", 'oi.farmer_id', f'{row}.created_at',
+                             f'{sign} * SUM(oi.subtotal)', source='JOIN order_items oi',
+                             where=f"oi.order_id = {row}.id AND {row}.payment_status = 'paid'",
+                             group_by='GROUP BY oi.farmer_id, g.grain')
+    
+    def item_earnings(row, sign):
+        return rollup_upsert("'farmer_earnings'", f'{row}.farmer_id', 'o.created_at',
+                             f'{sign} * {row}.subtotal', source='JOIN orders o',
+                             where=f"o.id = {row}.order_id AND o.payment_status = 'paid'")
+    
+    triggers = {
+        'users_rollup_insert': ('AFTER INSERT ON users', registrations('NEW', 1)),
+        'users_rollup_delete': ('AFTER DELETE ON users', registrations('OLD', -1)),
+        'users_rollup_update': ('AFTER UPDATE OF user_type, created_at ON users',
+                                registrations('OLD', -1) + registrations('NEW', 1)),
+        'orders_rollup_insert': ('AFTER INSERT ON orders',
+                                 order_totals('NEW', 1) + order_earnings('NEW', 1)),
+        'orders_rollup_delete': ('AFTER DELETE ON orders',
+                                 order_totals('OLD', -1) + order_earnings('OLD', -1)),
+        'orders_rollup_update': ('AFTER UPDATE OF payment_status, total_amount, created_at ON orders',
+                                 order_totals('OLD', -1) + order_earnings('OLD', -1) +
+                                 order_totals('NEW', 1) + order_earnings('NEW', 1)),
+        'order_items_rollup_insert': ('AFTER INSERT ON order_items', item_earnings('NEW', 1)),
+        'order_items_rollup_delete': ('AFTER DELETE ON order_items', item_earnings('OLD', -1)),
+        'order_items_rollup_update': ('AFTER UPDATE OF order_id, farmer_id, subtotal ON order_items',
+                                      item_earnings('OLD', -1) + item_earnings('NEW', 1)),
+    }
+    for name, (event, body) in triggers.items():
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from the users, orders and order_items tables"""
+    conn.execute('DELETE FROM rollups')
+    conn.execute(rollup_upsert("u.user_type || '_registrations'", 0, 'u.created_at', 'COUNT(*)',
+                               source='JOIN users u', where="u.user_type IN ('farmer', 'consumer')",
+                               group_by='GROUP BY 1, 2, 3, 4'))
+    conn.execute(rollup_upsert("'orders'", 0, 'o.created_at', 'COUNT(*)',
+                               source='JOIN orders o', group_by='GROUP BY 1, 2, 3, 4'))
+    conn.execute(rollup_upsert("'revenue'", 0, 'o.created_at', 'SUM(o.total_amount)',
+                               source='JOIN orders o', where="o.payment_status = 'paid'",
+                               group_by='GROUP BY 1, 2, 3, 4'))
+    conn.execute(rollup_upsert("'farmer_earnings'", 'oi.farmer_id', 'o.created_at', 'SUM(oi.subtotal)',
+                               source='JOIN orders o JOIN order_items oi ON oi.order_id = o.id',
+                               where="o.payment_status = 'paid'", group_by='GROUP BY 1, 2, 3, 4'))
+
+def create_notification_triggers(conn):
+    """Keep notification_counts.unread equal to each user's unread notifications"""
+    def adjust(user, amount):
+        return f'''
+            INSERT INTO notification_counts (user_id, unread) VALUES ({user}, {amount})
+            ON CONFLICT (user_id) DO UPDATE SET unread = unread + excluded.unread;
+        '''
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS notifications_unread_insert
+        AFTER INSERT ON notifications WHEN NOT NEW.is_read
+        BEGIN {adjust('NEW.user_id', 1)} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS notifications_unread_delete
+        AFTER DELETE ON notifications WHEN NOT OLD.is_read
+        BEGIN {adjust('OLD.user_id', -1)} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS notifications_unread_update
+        AFTER UPDATE OF is_read, user_id ON notifications
+        WHEN (NOT OLD.is_read) IS NOT (NOT NEW.is_read) OR OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            {adjust('OLD.user_id', '-(NOT OLD.is_read)')}
+            {adjust('NEW.user_id', 'NOT NEW.is_read')}
+        END
+    ''')
+
+def rebuild_notification_counts(conn):
+    """Recompute every user's unread counter from the notifications table"""
+    conn.execute('DELETE FROM notification_counts')
+    conn.execute('''
+        INSERT INTO notification_counts (user_id, unread)
+        SELECT user_id, COUNT(*) FROM notifications WHERE NOT is_read GROUP BY user_id
+    ''')
+
+def create_recommendation_triggers(conn):
+    """Queue a correction to the co-purchase counts when an order is cancelled or reinstated"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS orders_copurchase_status
+        AFTER UPDATE OF status ON orders
+        WHEN (NEW.status = 'cancelled') != (OLD.status = 'cancelled')
+        BEGIN
+            INSERT INTO copurchase_changes (order_id, delta)
+            VALUES (NEW.id, CASE WHEN NEW.status = 'cancelled' THEN -1 ELSE 1 END);
+        END
+    ''')
+
+def create_event_triggers(conn):
+    """Log order tracking entries for the consumer and each farmer on the order, and new notifications"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS order_tracking_event
+        AFTER INSERT ON order_tracking
+        BEGIN
+            INSERT INTO event_log (channel, event, data)
+            SELECT 'user:' || recipient, 'order', json_object(
+                'order_id', o.id, 'order_number', o.order_number, 'status', NEW.status,
+                'message', NEW.message, 'order_status', o.status, 'payment_status', o.payment_status,
+                'created_at', NEW.created_at)
+            FROM orders o
+            JOIN (SELECT o2.consumer_id AS recipient FROM orders o2 WHERE o2.id = NEW.order_id
+                  UNION SELECT farmer_id FROM order_items WHERE order_id = NEW.order_id)
+            WHERE o.id = NEW.order_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS notifications_event
+        AFTER INSERT ON notifications
+        BEGIN
+            INSERT INTO event_log (channel, event, data)
+            VALUES ('user:' || NEW.user_id, 'notification', json_object(
+                'id', NEW.id, 'title', NEW.title, 'message', NEW.message, 'type', NEW.type,
+                'link', NEW.link, 'created_at', NEW.created_at));
+        END
+    ''')
+
+def create_session_triggers(conn):
+    """Invalidate cached user rows on any change to the user, and sign out deactivated or deleted users"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_session_update
+        AFTER UPDATE ON users
+        BEGIN
+            UPDATE sessions SET user_stamp = user_stamp + 1 WHERE user_id = NEW.id;
+            DELETE FROM sessions WHERE user_id = NEW.id AND NOT NEW.is_active;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_session_delete
+        AFTER DELETE ON users
+        BEGIN
+            DELETE FROM sessions WHERE user_id = OLD.id;
+        END
+    ''')
+
+# Site settings are cached per process and re-read after SETTINGS_TTL seconds,
+# so other workers see an admin's change within that time (or on reload)
+SETTINGS_TTL = 30
+_settings = {'values': None, 'loaded': 0.0}
+
+def load_settings():
+    """Read every site setting into this process's cache; returns the count"""
+    conn = get_db_connection(row_factory=None)
+    values = dict(conn.execute('SELECT key, value FROM site_settings'))
+    conn.close()
+    _settings.update(values=values, loaded=time.monotonic())
+    return len(values)
+
+def clear_settings():
+    _settings['values'] = None
+
 def get_setting(key, default=None):
     """Get site setting value"""
-    conn = get_db_connection()
-    result = conn.execute(
-        'SELECT value FROM site_settings WHERE key = ?', (key,)
-    ).fetchone()
-    conn.close()
-    return result['value'] if result else default
+    if _settings['values'] is None or time.monotonic() - _settings['loaded'] > SETTINGS_TTL:
+        load_settings()
+    return _settings['values'].get(key, default)
 
 def update_setting(key, value):
     """Update site setting"""
+    from modules.repository import set_setting
     conn = get_db_connection()
-    conn.execute('''
-        INSERT OR REPLACE INTO site_settings (key, value, updated_at)
-        VALUES (?, ?, CURRENT_TIMESTAMP)
-    ''', (key, value))
+    set_setting(conn, key, value)
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+    clear_settings()
\ No newline at end of file
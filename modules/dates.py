@@ -0,0 +1,138 @@
+"""
+Dates module for Farmer Connect
+Fast parsing and memoized formatting of SQLite timestamp strings for templates,
+and index-friendly period ranges for SQL filters
+"""
+
+import re
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from modules import metrics
+
+# Directives that need the time of day, and the ones that need seconds or finer
+_TIME_DIRECTIVES = re.compile(r'%[HIMSfpXcTrRzZ]')
+_SECOND_DIRECTIVES = re.compile(r'%[SfXcTrzZ]')
+
+@lru_cache(maxsize=8192)
+def parse_timestamp(value):
+    """Parse 'YYYY-MM-DD[ HH:MM[:SS[.ffffff]]]' (optionally with T or Z) into a datetime"""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+@lru_cache(maxsize=64)
+def _significant_length(format_string):
+    """Characters of a timestamp that can change the formatted output"""
+    if _SECOND_DIRECTIVES.search(format_string):
+        return None
+    if _TIME_DIRECTIVES.search(format_string):
+        return 16
+    return 10
+
+@lru_cache(maxsize=8192)
+def _format_cached(prefix, format_string):
+    return parse_timestamp(prefix).strftime(format_string)
+
+def format_date(date_string, format_string='%b %d, %Y'):
+    """Format date string from SQLite to readable format"""
+    if not date_string:
+        return 'Unknown'
+
+    # If it's already a datetime object, just format it
+    if hasattr(date_string, 'strftime'):
+        return date_string.strftime(format_string)
+
+    # Rows from the same day (or minute) share a cache entry
+    value = str(date_string)
+    length = _significant_length(format_string)
+    try:
+        return _format_cached(value[:length] if length else value, format_string)
+    except ValueError:
+        # If it can't be parsed, return the original string
+        return value
+
+def date_diff_days(date_string):
+    """Days from today until a SQLite date string (negative once it has passed)"""
+    try:
+        return (parse_timestamp(str(date_string)[:10]).date() - datetime.now().date()).days
+    except ValueError:
+        return -1
+
+def format_time_ago(datetime_str):
+    """Format datetime as time ago (e.g., '2 hours ago')"""
+    if not datetime_str:
+        return "Unknown"
+
+    try:
+        dt = parse_timestamp(datetime_str) if isinstance(datetime_str, str) else datetime_str
+        seconds = (datetime.now() - dt).total_seconds()
+
+        if seconds < 60:
+            return "Just now"
+        elif seconds < 3600:
+            minutes = int(seconds / 60)
+            return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+        elif seconds < 86400:
+            hours = int(seconds / 3600)
+            return f"{hours} hour{'s' if hours != 1 else ''} ago"
+        elif seconds < 2592000:  # 30 days
+            days = int(seconds / 86400)
+            return f"{days} day{'s' if days != 1 else ''} ago"
+        else:
+            return dt.strftime("%b %d, %Y")
+
+    except Exception as e:
+        print(f"Format time ago error: {e}")
+        return str(datetime_str)
+
+# Periods accepted by period_range besides 'custom'
+PERIODS = ('today', 'week', 'month', 'year')
+
+def sql_timestamp(value):
+    """SQLite CURRENT_TIMESTAMP-style string for a date or datetime"""
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def period_range(period, now=None, start=None, end=None):
+    """Half-open UTC range [start, end) as timestamp strings, or (None, None) for all time
+
+    'week' covers the last seven days plus today. 'custom' takes start and end
+    dates (inclusive, as 'YYYY-MM-DD' strings or date objects); either may be
+    omitted to leave that side open. Timestamps are compared as strings, which
+    lets SQLite use an index on the column instead of computing DATE() or
+    strftime() for every row.
+    """
+    today = (now or datetime.now(timezone.utc)).date()
+    if period == 'today':
+        first, last = today, today
+    elif period == 'week':
+        first, last = today - timedelta(days=7), today
+    elif period == 'month':
+        first = today.replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    elif period == 'year':
+        first, last = date(today.year, 1, 1), date(today.year, 12, 31)
+    elif period == 'custom':
+        first = parse_timestamp(start).date() if isinstance(start, str) else start
+        last = parse_timestamp(end).date() if isinstance(end, str) else end
+    else:
+        return None, None
+
+    return (sql_timestamp(first) if first else None,
+            sql_timestamp(last + timedelta(days=1)) if last else None)
+
+def period_filter(column, period, now=None, start=None, end=None):
+    """SQL condition ('AND column >= ? AND column < ?') and its parameters for a period"""
+    first, last = period_range(period, now, start, end)
+    clauses, params = [], []
+    if first:
+        clauses.append(f'AND {column} >= ?')
+        params.append(first)
+    if last:
+        clauses.append(f'AND {column} < ?')
+        params.append(last)
+    return ' '.join(clauses), params
+
+metrics.register_cache('parse_timestamp', parse_timestamp.cache_info)
+metrics.register_cache('format_date', _format_cached.cache_info)
@@ -0,0 +1,115 @@
+"""
+Events module for Farmer Connect
+Server-Sent Events for order updates and notifications, read from a trigger-fed event log
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from flask import Response, request, session
+from modules.database import get_db_connection
+from modules.dates import sql_timestamp
+from modules import metrics
+
+# Seconds between event log checks when no local write wakes the stream (other workers' writes)
+POLL_INTERVAL = 2.0
+
+# Seconds between keep-alive comments, so proxies do not drop idle streams
+KEEPALIVE = 15.0
+
+# Seconds before a stream ends; EventSource reconnects with Last-Event-ID
+STREAM_LIFETIME = 300.0
+
+# Milliseconds EventSource waits between polls when the view answers without streaming (WSGI mode)
+POLL_RETRY_MS = 5000
+
+# Hours of events kept for reconnecting clients
+RETENTION_HOURS = 24
+
+# Share of write requests that also delete expired events
+PRUNE_PROBABILITY = 0.01
+
+_streams = [0]
+_listeners = []
+
+metrics.register_gauge('sse_streams', 'Server-Sent Event streams open in this process',
+                       lambda: _streams[0], per_process=True)
+
+def wake():
+    """Tell this process's streams that the event log may have grown"""
+    for listener in _listeners:
+        listener()
+
+def on_wake(listener):
+    """Call listener() from wake(); ASGI streams wait on it instead of polling"""
+    _listeners.append(listener)
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+def channel(user_id):
+    return f'user:{user_id}'
+
+def latest_id(conn, user_id):
+    row = conn.execute('SELECT MAX(id) FROM event_log WHERE channel = ?', (channel(user_id),)).fetchone()
+    return row[0] or 0
+
+def fetch(conn, user_id, after_id, limit=100):
+    """(id, event, data) rows for a user after after_id, oldest first"""
+    return conn.execute('''
+        SELECT id, event, data FROM event_log
+        WHERE channel = ? AND id > ?
+        ORDER BY id LIMIT ?
+    ''', (channel(user_id), after_id, limit)).fetchall()
+
+def format_event(event_id, event, data):
+    """One SSE message; data is already JSON"""
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+def event_stream():
+    """Events logged for the signed-in user after Last-Event-ID, as one short text/event-stream response
+
+    A held-open stream would pin a WSGI worker thread for its whole lifetime,
+    so this view answers at once and ends with a retry: hint. EventSource
+    reconnects after POLL_RETRY_MS with the last id it saw, which turns it
+    into polling. Live streams are served by the ASGI app (modules/asgi.py),
+    where they cost no threads.
+    """
+    user_id = session['user_id']
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_id', type=int), type=int)
+    conn = get_db_connection(row_factory=None)
+    if last_id is None:
+        last_id = latest_id(conn, user_id)
+    rows = fetch(conn, user_id, last_id)
+    conn.close()
+
+    body = [f'retry: {POLL_RETRY_MS}\n\n']
+    body.extend(format_event(event_id, event, data) for event_id, event, data in rows)
+    if not rows:
+        # An id-only message sets the id EventSource sends back, so the next poll resumes here
+        body.append(f'id: {last_id}\n\n')
+    return Response(''.join(body), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+def prune(conn, hours=RETENTION_HOURS):
+    """Delete events older than `hours`; returns rows removed"""
+    cutoff = sql_timestamp(datetime.now(timezone.utc) - timedelta(hours=hours))
+    removed = conn.execute('DELETE FROM event_log WHERE created_at < ?', (cutoff,)).rowcount
+    conn.commit()
+    return removed
+
+def init_app(app):
+    """Wake open streams after every request that may have written to the database
+
+    A share of those requests (PRUNE_PROBABILITY) also prune the event log.
+    """
+    @app.after_request
+    def wake_streams(response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            wake()
+            if random.random() < PRUNE_PROBABILITY:
+                conn = get_db_connection()
+                try:
+                    prune(conn)
+                finally:
+                    conn.close()
+        return response
@@ -5,14 +5,23 @@ Handles farmer-specific functionality
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response
 from modules.database import get_db_connection
-from modules.utils import require_login, require_approval, save_uploaded_file, send_notification
-from datetime import datetime, date
+from modules.replica import get_read_connection
+from modules.utils import require_login, require_approval, save_uploaded_file, send_notification, average_rating, get_pagination_data
+from modules.geo import update_user_location
+from modules.sessions import current_user, reload_current_user
+from modules.rows import fetch_records, tuple_cursor
+from modules.dates import period_filter
+from modules import repository, rollups
+from datetime import datetime, date, timedelta, timezone
 import os
 import csv
 import io
 
 farmer_bp = Blueprint('farmer', __name__)
 
+# Line items per page of the earnings report
+EARNINGS_PAGE_SIZE = 50
+
 @farmer_bp.route('/dashboard')
 @require_login(['farmer'])
 @require_approval
@@ -21,9 +30,7 @@ def dashboard():
     conn = get_db_connection()
     
     # Get farmer information
-    farmer = conn.execute('''
-        SELECT * FROM users WHERE id = ? AND user_type = 'farmer'
-    ''', (session['user_id'],)).fetchone()
+    farmer = current_user()
     
     if not farmer:
         flash('Farmer not found!', 'error')
@@ -57,20 +64,22 @@ def dashboard():
     ''', (session['user_id'],)).fetchone()[0]
     
     # Today's earnings
-    stats['today_earnings'] = conn.execute('''
+    today_filter, today_params = period_filter('o.created_at', 'today')
+    stats['today_earnings'] = conn.execute(f'''
         SELECT COALESCE(SUM(oi.subtotal), 0) FROM orders o
         JOIN order_items oi ON o.id = oi.order_id
-        WHERE oi.farmer_id = ? AND DATE(o.created_at) = DATE('now')
+        WHERE oi.farmer_id = ? {today_filter}
         AND o.payment_status = 'paid'
-    ''', (session['user_id'],)).fetchone()[0]
+    ''', [session['user_id']] + today_params).fetchone()[0]
     
     # Month's earnings
-    stats['month_earnings'] = conn.execute('''
+    month_filter, month_params = period_filter('o.created_at', 'month')
+    stats['month_earnings'] = conn.execute(f'''
         SELECT COALESCE(SUM(oi.subtotal), 0) FROM orders o
         JOIN order_items oi ON o.id = oi.order_id
-        WHERE oi.farmer_id = ? AND strftime('%Y-%m', o.created_at) = strftime('%Y-%m', 'now')
+        WHERE oi.farmer_id = ? {month_filter}
         AND o.payment_status = 'paid'
-    ''', (session['user_id'],)).fetchone()[0]
+    ''', [session['user_id']] + month_params).fetchone()[0]
     
     # Total earnings
     stats['total_earnings'] = conn.execute('''
@@ -95,14 +104,14 @@ def dashboard():
     # Average rating and total reviews
     try:
         rating_data = conn.execute('''
-            SELECT AVG(rating) as avg_rating, COUNT(*) as total_reviews 
-            FROM reviews r
-            JOIN products p ON r.product_id = p.id
-            WHERE p.farmer_id = ? AND r.is_approved = 1
+            SELECT COALESCE(SUM(rating_sum), 0) as rating_sum,
+                   COALESCE(SUM(rating_count), 0) as total_reviews
+            FROM products
+            WHERE farmer_id = ?
         ''', (session['user_id'],)).fetchone()
         
-        stats['avg_rating'] = round(rating_data[0], 1) if rating_data[0] else None
-        stats['total_reviews'] = rating_data[1] if rating_data[1] else 0
+        stats['avg_rating'] = average_rating(rating_data[0], rating_data[1]) if rating_data[1] else None
+        stats['total_reviews'] = rating_data[1]
     except Exception as e:
         # Handle case where reviews table might not exist or query fails
         stats['avg_rating'] = None
@@ -155,24 +164,7 @@ def dashboard():
     ''', (session['user_id'],)).fetchall()
     
     # Monthly earnings data for chart (last 12 months)
-    monthly_earnings = []
-    try:
-        monthly_data = conn.execute('''
-            SELECT strftime('%Y-%m', o.created_at) as month,
-                   strftime('%m/%Y', o.created_at) as month_display,
-                   COALESCE(SUM(oi.subtotal), 0) as earnings
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            WHERE oi.farmer_id = ? AND o.payment_status = 'paid'
-            AND o.created_at >= date('now', '-12 months')
-            GROUP BY strftime('%Y-%m', o.created_at)
-            ORDER BY month
-        ''', (session['user_id'],)).fetchall()
-        
-        monthly_earnings = [{'month': row[1], 'earnings': float(row[2])} for row in monthly_data]
-    except Exception as e:
-        # If there's an error, provide empty data
-        monthly_earnings = []
+    monthly_earnings = rollups.series(conn, 'farmer_earnings', key=session['user_id'])
     
     conn.close()
     
@@ -193,9 +185,7 @@ def products():
     conn = get_db_connection()
     
     # Get farmer information
-    farmer = conn.execute('''
-        SELECT * FROM users WHERE id = ? AND user_type = 'farmer'
-    ''', (session['user_id'],)).fetchone()
+    farmer = current_user()
     
     if not farmer:
         flash('Farmer not found!', 'error')
@@ -542,10 +532,6 @@ def orders():
     
     orders_list = conn.execute(query, params).fetchall()
     
-    # Debug: Check date values
-    for order in orders_list[:3]:  # Check first 3 orders
-        print(f"Order {order['id']}: created_at = '{order['created_at']}', type = {type(order['created_at'])}")
-    
     # Check if export is requested
     export = request.args.get('export', '')
     if export == 'true':
@@ -722,7 +708,7 @@ def order_detail(order_id):
 @require_approval
 def earnings():
     """Farmer earnings dashboard"""
-    conn = get_db_connection()
+    conn = get_read_connection()
     
     # Get earnings stats
     stats = {}
@@ -735,28 +721,31 @@ def earnings():
     ''', (session['user_id'],)).fetchone()[0]
     
     # This month earnings
-    stats['month_earnings'] = conn.execute('''
+    date_filter, date_params = period_filter('o.created_at', 'month')
+    stats['month_earnings'] = conn.execute(f'''
         SELECT COALESCE(SUM(oi.subtotal), 0) FROM orders o
         JOIN order_items oi ON o.id = oi.order_id
         WHERE oi.farmer_id = ? AND o.payment_status = 'paid'
-        AND strftime('%Y-%m', o.created_at) = strftime('%Y-%m', 'now')
-    ''', (session['user_id'],)).fetchone()[0]
+        {date_filter}
+    ''', [session['user_id']] + date_params).fetchone()[0]
     
     # This week earnings
-    stats['week_earnings'] = conn.execute('''
+    date_filter, date_params = period_filter('o.created_at', 'week')
+    stats['week_earnings'] = conn.execute(f'''
         SELECT COALESCE(SUM(oi.subtotal), 0) FROM orders o
         JOIN order_items oi ON o.id = oi.order_id
         WHERE oi.farmer_id = ? AND o.payment_status = 'paid'
-        AND DATE(o.created_at) >= DATE('now', '-7 days')
-    ''', (session['user_id'],)).fetchone()[0]
+        {date_filter}
+    ''', [session['user_id']] + date_params).fetchone()[0]
     
     # Today's earnings
-    stats['today_earnings'] = conn.execute('''
+    date_filter, date_params = period_filter('o.created_at', 'today')
+    stats['today_earnings'] = conn.execute(f'''
         SELECT COALESCE(SUM(oi.subtotal), 0) FROM orders o
         JOIN order_items oi ON o.id = oi.order_id
         WHERE oi.farmer_id = ? AND o.payment_status = 'paid'
-        AND DATE(o.created_at) = DATE('now')
-    ''', (session['user_id'],)).fetchone()[0]
+        {date_filter}
+    ''', [session['user_id']] + date_params).fetchone()[0]
     
     # Recent earnings transactions
     recent_earnings = conn.execute('''
@@ -770,16 +759,7 @@ def earnings():
     ''', (session['user_id'],)).fetchall()
     
     # Monthly earnings for chart
-    monthly_earnings = conn.execute('''
-        SELECT strftime('%Y-%m', o.created_at) as month, 
-               SUM(oi.subtotal) as earnings
-        FROM orders o
-        JOIN order_items oi ON o.id = oi.order_id
-        WHERE oi.farmer_id = ? AND o.payment_status = 'paid'
-        GROUP BY strftime('%Y-%m', o.created_at)
-        ORDER BY month DESC
-        LIMIT 12
-    ''', (session['user_id'],)).fetchall()
+    monthly_earnings = rollups.series(conn, 'farmer_earnings', key=session['user_id'])
     
     conn.close()
     
@@ -899,21 +879,48 @@ def restock_product(product_id):
 @require_approval
 def earnings_report(period):
     """Generate earnings report for specific period"""
-    conn = get_db_connection()
+    conn = get_read_connection()
     
-    # Define period filters
-    date_filter = ""
-    if period == 'today':
-        date_filter = "AND DATE(o.created_at) = DATE('now')"
-    elif period == 'week':
-        date_filter = "AND DATE(o.created_at) >= DATE('now', '-7 days')"
-    elif period == 'month':
-        date_filter = "AND strftime('%Y-%m', o.created_at) = strftime('%Y-%m', 'now')"
-    elif period == 'year':
-        date_filter = "AND strftime('%Y', o.created_at) = strftime('%Y', 'now')"
-    
-    # Get detailed earnings data
-    earnings_data = conn.execute(f'''
+    # Period as a half-open created_at range; 'custom' reads ?start=YYYY-MM-DD&end=YYYY-MM-DD
+    try:
+        date_filter, date_params = period_filter('o.created_at', period,
+                                                 start=request.args.get('start') or None,
+                                                 end=request.args.get('end') or None)
+    except ValueError:
+        # A malformed ?start=/?end= must not widen the report to all time
+        conn.close()
+        flash('Invalid date range', 'error')
+        return redirect(url_for('farmer.earnings_report', period='month'))
+    
+    # Summary per category plus a grand total row (category IS NULL), in one statement
+    summary_rows = conn.execute(f'''
+        WITH items AS (
+            SELECT p.category, oi.order_id, oi.quantity, oi.subtotal
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            JOIN products p ON oi.product_id = p.id
+            WHERE oi.farmer_id = ? AND o.payment_status = 'paid' {date_filter}
+        )
+        SELECT category, SUM(subtotal) as earnings, SUM(quantity) as items_sold,
+               COUNT(DISTINCT order_id) as orders, COUNT(*) as line_items, 0 as is_total
+        FROM items
+        GROUP BY category
+        UNION ALL
+        SELECT NULL, COALESCE(SUM(subtotal), 0), COALESCE(SUM(quantity), 0),
+               COUNT(DISTINCT order_id), COUNT(*), 1
+        FROM items
+        ORDER BY is_total DESC, earnings DESC
+    ''', [session['user_id']] + date_params).fetchall()
+    
+    totals = summary_rows[0]
+    category_stats = {row['category']: {'earnings': row['earnings'],
+                                        'items_sold': row['items_sold'],
+                                        'orders': row['orders']}
+                      for row in summary_rows[1:]}
+    
+    # Only the current page of line items is fetched
+    pagination = get_pagination_data(totals['line_items'], request.args.get('page', 1, type=int), EARNINGS_PAGE_SIZE)
+    earnings_data = fetch_records(conn, f'''
         SELECT o.order_number, o.created_at, o.payment_status, 
                p.name as product_name, p.category, p.unit,
                oi.quantity, oi.price, oi.subtotal,
@@ -923,32 +930,19 @@ def earnings_report(period):
         JOIN products p ON oi.product_id = p.id
         JOIN users u ON o.consumer_id = u.id
         WHERE oi.farmer_id = ? AND o.payment_status = 'paid' {date_filter}
-        ORDER BY o.created_at DESC
-    ''', (session['user_id'],)).fetchall()
-    
-    # Calculate summary
-    total_earnings = sum(row['subtotal'] for row in earnings_data)
-    total_orders = len(set(row['order_number'] for row in earnings_data))
-    total_items_sold = sum(row['quantity'] for row in earnings_data)
-    
-    # Category-wise breakdown
-    category_stats = {}
-    for row in earnings_data:
-        category = row['category']
-        if category not in category_stats:
-            category_stats[category] = {'earnings': 0, 'items_sold': 0, 'orders': 0}
-        category_stats[category]['earnings'] += row['subtotal']
-        category_stats[category]['items_sold'] += row['quantity']
-        category_stats[category]['orders'] += 1
+        ORDER BY o.created_at DESC, oi.id
+        LIMIT ? OFFSET ?
+    ''', [session['user_id']] + date_params + [pagination['per_page'], pagination['offset']])
     
     conn.close()
     
     return render_template('farmer/earnings_report.html',
                          period=period,
                          earnings_data=earnings_data,
-                         total_earnings=total_earnings,
-                         total_orders=total_orders,
-                         total_items_sold=total_items_sold,
+                         pagination=pagination,
+                         total_earnings=totals['earnings'],
+                         total_orders=totals['orders'],
+                         total_items_sold=totals['items_sold'],
                          category_stats=category_stats)
 
 @farmer_bp.route('/api/earnings/export/<format>/<period>')
@@ -960,36 +954,32 @@ def export_earnings(format, period):
     import json
     from io import StringIO
     
-    conn = get_db_connection()
-    
-    # Define period filters
-    date_filter = ""
-    if period == 'today':
-        date_filter = "AND DATE(o.created_at) = DATE('now')"
-    elif period == 'week':
-        date_filter = "AND DATE(o.created_at) >= DATE('now', '-7 days')"
-    elif period == 'month':
-        date_filter = "AND strftime('%Y-%m', o.created_at) = strftime('%Y-%m', 'now')"
-    elif period == 'year':
-        date_filter = "AND strftime('%Y', o.created_at) = strftime('%Y', 'now')"
-    
-    # Get earnings data
-    earnings_data = conn.execute(f'''
-        SELECT o.order_number, o.created_at, 
-               p.name as product_name, p.category, p.unit,
-               oi.quantity, oi.price, oi.subtotal,
-               u.full_name as consumer_name
-        FROM orders o
-        JOIN order_items oi ON o.id = oi.order_id
-        JOIN products p ON oi.product_id = p.id
-        JOIN users u ON o.consumer_id = u.id
-        WHERE oi.farmer_id = ? AND o.payment_status = 'paid' {date_filter}
-        ORDER BY o.created_at DESC
-    ''', (session['user_id'],)).fetchall()
+    conn = get_read_connection()
     
-    conn.close()
+    # Period as a half-open created_at range; 'custom' reads ?start=YYYY-MM-DD&end=YYYY-MM-DD
+    try:
+        date_filter, date_params = period_filter('o.created_at', period,
+                                                 start=request.args.get('start') or None,
+                                                 end=request.args.get('end') or None)
+    except ValueError:
+        conn.close()
+        return jsonify({'error': 'Invalid date range'}), 400
     
     if format == 'csv':
+        # Columns are selected in CSV order so plain tuples stream straight to the writer
+        earnings_data = tuple_cursor(conn, f'''
+            SELECT o.order_number, o.created_at, 
+                   p.name as product_name, p.category, p.unit,
+                   oi.quantity, oi.price, oi.subtotal,
+                   u.full_name as consumer_name
+            FROM orders o
+            JOIN order_items oi ON o.id = oi.order_id
+            JOIN products p ON oi.product_id = p.id
+            JOIN users u ON o.consumer_id = u.id
+            WHERE oi.farmer_id = ? AND o.payment_status = 'paid' {date_filter}
+            ORDER BY o.created_at DESC
+        ''', [session['user_id']] + date_params)
+        
         output = StringIO()
         writer = csv.writer(output)
         
@@ -998,11 +988,8 @@ def export_earnings(format, period):
                         'Quantity', 'Price', 'Total', 'Customer'])
         
         # Write data
-        for row in earnings_data:
-            writer.writerow([row['order_number'], row['created_at'], 
-                           row['product_name'], row['category'], row['unit'],
-                           row['quantity'], row['price'], row['subtotal'], 
-                           row['consumer_name']])
+        writer.writerows(earnings_data)
+        conn.close()
         
         from flask import make_response
         response = make_response(output.getvalue())
@@ -1010,6 +997,7 @@ def export_earnings(format, period):
         response.headers['Content-Disposition'] = f'attachment; filename=earnings_{period}.csv'
         return response
     
+    conn.close()
     return jsonify({'error': 'Format not supported'})
 
 @farmer_bp.route('/inventory/alerts')
@@ -1034,14 +1022,15 @@ def inventory_alerts():
     ''', (session['user_id'],)).fetchall()
     
     # Get products expiring soon (within 7 days)
+    today = datetime.now(timezone.utc).date()
     expiring_soon = conn.execute('''
         SELECT * FROM products 
         WHERE farmer_id = ? AND expiry_date IS NOT NULL 
-        AND expiry_date <= DATE('now', '+7 days')
-        AND expiry_date >= DATE('now')
+        AND expiry_date <= ?
+        AND expiry_date >= ?
         AND quantity > 0 AND is_approved = 1
         ORDER BY expiry_date ASC
-    ''', (session['user_id'],)).fetchall()
+    ''', (session['user_id'], (today + timedelta(days=7)).isoformat(), today.isoformat())).fetchall()
     
     # Get existing alert settings
     alert_settings = conn.execute('''
@@ -1078,11 +1067,7 @@ def setup_inventory_alert():
         return jsonify({'success': False, 'message': 'Product not found'})
     
     try:
-        conn.execute('''
-            INSERT OR REPLACE INTO inventory_alerts 
-            (farmer_id, product_id, alert_type, threshold_value, is_active)
-            VALUES (?, ?, ?, ?, 1)
-        ''', (session['user_id'], product_id, alert_type, threshold_value))
+        repository.set_inventory_alert(conn, session['user_id'], product_id, alert_type, threshold_value)
         
         conn.commit()
         conn.close()
@@ -1376,6 +1361,7 @@ def edit_profile():
                     ''', (full_name, phone, location, farm_name, farm_description, 
                           session['user_id']))
                 
+                update_user_location(conn, session['user_id'], location)
                 conn.commit()
                 flash('Profile updated successfully!', 'success')
                 return redirect(url_for('farmer.dashboard'))
@@ -1385,9 +1371,7 @@ def edit_profile():
                 print(f"Profile update error: {e}")
     
     # Get current profile data
-    farmer = conn.execute('''
-        SELECT * FROM users WHERE id = ? AND user_type = 'farmer'
-    ''', (session['user_id'],)).fetchone()
+    farmer = reload_current_user() if request.method == 'POST' else current_user()
     
     conn.close()
     
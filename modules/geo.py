@@ -0,0 +1,156 @@
+"""
+Geo module for Farmer Connect
+Offline geocoding of user locations and distance queries over the R*Tree index
+"""
+
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+from modules import metrics
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'data', 'india_gazetteer.csv')
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Kilometres per degree of latitude
+KM_PER_DEGREE = 111.045
+
+# Longest place name in the gazetteer, in words
+MAX_NAME_WORDS = 3
+
+@lru_cache(maxsize=1)
+def load_gazetteer():
+    """Read the gazetteer into pincode, pincode-prefix and name lookups"""
+    by_pincode, by_prefix, by_name = {}, {}, {}
+
+    with open(GAZETTEER_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['latitude']), float(row['longitude']))
+            by_pincode[row['pincode']] = point
+            by_prefix.setdefault(row['pincode'][:3], point)
+            for name in [row['name']] + [alias for alias in row['aliases'].split('|') if alias]:
+                by_name[name.lower()] = point
+
+    return by_pincode, by_prefix, by_name
+
+metrics.register_cache('gazetteer', load_gazetteer.cache_info)
+
+def geocode(location):
+    """Resolve a free-text location or pincode to (latitude, longitude), or None
+
+    A 6-digit pincode wins over place names; unknown pincodes fall back to
+    their 3-digit sorting district. Otherwise the longest place name found in
+    the text is used, so "New Delhi" beats "Delhi".
+    """
+    if not location:
+        return None
+
+    by_pincode, by_prefix, by_name = load_gazetteer()
+
+    pincode = re.search(r'\b[1-9]\d{5}\b', location)
+    if pincode:
+        pincode = pincode.group()
+        point = by_pincode.get(pincode) or by_prefix.get(pincode[:3])
+        if point:
+            return point
+
+    words = re.findall(r'[a-z]+', location.lower())
+    for size in range(MAX_NAME_WORDS, 0, -1):
+        for start in range(len(words) - size + 1):
+            point = by_name.get(' '.join(words[start:start + size]))
+            if point:
+                return point
+
+    return None
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def bounding_box(latitude, longitude, radius_km):
+    """Latitude/longitude box enclosing a circle, for the R*Tree prefilter"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta
+
+def users_within(conn, latitude, longitude, radius_km, user_type='farmer'):
+    """Approved active users within radius_km, as [(user_id, distance_km)] nearest first"""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    rows = conn.execute('''
+        SELECT u.id, u.latitude, u.longitude
+        FROM user_locations l
+        JOIN users u ON u.id = l.id
+        WHERE l.max_lat >= ? AND l.min_lat <= ? AND l.max_lon >= ? AND l.min_lon <= ?
+        AND u.user_type = ? AND u.is_approved = 1 AND u.is_active = 1
+    ''', (min_lat, max_lat, min_lon, max_lon, user_type)).fetchall()
+
+    matches = []
+    for row in rows:
+        distance = haversine_km(latitude, longitude, row['latitude'], row['longitude'])
+        if distance <= radius_km:
+            matches.append((row['id'], round(distance, 1)))
+
+    return sorted(matches, key=lambda match: match[1])
+
+def nearest_users(conn, latitude, longitude, limit=10, user_type='farmer', max_radius_km=3200):
+    """The limit nearest approved users, widening the search radius until enough are found"""
+    radius_km = 10
+    while True:
+        matches = users_within(conn, latitude, longitude, radius_km, user_type)
+        if len(matches) >= limit or radius_km >= max_radius_km:
+            return matches[:limit]
+        radius_km *= 2
+
+def cart_delivery_distance(conn, consumer_id, origin=None):
+    """Distance in km from the consumer to the farthest farmer in their cart
+
+    origin overrides the consumer's profile coordinates (e.g. a geocoded
+    delivery address). Returns None when either end cannot be located.
+    """
+    rows = conn.execute('''
+        SELECT c.latitude as consumer_lat, c.longitude as consumer_lon,
+               f.latitude as farmer_lat, f.longitude as farmer_lon
+        FROM cart_items ci
+        JOIN users c ON c.id = ci.user_id
+        JOIN products p ON p.id = ci.product_id
+        JOIN users f ON f.id = p.farmer_id
+        WHERE ci.user_id = ?
+    ''', (consumer_id,)).fetchall()
+
+    distances = []
+    for row in rows:
+        start = origin or (row['consumer_lat'], row['consumer_lon'])
+        if None in start or row['farmer_lat'] is None or row['farmer_lon'] is None:
+            continue
+        distances.append(haversine_km(start[0], start[1], row['farmer_lat'], row['farmer_lon']))
+
+    return round(max(distances), 1) if distances else None
+
+def update_user_location(conn, user_id, location):
+    """Geocode a user's location text and store the coordinates (cleared if unknown)"""
+    latitude, longitude = geocode(location) or (None, None)
+    conn.execute('UPDATE users SET latitude = ?, longitude = ? WHERE id = ?',
+                 (latitude, longitude, user_id))
+
+def backfill_locations(conn):
+    """Geocode every user with a location but no coordinates"""
+    rows = conn.execute('''
+        SELECT id, location FROM users
+        WHERE latitude IS NULL AND location IS NOT NULL AND location != ''
+    ''').fetchall()
+
+    updates = []
+    for row in rows:
+        point = geocode(row['location'])
+        if point:
+            updates.append((point[0], point[1], row['id']))
+
+    conn.executemany('UPDATE users SET latitude = ?, longitude = ? WHERE id = ?', updates)
+    return len(updates)
@@ -0,0 +1,240 @@
+"""
+Instrumentation module for Farmer Connect
+Per-request SQL statistics, Server-Timing headers and the slow-query log
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+from flask import g, has_request_context, request
+from modules import metrics
+
+# Statements slower than this (ms) go to the slow-query log
+SLOW_QUERY_MS = 100
+
+# Slowest statements kept per request
+TOP_STATEMENTS = 5
+
+# Recent requests kept for the admin query debugger
+RECENT_REQUESTS = deque(maxlen=50)
+
+# Totals per normalized statement across requests, capped to bound memory
+STATEMENT_TOTALS = {}
+MAX_STATEMENTS = 500
+_totals_lock = threading.Lock()
+
+slow_query_logger = logging.getLogger('farmer_connect.slow_queries')
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse whitespace and replace literals so identical statements group together"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+    return ' '.join(sql.split())
+
+class QueryStats:
+    """SQL statements issued while handling one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+
+    def record(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        entry = self.statements.setdefault(normalize_sql(sql), [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+    def top(self, limit=TOP_STATEMENTS):
+        """Slowest normalized statements as (sql, calls, total_ms), slowest first"""
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, calls, round(total * 1000, 2)) for sql, (calls, total) in ranked[:limit]]
+
+def record_query(sql, duration):
+    """Attribute a statement to the current request and log it if slow"""
+    if has_request_context():
+        stats = g.get('query_stats')
+        if stats is None:
+            stats = g.query_stats = QueryStats()
+        stats.record(sql, duration)
+
+    duration_ms = duration * 1000
+    if duration_ms >= SLOW_QUERY_MS:
+        path = request.path if has_request_context() else '-'
+        slow_query_logger.warning('%.1fms %s %s', duration_ms, path, normalize_sql(sql))
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute, fetch calls and row-by-row iteration"""
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            self._duration = getattr(self, '_duration', 0.0) + time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._flush()
+        self._sql, self._duration = sql, 0.0
+        self._timed(sqlite3.Cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._flush()
+        self._sql, self._duration = sql, 0.0
+        self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        row = self._timed(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._flush()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(sqlite3.Cursor.fetchmany, size or self.arraysize)
+        if not rows:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(sqlite3.Cursor.fetchall)
+        self._flush()
+        return rows
+
+    def __next__(self):
+        """Each step of `for row in cursor` runs the statement further, so it counts as SQL time"""
+        try:
+            return self._timed(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._flush()
+            raise
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def _flush(self):
+        """Record the pending statement once its results are consumed"""
+        sql = getattr(self, '_sql', None)
+        if sql is not None:
+            self._sql = None
+            record_query(sql, self._duration)
+
+    def __del__(self):
+        self._flush()
+
+# Connections opened by this process and not yet closed
+_open_connections = [0]
+_open_lock = threading.Lock()
+
+def _count_connection(delta):
+    with _open_lock:
+        _open_connections[0] += delta
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements are timed and attributed to the current request"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counted = True
+        _count_connection(1)
+        metrics.inc(metrics.DB_CONNECTIONS)
+
+    def close(self):
+        if getattr(self, '_counted', False):
+            self._counted = False
+            _count_connection(-1)
+        super().close()
+
+    def __del__(self):
+        if getattr(self, '_counted', False):
+            self._counted = False
+            _count_connection(-1)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+metrics.register_gauge('db_connections_open', 'Database connections currently open',
+                       lambda: _open_connections[0], per_process=True)
+metrics.register_cache('normalize_sql', normalize_sql.cache_info)
+
+def init_app(app):
+    """Register request hooks and the rotating slow-query log"""
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = app.config.setdefault('SLOW_QUERY_MS', SLOW_QUERY_MS)
+
+    log_file = app.config.setdefault('SLOW_QUERY_LOG', os.path.join('logs', 'slow_queries.log'))
+    if log_file and not slow_query_logger.handlers:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024, backupCount=5)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.setLevel(logging.WARNING)
+        slow_query_logger.propagate = False
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        stats = g.get('query_stats') or QueryStats()
+        total = time.perf_counter() - g.get('request_started', time.perf_counter())
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+        remember_request(stats, total, response.status_code)
+        return response
+
+def remember_request(stats, total, status_code):
+    """Keep a summary of the request for the admin query debugger"""
+    if request.endpoint in (None, 'static'):
+        return
+
+    RECENT_REQUESTS.appendleft({
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': status_code,
+        'total_ms': round(total * 1000, 1),
+        'db_ms': round(stats.duration * 1000, 1),
+        'queries': stats.count,
+        'top': stats.top(),
+        'at': time.strftime('%H:%M:%S'),
+    })
+
+    with _totals_lock:
+        for sql, (calls, duration) in stats.statements.items():
+            entry = STATEMENT_TOTALS.get(sql)
+            if entry is None:
+                if len(STATEMENT_TOTALS) >= MAX_STATEMENTS:
+                    continue
+                entry = STATEMENT_TOTALS[sql] = [0, 0.0]
+            entry[0] += calls
+            entry[1] += duration
+
+def statement_totals(limit=20):
+    """Statements with the most total time since startup as (sql, calls, total_ms, avg_ms)"""
+    with _totals_lock:
+        ranked = sorted(STATEMENT_TOTALS.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    return [(sql, calls, round(total * 1000, 1), round(total * 1000 / calls, 2))
+            for sql, (calls, total) in ranked]
@@ -0,0 +1,294 @@
+"""
+Metrics module for Farmer Connect
+Prometheus text-format metrics shared across worker processes through SQLite
+"""
+
+import os
+import hmac
+import time
+import atexit
+import sqlite3
+import threading
+from flask import Response, g, request, session
+
+PREFIX = 'farmer_connect'
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How often (seconds) a process pushes its pending deltas to the aggregator
+FLUSH_INTERVAL = 1.0
+
+# Methods labelled as themselves; anything else a client sends is counted as 'other'
+METHODS = frozenset(('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'))
+
+# Clients that may scrape without a token when METRICS_TOKEN is unset
+LOCAL_ADDRESSES = frozenset(('127.0.0.1', '::1'))
+
+FAMILIES = {}
+SCRAPE_GAUGES = []
+PROCESS_GAUGES = []
+CACHES = {}
+
+_pending_counters = {}
+_lock = threading.Lock()
+_last_flush = [time.monotonic()]
+_aggregator = None
+
+def define(name, kind, help_text):
+    """Declare a metric family; returns its full name"""
+    name = f'{PREFIX}_{name}'
+    FAMILIES[name] = (kind, help_text)
+    return name
+
+def format_labels(labels):
+    """Render a label dict in exposition format, keys sorted"""
+    return ','.join('{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                    for key, value in sorted(labels.items()))
+
+def inc(family, labels=None, value=1):
+    """Add to a counter"""
+    key = (family, family + '_total', format_labels(labels or {}), '')
+    with _lock:
+        _pending_counters[key] = _pending_counters.get(key, 0) + value
+
+def observe(family, value, labels=None, buckets=LATENCY_BUCKETS):
+    """Record a histogram observation (cumulative buckets, sum and count)
+
+    Every bucket is written, with 0 where the value is above its bound, so
+    each series exposes the full set of buckets that histogram_quantile needs.
+    """
+    rendered = format_labels(labels or {})
+    with _lock:
+        for bound in buckets:
+            key = (family, family + '_bucket', rendered, repr(bound))
+            _pending_counters[key] = _pending_counters.get(key, 0) + (1 if value <= bound else 0)
+        for series, amount, le in (('_bucket', 1, '+Inf'), ('_sum', value, ''), ('_count', 1, '')):
+            key = (family, family + series, rendered, le)
+            _pending_counters[key] = _pending_counters.get(key, 0) + amount
+
+def register_gauge(name, help_text, callback, per_process=False):
+    """Expose a gauge computed by callback() -> number or {label_dict_items: value}
+
+    Scrape-time gauges are evaluated by whichever process serves /metrics
+    (use for values read from the database). Per-process gauges are sampled
+    on every flush and exported with a pid label (use for in-memory state
+    such as cache sizes).
+    """
+    family = define(name, 'gauge', help_text)
+    (PROCESS_GAUGES if per_process else SCRAPE_GAUGES).append((family, callback))
+    return family
+
+def register_cache(name, cache_info):
+    """Expose hits, misses and size of a cache; cache_info() returns an object like lru_cache's"""
+    CACHES[name] = cache_info
+
+def _cache_samples(field):
+    def sample():
+        return {(('cache', name),): getattr(info(), field) or 0 for name, info in CACHES.items()}
+    return sample
+
+register_gauge('cache_hits', 'Cache hits since process start', _cache_samples('hits'), per_process=True)
+register_gauge('cache_misses', 'Cache misses since process start', _cache_samples('misses'), per_process=True)
+register_gauge('cache_size', 'Entries currently held in the cache', _cache_samples('currsize'), per_process=True)
+
+REQUESTS = define('http_requests', 'counter', 'HTTP requests by endpoint and status')
+REQUEST_LATENCY = define('http_request_duration_seconds', 'histogram', 'Request latency by endpoint')
+DB_LATENCY = define('db_duration_seconds', 'histogram', 'Time spent in SQL per request by endpoint')
+DB_QUERIES = define('db_queries', 'counter', 'SQL statements executed by endpoint')
+DB_CONNECTIONS = define('db_connections_opened', 'counter', 'Database connections opened')
+
+def _samples(callback):
+    """Normalise a gauge callback result to [(labels_dict, value)]"""
+    result = callback()
+    if isinstance(result, dict):
+        return [(dict(labels), value) for labels, value in result.items()]
+    return [({}, result)]
+
+class SQLiteAggregator:
+    """Sums counter deltas and holds per-process gauges for all workers in one SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_counters (
+                family TEXT NOT NULL,
+                series TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                le TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (family, series, labels, le)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_gauges (
+                family TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (family, labels, pid)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def push(self, counters, gauges, pid):
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                INSERT INTO metric_counters (family, series, labels, le, value) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(family, series, labels, le) DO UPDATE SET value = value + excluded.value
+            ''', [key + (value,) for key, value in counters.items()])
+            conn.execute('DELETE FROM metric_gauges WHERE pid = ?', (pid,))
+            conn.executemany('''
+                INSERT OR REPLACE INTO metric_gauges (family, labels, pid, value) VALUES (?, ?, ?, ?)
+            ''', [(family, labels, pid, value) for (family, labels), value in gauges.items()])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def collect(self):
+        conn = self._connect()
+        try:
+            # Forget gauges of workers that have exited
+            for (pid,) in conn.execute('SELECT DISTINCT pid FROM metric_gauges').fetchall():
+                if not _pid_alive(pid):
+                    conn.execute('DELETE FROM metric_gauges WHERE pid = ?', (pid,))
+            conn.commit()
+            counters = conn.execute('SELECT family, series, labels, le, value FROM metric_counters').fetchall()
+            gauges = conn.execute('SELECT family, labels, pid, value FROM metric_gauges').fetchall()
+            return counters, gauges
+        finally:
+            conn.close()
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def flush(force=False):
+    """Push this process's pending deltas and per-process gauges to the aggregator"""
+    if _aggregator is None:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush[0] < FLUSH_INTERVAL:
+        return
+
+    with _lock:
+        counters = dict(_pending_counters)
+        _pending_counters.clear()
+        _last_flush[0] = now
+
+    gauges = {}
+    for family, callback in PROCESS_GAUGES:
+        try:
+            for labels, value in _samples(callback):
+                gauges[(family, format_labels(labels))] = value
+        except Exception as e:
+            print(f"Metrics gauge {family} error: {e}")
+
+    try:
+        _aggregator.push(counters, gauges, os.getpid())
+    except sqlite3.Error as e:
+        # Keep the deltas for the next attempt rather than losing them
+        print(f"Metrics flush error: {e}")
+        with _lock:
+            for key, value in counters.items():
+                _pending_counters[key] = _pending_counters.get(key, 0) + value
+
+def _format_value(value):
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    flush(force=True)
+    counters, gauges = _aggregator.collect()
+
+    series = {}
+    for family, name, labels, le, value in counters:
+        if le:
+            labels = f'{labels},le="{le}"' if labels else f'le="{le}"'
+            order = (labels.rsplit('le=', 1)[0], 0, float(le.replace('+Inf', 'inf')))
+        else:
+            order = (labels, 1 if name.endswith('_sum') else 2 if name.endswith('_count') else 0, 0)
+        series.setdefault(family, []).append((order, name, labels, value))
+    for family, labels, pid, value in gauges:
+        labels = f'{labels},pid="{pid}"' if labels else f'pid="{pid}"'
+        series.setdefault(family, []).append(((labels, 0, 0), family, labels, value))
+    for family, callback in SCRAPE_GAUGES:
+        try:
+            for labels, value in _samples(callback):
+                labels = format_labels(labels)
+                series.setdefault(family, []).append(((labels, 0, 0), family, labels, value))
+        except Exception as e:
+            print(f"Metrics gauge {family} error: {e}")
+
+    lines = []
+    for family in sorted(series):
+        kind, help_text = FAMILIES.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for _, name, labels, value in sorted(series[family]):
+            lines.append(f'{name}{{{labels}}} {_format_value(value)}' if labels
+                         else f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+def scrape_allowed(token):
+    """A signed-in admin, or the bearer token when one is configured, or else a loopback client"""
+    if session.get('user_type') == 'admin':
+        return True
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return request.remote_addr in LOCAL_ADDRESSES
+
+def init_app(app):
+    """Register request hooks, the aggregator and the /metrics endpoint (restricted by METRICS_TOKEN)"""
+    global _aggregator
+    path = app.config.setdefault('METRICS_DB', os.path.join('logs', 'metrics.db'))
+    app.config.setdefault('METRICS_TOKEN', None)
+    _aggregator = SQLiteAggregator(path)
+    atexit.register(flush, True)
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if request.endpoint in ('static', 'metrics_endpoint'):
+            return response
+
+        labels = {'blueprint': request.blueprint or 'app', 'endpoint': request.endpoint or 'unmatched'}
+        elapsed = time.perf_counter() - g.get('metrics_started', time.perf_counter())
+        method = request.method if request.method in METHODS else 'other'
+        inc(REQUESTS, dict(labels, method=method, status=response.status_code))
+        observe(REQUEST_LATENCY, elapsed, labels)
+
+        stats = g.get('query_stats')
+        if stats is not None:
+            observe(DB_LATENCY, stats.duration, labels)
+            inc(DB_QUERIES, labels, stats.count)
+
+        flush()
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus scrape endpoint"""
+        if not scrape_allowed(app.config['METRICS_TOKEN']):
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,81 @@
+"""
+Notifications module for Farmer Connect
+Per-user inbox reads, unread counters kept by triggers, incremental polling and archival
+"""
+
+from datetime import datetime, timedelta
+from modules.dates import sql_timestamp
+
+# Most rows returned by one inbox page or poll
+MAX_LIMIT = 100
+
+# Read notifications are archived after this many days, unread ones after MAX_AGE_DAYS
+READ_RETENTION_DAYS = 30
+MAX_AGE_DAYS = 180
+
+# Rows moved per archival transaction, so writers are never blocked for long
+ARCHIVE_BATCH = 5000
+
+def unread_count(conn, user_id):
+    """Unread notifications for a user, from the maintained counter"""
+    row = conn.execute('SELECT unread FROM notification_counts WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+def inbox(conn, user_id, limit=50, before_id=None):
+    """Newest notifications first; pass the smallest id seen as before_id for the next page"""
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    if before_id:
+        return conn.execute('''
+            SELECT * FROM notifications WHERE user_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+        ''', (user_id, before_id, limit)).fetchall()
+    return conn.execute('''
+        SELECT * FROM notifications WHERE user_id = ?
+        ORDER BY id DESC LIMIT ?
+    ''', (user_id, limit)).fetchall()
+
+def since(conn, user_id, since_id=0, limit=MAX_LIMIT):
+    """Notifications newer than since_id, oldest first, for incremental polling"""
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    return conn.execute('''
+        SELECT * FROM notifications WHERE user_id = ? AND id > ?
+        ORDER BY id LIMIT ?
+    ''', (user_id, since_id, limit)).fetchall()
+
+def mark_read(conn, user_id, upto_id, from_id=0):
+    """Mark the user's unread notifications with from_id <= id <= upto_id as read; returns rows changed"""
+    return conn.execute('''
+        UPDATE notifications SET is_read = 1
+        WHERE user_id = ? AND id BETWEEN ? AND ? AND is_read = 0
+    ''', (user_id, from_id, upto_id)).rowcount
+
+def archive(conn, read_days=READ_RETENTION_DAYS, max_days=MAX_AGE_DAYS, batch=ARCHIVE_BATCH):
+    """Move old notifications to notifications_archive in batches; returns rows moved"""
+    now = datetime.utcnow()
+    read_cutoff = sql_timestamp(now - timedelta(days=read_days))
+    max_cutoff = sql_timestamp(now - timedelta(days=max_days))
+    selected = '''
+        SELECT id FROM notifications
+        WHERE (is_read = 1 AND created_at < ?) OR created_at < ?
+        ORDER BY id LIMIT ?
+    '''
+    params = (read_cutoff, max_cutoff, batch)
+
+    moved = 0
+    while True:
+        conn.execute(f'''
+            INSERT INTO notifications_archive (id, user_id, title, message, type, is_read, link, created_at)
+            SELECT id, user_id, title, message, type, is_read, link, created_at
+            FROM notifications WHERE id IN ({selected})
+            ON CONFLICT (id) DO NOTHING
+        ''', params)
+        deleted = conn.execute(f'DELETE FROM notifications WHERE id IN ({selected})', params).rowcount
+        conn.commit()
+        if not deleted:
+            return moved
+        moved += deleted
+
+def as_json(row):
+    """JSON-ready dict for one notification row"""
+    return {'id': row['id'], 'title': row['title'], 'message': row['message'], 'type': row['type'],
+            'link': row['link'], 'is_read': bool(row['is_read']), 'created_at': row['created_at']}
@@ -0,0 +1,133 @@
+"""
+Passwords module for Farmer Connect
+Password hashing on a bounded process pool, so login bursts do not tie up request threads
+"""
+
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+from modules import metrics
+
+# Werkzeug method string written in full, as stored before the first '$' of a hash
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+# Seconds a request waits for its hash before giving up
+HASH_TIMEOUT = 10
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full, a hash times out or the pool died; the caller should answer 503"""
+
+_state = {'method': DEFAULT_METHOD, 'workers': 0, 'queue': 0, 'start_method': 'spawn'}
+_pool = None
+_slots = None
+_pending = [0]
+_lock = threading.Lock()
+
+REJECTED = metrics.define('password_hash_rejected', 'counter',
+                          'Password hashes refused, by reason (queue_full, timeout, pool_broken)')
+metrics.register_gauge('password_hash_queue_depth', 'Password hashes queued or running in this process',
+                       lambda: _pending[0], per_process=True)
+
+def configure(method=DEFAULT_METHOD, workers=None, queue=None, start_method='spawn'):
+    """Set the hash method and pool size; workers=0 hashes in the calling thread"""
+    global _pool, _slots
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        _state.update(method=method, workers=workers, start_method=start_method,
+                      queue=workers * 4 if queue is None else queue)
+        _slots = threading.BoundedSemaphore(workers + _state['queue']) if workers else None
+
+def settings():
+    return dict(_state, pending=_pending[0])
+
+def _executor():
+    """The process pool, started on first use so each server process gets its own"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_state['workers'],
+                                        mp_context=multiprocessing.get_context(_state['start_method']))
+        return _pool
+
+def _discard(pool):
+    """Drop a broken pool so the next hash starts a fresh one"""
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def _release(slots):
+    with _lock:
+        _pending[0] -= 1
+    slots.release()
+
+def _run(function, *args):
+    """Run function(*args) in the pool, or raise HashingBusy if it is full, too slow or broken
+
+    A queue slot is held until the hash itself finishes, not until the
+    caller stops waiting, so timed-out hashes still count against the bound.
+    """
+    if not _state['workers']:
+        return function(*args)
+
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        metrics.inc(REJECTED, {'reason': 'queue_full'})
+        raise HashingBusy()
+    with _lock:
+        _pending[0] += 1
+    pool = _executor()
+    try:
+        future = pool.submit(function, *args)
+    except (BrokenProcessPool, RuntimeError):
+        _release(slots)
+        _discard(pool)
+        metrics.inc(REJECTED, {'reason': 'pool_broken'})
+        raise HashingBusy()
+    future.add_done_callback(lambda future: _release(slots))
+
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        metrics.inc(REJECTED, {'reason': 'timeout'})
+        raise HashingBusy()
+    except BrokenProcessPool:
+        _discard(pool)
+        metrics.inc(REJECTED, {'reason': 'pool_broken'})
+        raise HashingBusy()
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run(generate_password_hash, password, _state['method'])
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """True when a hash was made with other parameters than the configured method"""
+    return password_hash.split('$', 1)[0] != _state['method']
+
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+atexit.register(shutdown)
+
+def init_app(app):
+    """Configure hashing from PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS and PASSWORD_HASH_QUEUE"""
+    configure(method=app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+              workers=app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 1),
+              queue=app.config.setdefault('PASSWORD_HASH_QUEUE', None),
+              start_method=app.config.setdefault('PASSWORD_HASH_START_METHOD', 'spawn'))
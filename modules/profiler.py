@@ -0,0 +1,199 @@
+"""
+Profiler module for Farmer Connect
+Opt-in sampling profiler for a fraction of requests, aggregated per endpoint
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from flask import request
+
+# Seconds between stack samples of a profiled request
+SAMPLE_INTERVAL = 0.005
+
+# Innermost frames kept per sample
+MAX_DEPTH = 64
+
+# Requests profiled at the same time; others run unprofiled
+MAX_ACTIVE = 4
+
+# Distinct stacks kept per endpoint; further new stacks are counted as [other]
+MAX_STACKS = 2000
+
+_state = {'enabled': False, 'rate': 0.0, 'rates': {}, 'interval': SAMPLE_INTERVAL}
+_active = {}
+_profiles = {}
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_sampler = None
+
+class EndpointProfile:
+    """Collapsed stacks and time buckets for one endpoint"""
+
+    def __init__(self):
+        self.requests = 0
+        self.samples = 0
+        self.buckets = {'db': 0, 'template': 0, 'python': 0}
+        self.stacks = {}
+
+    def add(self, stack, bucket):
+        self.samples += 1
+        self.buckets[bucket] += 1
+        if stack not in self.stacks and len(self.stacks) >= MAX_STACKS:
+            stack = '[other]'
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def summary(self):
+        total = self.samples or 1
+        return {
+            'requests': self.requests,
+            'samples': self.samples,
+            'sampled_ms': round(self.samples * _state['interval'] * 1000),
+            'db_pct': round(100 * self.buckets['db'] / total, 1),
+            'template_pct': round(100 * self.buckets['template'] / total, 1),
+            'python_pct': round(100 * self.buckets['python'] / total, 1),
+            'stacks': len(self.stacks),
+        }
+
+    def collapsed(self):
+        """Stacks in collapsed format (frame;frame;frame count), as read by flamegraph.pl and speedscope"""
+        return ''.join(f'{stack} {count}\n' for stack, count in
+                       sorted(self.stacks.items(), key=lambda item: item[1], reverse=True))
+
+# Methods of the instrumented connection and cursor that run SQL; other functions in
+# instrumentation.py (the request hooks) are ordinary Python time
+DB_FUNCTIONS = {'_timed', 'execute', 'executemany', 'fetchone', 'fetchmany', 'fetchall', '__next__'}
+
+def classify(frames):
+    """DB if SQLite is on the stack, else template if Jinja is, else Python"""
+    template = False
+    for filename, name in frames:
+        if (filename.endswith('instrumentation.py') and name in DB_FUNCTIONS) \
+                or os.sep + 'sqlite3' + os.sep in filename:
+            return 'db'
+        if filename.endswith('.html') or os.sep + 'jinja2' + os.sep in filename:
+            template = True
+    return 'template' if template else 'python'
+
+def capture(frame):
+    """Collapsed stack string and bucket for a thread's current frame"""
+    frames = []
+    while frame is not None and len(frames) < MAX_DEPTH:
+        code = frame.f_code
+        frames.append((code.co_filename, code.co_name))
+        frame = frame.f_back
+    frames.reverse()
+    stack = ';'.join(f'{os.path.basename(filename)}:{name}' for filename, name in frames)
+    return stack, classify(frames)
+
+def _sample_loop():
+    """Sampler thread: sleeps until a profiled request is running, then samples it"""
+    while True:
+        _wakeup.wait()
+        with _lock:
+            active = dict(_active)
+            if not active:
+                _wakeup.clear()
+        if not active:
+            continue
+
+        frames = sys._current_frames()
+        samples = [(endpoint, capture(frames[ident]))
+                   for ident, endpoint in active.items() if ident in frames]
+        with _lock:
+            for endpoint, (stack, bucket) in samples:
+                _profiles.setdefault(endpoint, EndpointProfile()).add(stack, bucket)
+
+        time.sleep(_state['interval'])
+
+def _start_sampler():
+    """Start the sampler thread in this process unless it is running; call with _lock held
+
+    Threads do not survive os.fork(), so each pre-forked worker starts its
+    own sampler with its first profiled request.
+    """
+    global _sampler
+    if _sampler is None or not _sampler.is_alive():
+        _sampler = threading.Thread(target=_sample_loop, name='request-profiler', daemon=True)
+        _sampler.start()
+
+def _after_fork():
+    """In a forked child: drop the parent's in-flight requests and any lock its sampler held"""
+    global _lock, _wakeup
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _active.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def _clamp(rate):
+    return max(0.0, min(1.0, float(rate)))
+
+def configure(enabled=None, rate=None, rates=None, interval_ms=None):
+    """Change profiling settings at runtime; rates maps endpoint -> fraction overriding rate"""
+    if enabled is not None:
+        _state['enabled'] = bool(enabled)
+    if rate is not None:
+        _state['rate'] = _clamp(rate)
+    if rates is not None:
+        _state['rates'] = {endpoint: _clamp(value) for endpoint, value in rates.items()}
+    if interval_ms is not None:
+        _state['interval'] = max(1, float(interval_ms)) / 1000
+
+def settings():
+    return {'enabled': _state['enabled'], 'rate': _state['rate'], 'rates': dict(_state['rates']),
+            'interval_ms': _state['interval'] * 1000}
+
+def sample_rate(endpoint):
+    """Fraction of requests to this endpoint that get profiled"""
+    return _state['rates'].get(endpoint, _state['rate'])
+
+def profiles():
+    """Summaries for every profiled endpoint, busiest first"""
+    with _lock:
+        summaries = {endpoint: profile.summary() for endpoint, profile in _profiles.items()}
+    return sorted(summaries.items(), key=lambda item: item[1]['samples'], reverse=True)
+
+def collapsed(endpoint=None):
+    """Collapsed stacks for one endpoint, or all endpoints prefixed by endpoint name"""
+    with _lock:
+        if endpoint:
+            profile = _profiles.get(endpoint)
+            return profile.collapsed() if profile else ''
+        return ''.join(''.join(f'{name};{line}\n' for line in profile.collapsed().splitlines())
+                       for name, profile in _profiles.items())
+
+def reset():
+    with _lock:
+        _profiles.clear()
+
+def init_app(app):
+    """Register request hooks; profiling stays off unless PROFILER_ENABLED is set"""
+    configure(enabled=app.config.setdefault('PROFILER_ENABLED', False),
+              rate=app.config.setdefault('PROFILER_SAMPLE_RATE', 0.05),
+              rates=app.config.setdefault('PROFILER_SAMPLE_RATES', {}),
+              interval_ms=app.config.setdefault('PROFILER_INTERVAL_MS', SAMPLE_INTERVAL * 1000))
+
+    @app.before_request
+    def start_profiling():
+        if not _state['enabled'] or request.endpoint in (None, 'static'):
+            return
+        if random.random() >= sample_rate(request.endpoint):
+            return
+
+        with _lock:
+            if len(_active) >= MAX_ACTIVE:
+                return
+            _active[threading.get_ident()] = request.endpoint
+            _profiles.setdefault(request.endpoint, EndpointProfile()).requests += 1
+            _start_sampler()
+            _wakeup.set()
+
+    @app.teardown_request
+    def stop_profiling(exc=None):
+        if _active:
+            with _lock:
+                _active.pop(threading.get_ident(), None)
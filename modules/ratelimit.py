@@ -0,0 +1,144 @@
+"""
+Rate limit module for Farmer Connect
+Token buckets for login attempts, kept in memory or shared between workers through SQLite
+"""
+
+import os
+import time
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from modules import metrics
+
+# Keys kept by the in-memory store before idle buckets are dropped
+MAX_KEYS = 50000
+
+# Share of SQLite store takes that also delete buckets idle for a day
+PRUNE_PROBABILITY = 0.01
+
+ATTEMPTS = metrics.define('login_attempts', 'counter', 'Login attempts by rate limit scope and result')
+
+def parse_rate(rate):
+    """'20/60' -> (capacity 20, refill of 20 tokens per 60 seconds as tokens per second)"""
+    count, seconds = rate.split('/')
+    return float(count), float(count) / float(seconds)
+
+class MemoryStore:
+    """Buckets for this process only, at most MAX_KEYS of them in least-recently-used order"""
+
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill, cost=1.0):
+        """Remove cost tokens if available; returns seconds to wait, 0 when allowed"""
+        now = time.monotonic()
+        with self.lock:
+            if key in self.buckets:
+                tokens, updated, _, _ = self.buckets[key]
+                self.buckets.move_to_end(key)
+            else:
+                tokens, updated = capacity, now
+                self._evict(now)
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            if tokens < cost:
+                self.buckets[key] = (tokens, now, capacity, refill)
+                return (cost - tokens) / refill
+            self.buckets[key] = (tokens - cost, now, capacity, refill)
+            return 0
+
+    def _evict(self, now):
+        """Make room for one more key by dropping the least recently used buckets
+
+        Buckets that have refilled completely behave like absent ones and go
+        first; past MAX_KEYS the oldest goes regardless. Each bucket keeps its
+        own capacity and refill, so IP and username scopes are judged apart.
+        """
+        while self.buckets:
+            key, (tokens, updated, capacity, refill) = next(iter(self.buckets.items()))
+            if len(self.buckets) < MAX_KEYS and tokens + (now - updated) * refill < capacity:
+                break
+            self.buckets.popitem(last=False)
+
+    def reset(self, key):
+        with self.lock:
+            self.buckets.pop(key, None)
+
+class SQLiteStore:
+    """Buckets shared by every worker process through one SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def take(self, key, capacity, refill, cost=1.0):
+        """Refill and spend in one statement, so concurrent workers cannot overspend"""
+        now = time.time()
+        conn = self._connect()
+        if random.random() < PRUNE_PROBABILITY:
+            self.prune()
+        cursor = conn.execute('''
+            INSERT INTO rate_limits (key, tokens, updated) VALUES (?, ? - ?, ?)
+            ON CONFLICT (key) DO UPDATE
+            SET tokens = MIN(?, tokens + (excluded.updated - updated) * ?) - ?, updated = excluded.updated
+            WHERE MIN(?, tokens + (excluded.updated - updated) * ?) >= ?
+        ''', (key, capacity, cost, now, capacity, refill, cost, capacity, refill, cost))
+        if cursor.rowcount:
+            return 0
+        row = conn.execute('SELECT tokens, updated FROM rate_limits WHERE key = ?', (key,)).fetchone()
+        tokens = min(capacity, row[0] + (now - row[1]) * refill) if row else 0
+        return max(cost - tokens, 0) / refill
+
+    def reset(self, key):
+        self._connect().execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    def prune(self, older_than=86400):
+        """Delete buckets untouched for older_than seconds"""
+        self._connect().execute('DELETE FROM rate_limits WHERE updated < ?', (time.time() - older_than,))
+
+_state = {'store': MemoryStore(), 'limits': {'ip': parse_rate('20/60'), 'user': parse_rate('5/300')}}
+
+def configure(store=None, ip_rate='20/60', user_rate='5/300'):
+    """Set the limits ('attempts/seconds') and store (None for memory, or a SQLite path)"""
+    _state['store'] = SQLiteStore(store) if store else MemoryStore()
+    _state['limits'] = {'ip': parse_rate(ip_rate), 'user': parse_rate(user_rate)}
+
+def login_attempt(ip, username):
+    """Spend a token from the IP's bucket and then the username's; returns seconds to wait, 0 if allowed"""
+    store = _state['store']
+    for scope, key in (('ip', ip or 'unknown'), ('user', username.lower())):
+        capacity, refill = _state['limits'][scope]
+        wait = store.take(f'login:{scope}:{key}', capacity, refill)
+        if wait:
+            metrics.inc(ATTEMPTS, {'scope': scope, 'result': 'limited'})
+            return wait
+    metrics.inc(ATTEMPTS, {'scope': 'all', 'result': 'allowed'})
+    return 0
+
+def login_succeeded(username):
+    """Refill the username's bucket once the right password has been given"""
+    _state['store'].reset(f'login:user:{username.lower()}')
+
+def init_app(app):
+    """Configure from LOGIN_RATE_IP, LOGIN_RATE_USER and RATELIMIT_DB (unset keeps buckets in memory)"""
+    configure(store=app.config.setdefault('RATELIMIT_DB', None),
+              ip_rate=app.config.setdefault('LOGIN_RATE_IP', '20/60'),
+              user_rate=app.config.setdefault('LOGIN_RATE_USER', '5/300'))
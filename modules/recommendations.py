@@ -0,0 +1,281 @@
+"""
+Recommendation module for Farmer Connect
+Item-item collaborative filtering trained from order co-purchases
+and the related-products index shown on product pages
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from modules.database import get_db_connection
+from modules import metrics
+
+# Neighbors kept per product
+TOP_K = 20
+
+# Recent purchased products used to seed a consumer's recommendations
+RECENT_PURCHASES = 20
+
+def recommendation_backlog():
+    """Orders placed since the co-purchase model was last refreshed"""
+    conn = get_db_connection()
+    try:
+        return conn.execute('''
+            SELECT COUNT(*) FROM orders
+            WHERE id > COALESCE((SELECT order_watermark FROM recommendation_state WHERE id = 1), 0)
+        ''').fetchone()[0]
+    finally:
+        conn.close()
+
+metrics.register_gauge('recommendation_backlog_orders',
+                       'Orders waiting to be folded into the recommendation model',
+                       recommendation_backlog)
+
+def _basket_counts(baskets, counts, sign=1):
+    """Add each basket's product pairs (and the diagonal) to counts"""
+    for items in baskets.values():
+        items = sorted(items)
+        for i, product_a in enumerate(items):
+            counts[(product_a, product_a)] += sign
+            for product_b in items[i + 1:]:
+                counts[(product_a, product_b)] += sign
+                counts[(product_b, product_a)] += sign
+
+def refresh_recommendations(full=False, top_k=TOP_K):
+    """Fold new orders into the co-purchase matrix and refresh affected neighbors
+
+    The co-purchase matrix is stored sparsely in copurchase_counts, one row
+    per non-zero cell; the diagonal holds how many orders contained each
+    product. Only orders newer than the stored watermark are read, plus
+    already folded orders that were cancelled or reinstated since (queued in
+    copurchase_changes by a trigger), so the job can run as often as needed.
+    Returns the number of new orders processed.
+    """
+    conn = get_db_connection()
+
+    try:
+        # Read the watermark, the newest order id, the queued changes and the baskets
+        # from one snapshot. Orders and changes committed after it are left for the next run.
+        conn.execute('BEGIN')
+        row = conn.execute('SELECT order_watermark FROM recommendation_state WHERE id = 1').fetchone()
+        watermark = 0 if full or not row else row['order_watermark']
+
+        last_order = conn.execute('SELECT COALESCE(MAX(id), 0) FROM orders').fetchone()[0]
+        last_change = conn.execute('SELECT COALESCE(MAX(id), 0) FROM copurchase_changes').fetchone()[0]
+
+        # Build baskets from orders placed since the last run
+        baskets = {}
+        rows = conn.execute('''
+            SELECT oi.order_id, oi.product_id
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE oi.order_id > ? AND oi.order_id <= ? AND o.status != 'cancelled'
+        ''', (watermark, last_order))
+        for row in rows:
+            baskets.setdefault(row['order_id'], set()).add(row['product_id'])
+
+        # Net status changes of orders already in the counts; newer orders were
+        # just read with their current status, and a full rebuild reads them all
+        deltas = Counter()
+        for row in conn.execute('SELECT order_id, delta FROM copurchase_changes WHERE id <= ? AND order_id <= ?',
+                                (last_change, watermark)):
+            deltas[row['order_id']] += row['delta']
+        changed = sorted(order_id for order_id, delta in deltas.items() if delta)
+        changed_baskets = {}
+        for chunk in _chunks(changed):
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(f'''
+                SELECT order_id, product_id FROM order_items WHERE order_id IN ({placeholders})
+            ''', chunk):
+                changed_baskets.setdefault(row['order_id'], set()).add(row['product_id'])
+        conn.commit()
+
+        if full:
+            conn.execute('DELETE FROM copurchase_counts')
+            conn.execute('DELETE FROM product_neighbors')
+
+        counts = Counter()
+        _basket_counts(baskets, counts)
+        for order_id, items in changed_baskets.items():
+            _basket_counts({order_id: items}, counts, deltas[order_id])
+        counts = {pair: n for pair, n in counts.items() if n}
+
+        conn.executemany('''
+            INSERT INTO copurchase_counts (product_id, other_id, order_count)
+            VALUES (?, ?, ?)
+            ON CONFLICT(product_id, other_id)
+            DO UPDATE SET order_count = order_count + excluded.order_count
+        ''', [(a, b, n) for (a, b), n in counts.items()])
+
+        # A product's scores change when its own count or a partner's count changes
+        touched = {a for a, b in counts}
+        affected = set(touched)
+        for chunk in _chunks(sorted(touched)):
+            placeholders = ','.join('?' * len(chunk))
+            affected.update(row[0] for row in conn.execute(f'''
+                SELECT product_id FROM copurchase_counts WHERE other_id IN ({placeholders})
+            ''', chunk))
+
+        # Cancellations can take cells back to zero; the matrix only keeps non-zero ones
+        conn.execute('DELETE FROM copurchase_counts WHERE order_count <= 0')
+
+        for chunk in _chunks(sorted(affected)):
+            _rebuild_neighbors(conn, chunk, top_k)
+
+        conn.execute('DELETE FROM copurchase_changes WHERE id <= ?', (last_change,))
+        conn.execute('''
+            INSERT INTO recommendation_state (id, order_watermark) VALUES (1, ?)
+            ON CONFLICT (id) DO UPDATE SET order_watermark = excluded.order_watermark
+        ''', (max(last_order, watermark),))
+
+        conn.commit()
+        return len(baskets)
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+def _rebuild_neighbors(conn, product_ids, top_k):
+    """Recompute the top-K cosine neighbors for a batch of products"""
+    placeholders = ','.join('?' * len(product_ids))
+    rows = conn.execute(f'''
+        SELECT c.product_id, c.other_id, c.order_count,
+               da.order_count as product_orders, db.order_count as other_orders
+        FROM copurchase_counts c
+        JOIN copurchase_counts da ON da.product_id = c.product_id AND da.other_id = c.product_id
+        JOIN copurchase_counts db ON db.product_id = c.other_id AND db.other_id = c.other_id
+        WHERE c.product_id IN ({placeholders}) AND c.other_id != c.product_id
+    ''', product_ids).fetchall()
+
+    scores = {}
+    for row in rows:
+        score = row['order_count'] / math.sqrt(row['product_orders'] * row['other_orders'])
+        scores.setdefault(row['product_id'], []).append((score, row['other_id']))
+
+    conn.execute(f'DELETE FROM product_neighbors WHERE product_id IN ({placeholders})', product_ids)
+    conn.executemany('''
+        INSERT INTO product_neighbors (product_id, neighbor_id, score) VALUES (?, ?, ?)
+    ''', [(product_id, neighbor_id, round(score, 6))
+          for product_id, candidates in scores.items()
+          for score, neighbor_id in heapq.nlargest(top_k, candidates)])
+
+def _chunks(items, size=500):
+    """Split a list into IN-clause sized chunks"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def get_recommended_products(conn, consumer_id, limit=6):
+    """Products co-purchased with the consumer's recent buys, in a single query"""
+    return conn.execute('''
+        WITH recent AS (
+            SELECT oi.product_id
+            FROM orders o
+            JOIN order_items oi ON o.id = oi.order_id
+            WHERE o.consumer_id = ?
+            ORDER BY o.id DESC
+            LIMIT ?
+        )
+        SELECT p.*, u.farm_name, u.location, SUM(n.score) as recommendation_score
+        FROM product_neighbors n
+        JOIN products p ON n.neighbor_id = p.id
+        JOIN users u ON p.farmer_id = u.id
+        WHERE n.product_id IN (SELECT product_id FROM recent)
+        AND n.neighbor_id NOT IN (SELECT product_id FROM recent)
+        AND p.is_approved = 1 AND p.quantity > 0
+        GROUP BY p.id
+        ORDER BY recommendation_score DESC
+        LIMIT ?
+    ''', (consumer_id, RECENT_PURCHASES, limit)).fetchall()
+
+# Related products kept per product (extra slots cover items that go out of stock)
+RELATED_K = 12
+
+# Weights for the related-products signals
+RELATED_WEIGHTS = {'copurchase': 0.5, 'text': 0.3, 'category': 0.2}
+
+# Words too common in listings to say anything about similarity
+STOP_WORDS = {'and', 'the', 'for', 'with', 'from', 'fresh', 'farm', 'our', 'are', 'this', 'per'}
+
+def tokenize(text):
+    """Lowercase word set used for text similarity"""
+    return {word for word in re.findall(r'[a-z0-9]+', (text or '').lower())
+            if len(word) > 2 and word not in STOP_WORDS}
+
+def refresh_related_products(top_k=RELATED_K):
+    """Rebuild the product_related index from category, co-purchase and text signals
+
+    Candidates for each product are the products sharing a word with it,
+    its co-purchase neighbors and the most reviewed items of its category,
+    so the job never compares every pair. Run refresh_recommendations first
+    so co-purchase scores are current. Returns the number of products indexed.
+    """
+    conn = get_db_connection()
+
+    try:
+        products = conn.execute('''
+            SELECT id, category, name, description, rating_count
+            FROM products WHERE is_approved = 1
+            ORDER BY rating_count DESC, created_at DESC
+        ''').fetchall()
+
+        tokens = {}
+        by_token = {}
+        by_category = {}
+        categories = {}
+        for product in products:
+            words = tokenize(f"{product['name']} {product['description']}")
+            tokens[product['id']] = words
+            categories[product['id']] = product['category']
+            for word in words:
+                by_token.setdefault(word, []).append(product['id'])
+            by_category.setdefault(product['category'], []).append(product['id'])
+
+        copurchase = {}
+        for row in conn.execute('SELECT product_id, neighbor_id, score FROM product_neighbors'):
+            copurchase.setdefault(row['product_id'], {})[row['neighbor_id']] = row['score']
+
+        # Words shared by a large part of the catalog only add candidates, not signal
+        max_postings = max(50, len(products) // 10)
+
+        rows = []
+        for product_id, words in tokens.items():
+            candidates = set(copurchase.get(product_id, ()))
+            candidates.update(by_category[categories[product_id]][:top_k * 2])
+            for word in words:
+                postings = by_token[word]
+                if len(postings) <= max_postings:
+                    candidates.update(postings)
+            candidates.discard(product_id)
+
+            scored = []
+            for other_id in candidates:
+                if other_id not in tokens:
+                    continue
+                shared = words & tokens[other_id]
+                text = len(shared) / len(words | tokens[other_id]) if shared else 0.0
+                score = (RELATED_WEIGHTS['copurchase'] * copurchase.get(product_id, {}).get(other_id, 0.0)
+                         + RELATED_WEIGHTS['text'] * text
+                         + RELATED_WEIGHTS['category'] * (categories[other_id] == categories[product_id]))
+                if score > 0:
+                    scored.append((score, other_id))
+
+            for rank, (score, other_id) in enumerate(heapq.nlargest(top_k, scored), 1):
+                rows.append((product_id, other_id, rank, round(score, 6)))
+
+        conn.execute('DELETE FROM product_related')
+        conn.executemany('''
+            INSERT INTO product_related (product_id, related_id, rank, score) VALUES (?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        return len(tokens)
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
@@ -0,0 +1,123 @@
+"""
+Replica module for Farmer Connect
+Read-only snapshot of the database for analytics and reports, refreshed with the SQLite online backup API
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import urllib.parse
+from modules import database, metrics
+from modules.instrumentation import InstrumentedConnection
+
+# Snapshot age in seconds at which a refresh starts in the background
+REFRESH_AFTER = 60
+
+# Oldest snapshot served; past this, report reads go to the live database until a refresh lands
+MAX_STALENESS = 300
+
+_state = {'path': None, 'refresh_after': REFRESH_AFTER, 'max_staleness': MAX_STALENESS, 'enabled': True}
+_refreshing = threading.Lock()
+
+READS = metrics.define('replica_reads', 'counter', 'Report connections by target (replica or primary)')
+
+def configure(path=None, refresh_after=REFRESH_AFTER, max_staleness=MAX_STALENESS, enabled=True):
+    """Set the snapshot file (default: next to the database) and its staleness bounds"""
+    _state.update(path=path, refresh_after=refresh_after, max_staleness=max_staleness, enabled=enabled)
+
+def settings():
+    return dict(_state, path=replica_path(), age=age())
+
+def replica_path():
+    return _state['path'] or f'{database.DATABASE}-replica'
+
+def age():
+    """Seconds since the current snapshot was started, or None if there is none"""
+    try:
+        return max(0.0, time.time() - os.stat(replica_path()).st_mtime)
+    except OSError:
+        return None
+
+metrics.register_gauge('replica_age_seconds', 'Age of the report snapshot (-1 when there is none)',
+                       lambda: -1 if age() is None else round(age(), 1))
+
+def refresh():
+    """Copy the live database into a new snapshot and swap it in; returns seconds taken
+
+    The copy is taken in a single backup step: the live database is in WAL
+    mode, so that step reads one consistent version of it while writers
+    carry on (a stepped backup restarts on every commit and may never
+    finish). The copy is written to a temporary file and renamed over the
+    snapshot, so open report connections keep reading the old one. The
+    snapshot's mtime is set to when the copy started, which is the age of
+    its data.
+    """
+    path = replica_path()
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    taken_at = time.time()
+    started = time.perf_counter()
+    source = sqlite3.connect(database.DATABASE)
+    target = sqlite3.connect(temporary)
+    try:
+        source.backup(target)
+        # Rollback journal on the copy so it can be opened read-only without -wal/-shm files
+        target.execute('PRAGMA journal_mode = DELETE')
+        target.close()
+        os.utime(temporary, (taken_at, taken_at))
+        os.replace(temporary, path)
+    except Exception:
+        target.close()
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    finally:
+        source.close()
+    return time.perf_counter() - started
+
+def _refresh_in_background():
+    """Start one refresh thread per process unless one is already running"""
+    if not _refreshing.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            print(f"Replica refresh error: {e}")
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=run, name='replica-refresh', daemon=True).start()
+
+def get_read_connection(row_factory=sqlite3.Row):
+    """Read-only connection for analytics and reports
+
+    Returns the snapshot while it is within the staleness bound, and the
+    live database otherwise. Long report scans on the snapshot never hold
+    locks on the live file. Use get_db_connection() for anything that writes.
+    """
+    if not _state['enabled']:
+        return database.get_db_connection(row_factory)
+
+    snapshot_age = age()
+    if snapshot_age is None or snapshot_age > _state['refresh_after']:
+        _refresh_in_background()
+    if snapshot_age is not None and snapshot_age <= _state['max_staleness']:
+        uri = f"file:{urllib.parse.quote(os.path.abspath(replica_path()))}?mode=ro"
+        try:
+            conn = sqlite3.connect(uri, uri=True, factory=InstrumentedConnection)
+            conn.row_factory = row_factory
+            metrics.inc(READS, {'target': 'replica'})
+            return conn
+        except sqlite3.Error as e:
+            print(f"Replica open error: {e}")
+    metrics.inc(READS, {'target': 'primary'})
+    return database.get_db_connection(row_factory)
+
+def init_app(app):
+    """Configure from REPLICA_PATH, REPLICA_REFRESH_AFTER, REPLICA_MAX_STALENESS and REPLICA_ENABLED"""
+    configure(path=app.config.setdefault('REPLICA_PATH', None),
+              refresh_after=app.config.setdefault('REPLICA_REFRESH_AFTER', REFRESH_AFTER),
+              max_staleness=app.config.setdefault('REPLICA_MAX_STALENESS', MAX_STALENESS),
+              enabled=app.config.setdefault('REPLICA_ENABLED', True))
@@ -0,0 +1,137 @@
+"""
+Repository module for Farmer Connect
+Queries shared by the blueprints, written once for every storage engine through the dialect helpers
+"""
+
+from modules.storage import dialect_of, stream
+
+def set_setting(conn, key, value):
+    """Insert or overwrite a site setting"""
+    conn.execute('''
+        INSERT INTO site_settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    ''', (key, value))
+
+def add_wishlist_item(conn, user_id, product_id):
+    """Add a product to a wishlist (no-op if present); returns the wishlist size"""
+    conn.execute(dialect_of(conn).insert_ignore('wishlists', ['user_id', 'product_id'], ['user_id', 'product_id']),
+                 (user_id, product_id))
+    return conn.execute('SELECT COUNT(*) FROM wishlists WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+def set_inventory_alert(conn, farmer_id, product_id, alert_type, threshold_value):
+    """Create or update the farmer's alert of this type for a product, re-enabling it"""
+    updated = conn.execute('''
+        UPDATE inventory_alerts SET threshold_value = ?, is_active = 1
+        WHERE farmer_id = ? AND product_id = ? AND alert_type = ?
+    ''', (threshold_value, farmer_id, product_id, alert_type)).rowcount
+    if not updated:
+        conn.execute('''
+            INSERT INTO inventory_alerts (farmer_id, product_id, alert_type, threshold_value, is_active)
+            VALUES (?, ?, ?, ?, 1)
+        ''', (farmer_id, product_id, alert_type, threshold_value))
+
+def top_farmers(conn, limit=10):
+    """Approved farmers by paid earnings, with order counts and average rating"""
+    return conn.execute(f'''
+        SELECT u.farm_name, u.full_name,
+               COUNT(DISTINCT oi.order_id) as total_orders,
+               SUM(oi.subtotal) as total_earnings,
+               CASE WHEN u.rating_count > 0
+                    THEN ROUND(1.0 * u.rating_sum / u.rating_count, 1)
+               END as avg_rating
+        FROM users u
+        LEFT JOIN order_items oi ON u.id = oi.farmer_id
+        LEFT JOIN orders o ON oi.order_id = o.id AND o.payment_status = 'paid'
+        WHERE u.user_type = 'farmer' AND u.is_approved = 1
+        GROUP BY u.id
+        ORDER BY {dialect_of(conn).nulls_last('total_earnings')}
+        LIMIT ?
+    ''', (limit,)).fetchall()
+
+def top_products(conn, limit=10):
+    """Best-selling products by paid revenue"""
+    return conn.execute('''
+        SELECT p.name, p.category, u.farm_name,
+               SUM(oi.quantity) as total_sold,
+               SUM(oi.subtotal) as revenue
+        FROM products p
+        JOIN order_items oi ON p.id = oi.product_id
+        JOIN orders o ON oi.order_id = o.id
+        JOIN users u ON p.farmer_id = u.id
+        WHERE o.payment_status = 'paid'
+        GROUP BY p.id, u.farm_name
+        ORDER BY revenue DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+
+def category_stats(conn):
+    """Products, orders and revenue per category"""
+    return conn.execute(f'''
+        SELECT p.category,
+               COUNT(DISTINCT p.id) as product_count,
+               COUNT(DISTINCT oi.order_id) as order_count,
+               SUM(oi.subtotal) as revenue
+        FROM products p
+        LEFT JOIN order_items oi ON p.id = oi.product_id
+        LEFT JOIN orders o ON oi.order_id = o.id AND o.payment_status = 'paid'
+        GROUP BY p.category
+        ORDER BY {dialect_of(conn).nulls_last('revenue')}
+    ''').fetchall()
+
+def popular_searches(conn, days=30, limit=20):
+    """Most frequent search queries over the last `days` days"""
+    return conn.execute(f'''
+        SELECT query, COUNT(*) as search_count, AVG(results_count) as avg_results
+        FROM search_history
+        WHERE created_at >= {dialect_of(conn).days_ago(days)}
+        GROUP BY query
+        ORDER BY search_count DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+
+def _report_sql(dialect, report_type):
+    month = dialect.month('o.created_at')
+    return {
+        'users': ('''
+            SELECT id, username, email, user_type, full_name, phone, location,
+                   farm_name, is_approved, is_active, created_at
+            FROM users
+            WHERE user_type IN ('farmer', 'consumer')
+            ORDER BY created_at DESC
+        ''', ['ID', 'Username', 'Email', 'User Type', 'Full Name', 'Phone',
+              'Location', 'Farm Name', 'Approved', 'Active', 'Created At']),
+        'orders': ('''
+            SELECT o.id, o.order_number, o.total_amount, o.status, o.payment_status,
+                   o.created_at, u.full_name as consumer_name, u.email as consumer_email
+            FROM orders o
+            JOIN users u ON o.consumer_id = u.id
+            ORDER BY o.created_at DESC
+        ''', ['ID', 'Order Number', 'Total Amount', 'Status', 'Payment Status',
+              'Created At', 'Consumer Name', 'Consumer Email']),
+        'products': ('''
+            SELECT p.id, p.name, p.category, p.price, p.unit, p.quantity,
+                   p.is_approved, p.created_at, u.farm_name, u.full_name as farmer_name
+            FROM products p
+            JOIN users u ON p.farmer_id = u.id
+            ORDER BY p.created_at DESC
+        ''', ['ID', 'Name', 'Category', 'Price', 'Unit', 'Quantity',
+              'Approved', 'Created At', 'Farm Name', 'Farmer Name']),
+        'revenue': (f'''
+            SELECT {month} as month,
+                   COUNT(*) as order_count,
+                   SUM(o.total_amount) as total_revenue,
+                   AVG(o.total_amount) as avg_order_value
+            FROM orders o
+            WHERE o.payment_status = 'paid'
+            GROUP BY {month}
+            ORDER BY month DESC
+        ''', ['Month', 'Order Count', 'Total Revenue', 'Average Order Value']),
+    }.get(report_type)
+
+def report(conn, report_type):
+    """(headers, streamed tuple rows) for an admin export, or None for an unknown report"""
+    query = _report_sql(dialect_of(conn), report_type)
+    if query is None:
+        return None
+    sql, headers = query
+    return headers, stream(conn, sql)
@@ -0,0 +1,50 @@
+"""
+Rollups module for Farmer Connect
+Gap-filled daily and monthly series read from the rollups table
+"""
+
+from datetime import datetime, timedelta
+
+# Metrics maintained by the rollup triggers in database.py
+METRICS = ('farmer_registrations', 'consumer_registrations', 'orders', 'revenue', 'farmer_earnings')
+
+LABELS = {'day': '%d %b', 'month': '%m/%Y'}
+
+def buckets(grain='month', count=12, end=None):
+    """The last `count` bucket keys up to and including the one holding `end`, oldest first"""
+    end = end or datetime.utcnow()
+    if grain == 'day':
+        days = [end.date() - timedelta(days=offset) for offset in range(count - 1, -1, -1)]
+        return [day.isoformat() for day in days]
+
+    index = end.year * 12 + end.month - 1
+    return [f'{i // 12:04d}-{i % 12 + 1:02d}' for i in range(index - count + 1, index + 1)]
+
+def label(bucket, grain='month'):
+    """Display label for a bucket key"""
+    return datetime.strptime(bucket, '%Y-%m-%d' if grain == 'day' else '%Y-%m').strftime(LABELS[grain])
+
+def series(conn, metrics, grain='month', count=12, key=0, end=None):
+    """Columnar {'bucket', 'label', metric: [values]} with zeros for empty buckets
+
+    `metrics` is a metric name or a list of them, read for the same `key`
+    (0 for site-wide metrics, the farmer id for farmer_earnings). Each metric
+    reads at most `count` rows off the rollups primary key.
+    """
+    if isinstance(metrics, str):
+        metrics = [metrics]
+    keys = buckets(grain, count, end)
+    values = {metric: dict.fromkeys(keys, 0) for metric in metrics}
+
+    placeholders = ', '.join('?' for _ in metrics)
+    rows = conn.execute(f'''
+        SELECT metric, bucket, value FROM rollups
+        WHERE metric IN ({placeholders}) AND grain = ? AND key = ? AND bucket BETWEEN ? AND ?
+    ''', [*metrics, grain, key, keys[0], keys[-1]])
+    for metric, bucket, value in rows:
+        values[metric][bucket] = int(value) if value.is_integer() else round(value, 2)
+
+    result = {'bucket': keys, 'label': [label(bucket, grain) for bucket in keys]}
+    for metric in metrics:
+        result[metric] = list(values[metric].values())
+    return result
@@ -0,0 +1,70 @@
+"""
+Rows module for Farmer Connect
+Compact row shapes for large result sets: plain tuples, named records and columns
+"""
+
+import keyword
+from functools import lru_cache
+from operator import itemgetter
+
+def column_names(cursor):
+    return tuple(column[0] for column in cursor.description or ())
+
+def column_map(cursor):
+    """Column name -> index for a cursor's current statement (first match wins, as with sqlite3.Row)"""
+    names = column_names(cursor)
+    return {name: index for index, name in reversed(list(enumerate(names)))}
+
+@lru_cache(maxsize=256)
+def record_class(columns):
+    """Tuple subclass with no per-row dict, readable as row.name, row['name'] or row[0]"""
+    index = {}
+    for position, name in enumerate(columns):
+        index.setdefault(name, position)
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            key = index[key]
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(columns)
+
+    def __repr__(self):
+        return 'Record(' + ', '.join(f'{name}={value!r}' for name, value in zip(columns, self)) + ')'
+
+    namespace = {'__slots__': (), '__getitem__': __getitem__, 'keys': keys, '__repr__': __repr__,
+                 'columns': columns}
+    for name, position in index.items():
+        if name.isidentifier() and not keyword.iskeyword(name) and name not in namespace:
+            namespace[name] = property(itemgetter(position))
+    return type('Record', (tuple,), namespace)
+
+def tuple_cursor(conn, sql, params=()):
+    """Execute with plain tuple rows; iterate the cursor to stream results"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(sql, params)
+
+def fetch_tuples(conn, sql, params=()):
+    """(column map, list of tuples)"""
+    cursor = tuple_cursor(conn, sql, params)
+    return column_map(cursor), cursor.fetchall()
+
+def fetch_records(conn, sql, params=()):
+    """List of named records, a drop-in for sqlite3.Row in views and templates"""
+    cursor = tuple_cursor(conn, sql, params)
+    record = record_class(column_names(cursor))
+    # Iterate rather than fetchall so each intermediate tuple is freed straight away
+    return list(map(record, cursor))
+
+def fetch_columns(conn, sql, params=()):
+    """Columnar batch {name: [values]} for charts, aggregates and exports"""
+    cursor = tuple_cursor(conn, sql, params)
+    names = column_names(cursor)
+    columns = [[] for _ in names]
+    appenders = [column.append for column in columns]
+    for row in cursor:
+        for append, value in zip(appenders, row):
+            append(value)
+    return dict(zip(names, columns))
@@ -0,0 +1,235 @@
+"""
+Server module for Farmer Connect
+Pre-fork production launcher: preload and warm the app once, fork workers, reload on SIGHUP
+"""
+
+import os
+import sys
+import time
+import errno
+import signal
+import select
+import socket
+import threading
+from modules import database, templating
+
+# Seconds a stopping worker may spend finishing in-flight requests
+GRACEFUL_TIMEOUT = 30
+
+# Seconds a new worker has to report ready before a reload is abandoned
+READY_TIMEOUT = 30
+
+def warm_up(app):
+    """Prepare everything workers inherit; returns [(phase, seconds, detail)]"""
+    phases = []
+
+    started = time.perf_counter()
+    database.init_db()
+    conn = database.get_db_connection(row_factory=None)
+    tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+    conn.close()
+    phases.append(('database', time.perf_counter() - started, f'{tables} tables'))
+
+    started = time.perf_counter()
+    count = database.load_settings()
+    phases.append(('settings', time.perf_counter() - started, f'{count} settings'))
+
+    app.jinja_env.cache.clear()
+    count, seconds = templating.warm_up(app)
+    phases.append(('templates', seconds, f'{count} templates'))
+    return phases
+
+def format_phases(phases):
+    return ', '.join(f'{name} {seconds * 1000:.0f} ms ({detail})' for name, seconds, detail in phases)
+
+class InFlight:
+    """WSGI middleware counting requests still being answered, so a stopping worker can drain them"""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            self.count += 1
+        try:
+            yield from self.app(environ, start_response)
+        finally:
+            with self.lock:
+                self.count -= 1
+
+def run_worker(app, listener, ready_fd, graceful_timeout):
+    """Body of a forked worker: serve on the shared socket until SIGTERM, then drain and exit"""
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    host, port = listener.getsockname()[:2]
+    in_flight = InFlight(app)
+    server = make_server(host, port, in_flight, threaded=True, fd=listener.fileno())
+
+    # shutdown() waits for serve_forever() to return, so it cannot run in the signal handler itself
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    os.write(ready_fd, b'1')
+    os.close(ready_fd)
+    server.serve_forever()
+
+    deadline = time.monotonic() + graceful_timeout
+    while in_flight.count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    sys.stdout.flush()
+    os._exit(0)
+
+class Arbiter:
+    """Master process: owns the listening socket and keeps `workers` forked workers running
+
+    SIGHUP re-reads settings and templates, forks a new generation and,
+    once every new worker reports ready, stops the old one gracefully, so
+    the socket never goes unserved. SIGTERM/SIGINT stop all workers after
+    they finish their requests. Code changes still need a full restart.
+    """
+
+    def __init__(self, app, host='0.0.0.0', port=5000, workers=None, graceful_timeout=GRACEFUL_TIMEOUT):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or (os.cpu_count() or 1) * 2 + 1
+        self.graceful_timeout = graceful_timeout
+        self.generation = 0
+        self.children = {}  # pid -> generation
+        self.listener = None
+        self._signals = []
+
+    def log(self, message):
+        print(f"[{os.getpid()}] {message}", flush=True)
+
+    def bind(self):
+        listener = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(2048)
+        listener.set_inheritable(True)
+        self.listener = listener
+        self.port = listener.getsockname()[1]
+
+    def spawn(self, count, generation):
+        """Fork `count` workers; returns their pids and whether all reported ready in time"""
+        read_fd, write_fd = os.pipe()
+        pids = []
+        for _ in range(count):
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                try:
+                    run_worker(self.app, self.listener, write_fd, self.graceful_timeout)
+                finally:
+                    os._exit(1)
+            pids.append(pid)
+            self.children[pid] = generation
+        os.close(write_fd)
+
+        ready, deadline = 0, time.monotonic() + READY_TIMEOUT
+        while ready < count and time.monotonic() < deadline:
+            readable, _, _ = select.select([read_fd], [], [], 0.1)
+            if readable:
+                data = os.read(read_fd, count)
+                if not data:
+                    break
+                ready += len(data)
+        os.close(read_fd)
+        return pids, ready == count
+
+    def stop_workers(self, pids, graceful=True):
+        """SIGTERM workers (SIGKILL if not graceful) and wait up to the graceful timeout"""
+        for pid in pids:
+            self._kill(pid, signal.SIGTERM if graceful else signal.SIGKILL)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while any(pid in self.children for pid in pids) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in pids:
+            if pid in self.children:
+                self._kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                del self.children[pid]
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def reap(self):
+        """Forget exited workers; returns the generations they belonged to"""
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            generation = self.children.pop(pid, None)
+            if generation is not None:
+                exited.append(generation)
+                if generation == self.generation and status:
+                    self.log(f"Worker {pid} exited with status {status}")
+        return exited
+
+    def reload(self):
+        """Warm up again, start a new generation and retire the old one once it is serving"""
+        started = time.perf_counter()
+        phases = warm_up(self.app)
+        old = list(self.children)
+        spawned = time.perf_counter()
+        pids, ready = self.spawn(self.workers, self.generation + 1)
+        if not ready:
+            self.log("Reload failed: new workers did not start; keeping the current ones")
+            self.stop_workers(pids, graceful=False)
+            return
+        self.generation += 1
+        phases.append(('workers', time.perf_counter() - spawned, f'{len(pids)} ready'))
+        self.stop_workers(old)
+        self.log(f"Reloaded in {(time.perf_counter() - started) * 1000:.0f} ms: {format_phases(phases)}")
+
+    def run(self):
+        started = time.perf_counter()
+        self.bind()
+        phases = [('bind', time.perf_counter() - started, f'{self.host}:{self.port}')]
+        phases += warm_up(self.app)
+
+        spawned = time.perf_counter()
+        self.generation = 1
+        pids, ready = self.spawn(self.workers, self.generation)
+        if not ready:
+            self.log("Workers failed to start")
+            self.stop_workers(pids, graceful=False)
+            self.listener.close()
+            sys.exit(1)
+        phases.append(('workers', time.perf_counter() - spawned, f'{self.workers} ready'))
+        self.log(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+        self.log(f"Started in {(time.perf_counter() - started) * 1000:.0f} ms: {format_phases(phases)}")
+
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self._signals.append(signum))
+        try:
+            while True:
+                if self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.log("SIGHUP: reloading")
+                        self.reload()
+                        continue
+                    self.log("Shutting down")
+                    break
+
+                # Replace workers of the current generation that died
+                lost = self.reap().count(self.generation)
+                if lost:
+                    self.spawn(lost, self.generation)
+                time.sleep(0.2)
+        finally:
+            self.stop_workers(list(self.children))
+            self.listener.close()
@@ -0,0 +1,180 @@
+"""
+Sessions module for Farmer Connect
+Server-side sessions in SQLite and a per-process cache of the signed-in user's row
+"""
+
+import time
+import random
+import secrets
+import threading
+from types import SimpleNamespace
+from collections import OrderedDict
+from flask import g, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from modules.database import get_db_connection
+from modules import metrics
+
+# Users whose rows are kept in memory per process
+USER_CACHE_SIZE = 1024
+
+# Share of new sessions that also delete expired ones
+PRUNE_PROBABILITY = 0.01
+
+# Session keys mirrored from the user row for templates and older views
+USER_FIELDS = ('username', 'user_type', 'full_name', 'is_approved')
+
+_users = OrderedDict()
+_users_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data loaded from the sessions table; only the id travels in the cookie"""
+
+    def __init__(self, initial=None, sid=None, user_stamp=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.user_stamp = user_stamp
+        self.loaded_user_id = (initial or {}).get('user_id')
+        self.modified = False
+
+class SQLiteSessionInterface(SessionInterface):
+    """Keeps session data in the application database so it can be revoked server-side"""
+
+    serializer = TaggedJSONSerializer()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession()
+
+        conn = get_db_connection(row_factory=None)
+        row = conn.execute('SELECT data, user_stamp, expires_at FROM sessions WHERE id = ?', (sid,)).fetchone()
+        if row and row[2] < time.time():
+            conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+            conn.commit()
+            row = None
+        conn.close()
+
+        if not row:
+            return ServerSession()
+        session = ServerSession(self.serializer.loads(row[0]), sid, row[1])
+        # Slide the expiry once half of the lifetime has passed
+        if row[2] - time.time() < app.permanent_session_lifetime.total_seconds() / 2:
+            session.modified = True
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid:
+                delete_sessions('id = ?', session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # A new session id on sign-in or sign-out guards against session fixation
+        if session.sid and session.get('user_id') != session.loaded_user_id:
+            delete_sessions('id = ?', session.sid)
+            session.sid = None
+            session.modified = True
+
+        if session.sid and not session.modified:
+            return
+
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        conn = get_db_connection(row_factory=None)
+        if not session.sid:
+            session.sid = secrets.token_urlsafe(32)
+            if random.random() < PRUNE_PROBABILITY:
+                conn.execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))
+        # New sessions share the user's current stamp, or start from a random one
+        user_id = session.get('user_id')
+        conn.execute('''
+            INSERT INTO sessions (id, user_id, data, expires_at, user_stamp)
+            VALUES (?, ?, ?, ?, COALESCE((SELECT user_stamp FROM sessions WHERE user_id = ? LIMIT 1), random()))
+            ON CONFLICT (id) DO UPDATE SET user_id = excluded.user_id, data = excluded.data,
+                                           expires_at = excluded.expires_at
+        ''', (session.sid, user_id, self.serializer.dumps(dict(session)), expires_at, user_id))
+        conn.commit()
+        conn.close()
+
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+def delete_sessions(where, *params):
+    """Remove sessions matching a condition, e.g. delete_sessions('user_id = ?', user_id)"""
+    conn = get_db_connection()
+    conn.execute(f'DELETE FROM sessions WHERE {where}', params)
+    conn.commit()
+    conn.close()
+
+def _cached_user(user_id, stamp):
+    """User row as a dict from the cache while its stamp matches, else from the database"""
+    with _users_lock:
+        entry = _users.get(user_id)
+        if entry and stamp is not None and entry[0] == stamp:
+            _users.move_to_end(user_id)
+            _stats['hits'] += 1
+            return entry[1]
+        _stats['misses'] += 1
+
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+    conn.close()
+    user = dict(row) if row else None
+
+    with _users_lock:
+        if user and stamp is not None:
+            _users[user_id] = (stamp, user)
+            _users.move_to_end(user_id)
+            while len(_users) > USER_CACHE_SIZE:
+                _users.popitem(last=False)
+        else:
+            _users.pop(user_id, None)
+    return user
+
+def current_user():
+    """The signed-in user's row (a dict), loaded at most once per request, or None"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        user = _cached_user(user_id, getattr(session, 'user_stamp', None)) if user_id else None
+        if user and not user['is_active']:
+            user = None
+        g.current_user = user
+        if user:
+            # Keep the copies in the session in step with the database
+            for field in USER_FIELDS:
+                if session.get(field) != user[field]:
+                    session[field] = user[field]
+        elif user_id:
+            session.clear()
+    return g.current_user
+
+def reload_current_user():
+    """Re-read the signed-in user after changing their row during this request"""
+    invalidate_user(session.get('user_id'))
+    g.pop('current_user', None)
+    return current_user()
+
+def invalidate_user(user_id):
+    """Drop a user's cached row in this process; other processes see the bumped stamp"""
+    with _users_lock:
+        _users.pop(user_id, None)
+
+def cache_info():
+    """Hits, misses and size of the user cache, in the shape of lru_cache's cache_info()"""
+    return SimpleNamespace(hits=_stats['hits'], misses=_stats['misses'], currsize=len(_users))
+
+metrics.register_cache('users', cache_info)
+
+def init_app(app):
+    """Store sessions server-side unless SERVER_SESSIONS is False"""
+    if app.config.setdefault('SERVER_SESSIONS', True):
+        app.session_interface = SQLiteSessionInterface()
@@ -0,0 +1,297 @@
+"""
+Storage module for Farmer Connect
+SQLite and PostgreSQL engines behind one connection interface, plus the SQL dialect helpers they need
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import itertools
+from modules import database, replica
+from modules.rows import tuple_cursor
+
+# Rows fetched per round trip when streaming large results
+STREAM_BATCH = 1000
+
+class Dialect:
+    """SQL that differs between engines; queries are written with ? placeholders for every engine"""
+
+    name = 'sqlite'
+
+    def translate(self, sql):
+        return sql
+
+    def month(self, column):
+        """'YYYY-MM' bucket of a timestamp column"""
+        return f"strftime('%Y-%m', {column})"
+
+    def days_ago(self, days):
+        """Date `days` days before today"""
+        return f"DATE('now', '-{int(days)} days')"
+
+    def nulls_last(self, expression, descending=True):
+        """ORDER BY term with NULLs after every value (native NULLS LAST needs SQLite 3.30)"""
+        direction = 'DESC' if descending else 'ASC'
+        if sqlite3.sqlite_version_info >= (3, 30):
+            return f'{expression} {direction} NULLS LAST'
+        return f'{expression} IS NULL, {expression} {direction}'
+
+    def insert_ignore(self, table, columns, conflict):
+        """INSERT that skips rows clashing with the unique key `conflict`"""
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT ({', '.join(conflict)}) DO NOTHING")
+
+    def upsert(self, table, columns, conflict):
+        """INSERT that overwrites the non-key columns of a row clashing with `conflict`"""
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in conflict)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates}")
+
+class PostgresDialect(Dialect):
+
+    name = 'postgresql'
+
+    # Quoted strings are left alone; every ? outside them becomes %s
+    _placeholders = re.compile(r"'(?:[^']|'')*'|\?")
+
+    def translate(self, sql):
+        """? placeholders to psycopg2's %s, escaping literal % signs"""
+        sql = sql.replace('%', '%%')
+        return self._placeholders.sub(lambda match: '%s' if match.group() == '?' else match.group(), sql)
+
+    def month(self, column):
+        return f"to_char({column}, 'YYYY-MM')"
+
+    def days_ago(self, days):
+        return f"(CURRENT_DATE - {int(days)})"
+
+    def nulls_last(self, expression, descending=True):
+        return f"{expression} {'DESC' if descending else 'ASC'} NULLS LAST"
+
+SQLITE = Dialect()
+POSTGRESQL = PostgresDialect()
+
+def dialect_of(conn):
+    """Dialect of a storage connection; plain sqlite3 connections are SQLite"""
+    return getattr(conn, 'dialect', SQLITE)
+
+def stream(conn, sql, params=(), size=STREAM_BATCH):
+    """Iterate tuple rows of a large result without loading it all (server-side cursor on PostgreSQL)"""
+    if isinstance(conn, PostgresConnection):
+        return conn.stream(sql, params, size)
+    cursor = tuple_cursor(conn.raw if isinstance(conn, SQLiteConnection) else conn, sql, params)
+    return itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(size), []))
+
+class SQLiteConnection:
+    """A sqlite3 connection from database.get_db_connection() with the storage interface"""
+
+    dialect = SQLITE
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def execute(self, sql, params=()):
+        return self.raw.execute(sql, params)
+
+    def insert(self, sql, params=()):
+        """Run an INSERT; returns the new row id"""
+        return self.raw.execute(sql, params).lastrowid
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+class PostgresConnection:
+    """A pooled psycopg2 connection; rows read like sqlite3.Row (by name or index)"""
+
+    dialect = POSTGRESQL
+
+    def __init__(self, engine, raw, row_factory):
+        self.engine = engine
+        self.raw = raw
+        self.cursor_factory = engine.extras.DictCursor if row_factory else None
+        self._names = itertools.count()
+
+    def execute(self, sql, params=()):
+        cursor = self.raw.cursor(cursor_factory=self.cursor_factory)
+        cursor.execute(self.dialect.translate(sql), tuple(params))
+        return cursor
+
+    def insert(self, sql, params=()):
+        return self.execute(f'{sql.rstrip()} RETURNING id', params).fetchone()[0]
+
+    def stream(self, sql, params=(), size=STREAM_BATCH):
+        """Named cursor: the server holds the result and sends `size` rows per fetch"""
+        cursor = self.raw.cursor(name=f'stream_{id(self)}_{next(self._names)}')
+        cursor.itersize = size
+        cursor.execute(self.dialect.translate(sql), tuple(params))
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        """Return the connection to the pool, discarding any open transaction"""
+        if self.raw is not None:
+            self.raw.rollback()
+            self.engine.pool.putconn(self.raw)
+            self.raw = None
+
+class SQLiteEngine:
+    """The local SQLite file at database.DATABASE"""
+
+    dialect = SQLITE
+    url = 'sqlite'
+
+    def connect(self, row_factory=sqlite3.Row):
+        return SQLiteConnection(database.get_db_connection(row_factory))
+
+    def close(self):
+        pass
+
+class PostgresEngine:
+    """PostgreSQL through a thread-safe psycopg2 connection pool"""
+
+    dialect = POSTGRESQL
+
+    def __init__(self, url, min_connections=1, max_connections=10):
+        try:
+            import psycopg2.extras
+            import psycopg2.pool
+        except ImportError:
+            raise RuntimeError("PostgreSQL storage needs psycopg2: pip install psycopg2-binary")
+        self.url = url
+        self.extras = psycopg2.extras
+        self.pool = psycopg2.pool.ThreadedConnectionPool(min_connections, max_connections, url)
+
+    def connect(self, row_factory=sqlite3.Row):
+        return PostgresConnection(self, self.pool.getconn(), row_factory)
+
+    def close(self):
+        self.pool.closeall()
+
+def create_engine(url=None, max_connections=10):
+    """Engine for a storage URL: postgresql://... or None/sqlite:///... for the SQLite file"""
+    if url and url.startswith(('postgresql://', 'postgres://')):
+        return PostgresEngine(url, max_connections=max_connections)
+    if url and not url.startswith('sqlite:///'):
+        raise ValueError(f"Unsupported STORAGE_URL: {url}")
+    return SQLiteEngine()
+
+# Where analytics and report reads go: a PostgreSQL copy when url is set, otherwise the SQLite snapshot
+_reports = {'url': None, 'max_connections': 10, 'engine': None, 'pid': None}
+_reports_lock = threading.Lock()
+
+def configure(url=None, max_connections=10):
+    """Serve analytics and reports from the PostgreSQL database at `url` (kept current by copy-to-postgres)"""
+    if url and not url.startswith(('postgresql://', 'postgres://')):
+        raise ValueError(f"Unsupported REPORTS_STORAGE_URL: {url}")
+    _reports.update(url=url, max_connections=max_connections, engine=None, pid=None)
+
+def report_connection(row_factory=sqlite3.Row):
+    """Read-only connection for analytics and reports, on the configured report engine
+
+    Falls back to replica.get_read_connection() when no PostgreSQL report
+    store is configured. Queries run here must go through the dialect
+    helpers. The pool is created on first use in each process, so forked
+    workers never share the arbiter's sockets.
+    """
+    if not _reports['url']:
+        return replica.get_read_connection(row_factory)
+    with _reports_lock:
+        if _reports['pid'] != os.getpid():
+            _reports.update(engine=PostgresEngine(_reports['url'], max_connections=_reports['max_connections']),
+                            pid=os.getpid())
+        engine = _reports['engine']
+    return engine.connect(row_factory)
+
+def init_app(app):
+    """Configure from REPORTS_STORAGE_URL and REPORTS_STORAGE_CONNECTIONS"""
+    configure(url=app.config.setdefault('REPORTS_STORAGE_URL', None),
+              max_connections=app.config.setdefault('REPORTS_STORAGE_CONNECTIONS', 10))
+
+# SQLite column types as PostgreSQL types; BOOLEAN stays an integer because queries compare it with 0/1
+_PG_TYPES = [('BOOLEAN', 'SMALLINT'), ('INTEGER', 'BIGINT'), ('REAL', 'DOUBLE PRECISION'),
+             ('DATETIME', 'TIMESTAMP'), ('DECIMAL', 'NUMERIC'), ('BLOB', 'BYTEA')]
+
+def _pg_column(column):
+    declared = (column['type'] or 'TEXT').upper()
+    for sqlite_type, pg_type in _PG_TYPES:
+        if declared.startswith(sqlite_type):
+            declared = pg_type + declared[len(sqlite_type):]
+            break
+    definition = f"{column['name']} {declared}"
+    if column['notnull']:
+        definition += ' NOT NULL'
+    if column['dflt_value'] is not None:
+        definition += f" DEFAULT {column['dflt_value']}"
+    return definition
+
+def copy_sqlite_to(engine, batch=STREAM_BATCH):
+    """Create the SQLite tables and indexes in a PostgreSQL engine and copy every row; returns rows copied
+
+    Column types, defaults, keys and UNIQUE constraints are carried over; CHECK and foreign-key
+    constraints are not, and virtual tables (the geo R*Tree) are skipped.
+    Intended for benchmarks and for moving an existing install across.
+    """
+    source = database.get_db_connection()
+    target = engine.connect()
+    copied = 0
+    try:
+        schema = source.execute('''
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid
+        ''').fetchall()
+        virtual = tuple(row['name'] + '_' for row in schema if row['sql'].startswith('CREATE VIRTUAL'))
+        tables = [row['name'] for row in schema
+                  if not row['sql'].startswith('CREATE VIRTUAL') and not row['name'].startswith(virtual)]
+        for table in tables:
+            columns = source.execute(f'PRAGMA table_info({table})').fetchall()
+            keys = [column['name'] for column in sorted(columns, key=lambda column: column['pk']) if column['pk']]
+            types = {column['name']: (column['type'] or '').upper() for column in columns}
+            identity = len(keys) == 1 and types[keys[0]] == 'INTEGER'
+            definitions = [f"{column['name']} BIGINT GENERATED BY DEFAULT AS IDENTITY"
+                           if identity and column['name'] == keys[0] else _pg_column(column) for column in columns]
+            if keys:
+                definitions.append(f"PRIMARY KEY ({', '.join(keys)})")
+            for index in sorted(source.execute(f'PRAGMA index_list({table})').fetchall(), key=lambda index: index['name']):
+                if index['origin'] == 'u':
+                    unique = source.execute(f"PRAGMA index_info({index['name']})").fetchall()
+                    definitions.append(f"UNIQUE ({', '.join(column['name'] for column in unique)})")
+            target.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            target.execute(f"CREATE TABLE {table} ({', '.join(definitions)})")
+
+            names = [column['name'] for column in columns]
+            insert = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+            rows = stream(source, f"SELECT {', '.join(names)} FROM {table}")
+            for chunk in iter(lambda: list(itertools.islice(rows, batch)), []):
+                target.raw.cursor().executemany(engine.dialect.translate(insert), chunk)
+                copied += len(chunk)
+            if identity:
+                target.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{keys[0]}'), "
+                               f"COALESCE((SELECT MAX({keys[0]}) FROM {table}), 0) + 1, false)")
+
+        # Plain indexes only; expression, partial and NOCASE indexes are SQLite-specific
+        for row in source.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"):
+            sql = row['sql'].replace('IF NOT EXISTS ', '')
+            if 'COLLATE' in sql.upper() or ' WHERE ' in sql.upper() or '(' in sql.split('(', 1)[1]:
+                continue
+            target.execute(sql.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1)
+                              .replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX IF NOT EXISTS', 1))
+        target.commit()
+        return copied
+    finally:
+        source.close()
+        target.close()
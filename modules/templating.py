@@ -0,0 +1,33 @@
+"""
+Templating module for Farmer Connect
+Jinja bytecode cache, template warm-up and production reload settings
+"""
+
+import os
+import time
+from jinja2 import FileSystemBytecodeCache, TemplateError
+
+def init_app(app):
+    """Attach a shared bytecode cache and stop checking template mtimes in production"""
+    cache_dir = app.config.setdefault('TEMPLATE_CACHE_DIR', os.path.join('cache', 'jinja'))
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Workers share the directory; Jinja writes each entry atomically
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    # Left as None, Flask reloads templates only when debug is on
+    if os.environ.get('FLASK_ENV') == 'production':
+        app.config['TEMPLATES_AUTO_RELOAD'] = False
+        app.jinja_env.auto_reload = False
+
+def warm_up(app):
+    """Compile every template into the environment cache; returns (count, seconds)"""
+    started = time.perf_counter()
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except TemplateError as e:
+            print(f"Template warm-up error in {name}: {e}")
+    return count, time.perf_counter() - started
@@ -8,6 +8,8 @@ import re
 from werkzeug.utils import secure_filename
 from functools import wraps
 from flask import session, redirect, url_for, flash
+from modules.dates import format_time_ago
+from modules.sessions import current_user
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -65,11 +67,13 @@ def require_login(user_types=None):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
+            # Checked against the user's current row, so approvals and deactivations apply at once
+            user = current_user()
+            if not user:
                 flash('Please login to access this page.', 'error')
                 return redirect(url_for('auth.login'))
             
-            if user_types and session.get('user_type') not in user_types:
+            if user_types and user['user_type'] not in user_types:
                 flash('You do not have permission to access this page.', 'error')
                 return redirect(url_for('index'))
             
@@ -81,7 +85,8 @@ def require_approval(f):
     """Decorator to require account approval"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get('is_approved'):
+        user = current_user()
+        if not user or not user['is_approved']:
             flash('Your account is pending approval. Please wait for admin approval.', 'warning')
             return redirect(url_for('index'))
         return f(*args, **kwargs)
@@ -146,6 +151,7 @@ def calculate_delivery_charge(total_amount, delivery_distance=None):
     
     free_delivery_above = float(get_setting('free_delivery_above', 1000))
     base_delivery_charge = float(get_setting('delivery_charge', 50))
+    max_delivery_charge = float(get_setting('max_delivery_charge', 250))
     
     if total_amount >= free_delivery_above:
         return 0
@@ -158,7 +164,8 @@ def calculate_delivery_charge(total_amount, delivery_distance=None):
         extra_km = delivery_distance - 10
         delivery_charge += extra_km * 5  # ₹5 per km after 10km
     
-    return delivery_charge
+    # A far-away farmer (or a mis-geocoded address) must not run the charge up without bound
+    return min(delivery_charge, max_delivery_charge)
 
 def truncate_text(text, length=100):
     """Truncate text to specified length"""
@@ -226,16 +233,19 @@ def get_user_notifications(user_id, limit=10, unread_only=False):
         SELECT * FROM notifications 
         WHERE user_id = ?
     '''
+    params = [user_id]
     
     if unread_only:
         query += ' AND is_read = 0'
     
-    query += ' ORDER BY created_at DESC'
+    # Newest first by id, which idx_notifications_user serves without a sort
+    query += ' ORDER BY id DESC'
     
     if limit:
-        query += f' LIMIT {limit}'
+        query += ' LIMIT ?'
+        params.append(int(limit))
     
-    notifications = conn.execute(query, (user_id,)).fetchall()
+    notifications = conn.execute(query, params).fetchall()
     conn.close()
     
     return notifications
@@ -280,52 +290,59 @@ def track_user_activity(user_id, activity_type, activity_data=None):
     finally:
         conn.close()
 
+def average_rating(rating_sum, rating_count):
+    """Average rating from denormalized rating_sum/rating_count columns"""
+    if not rating_count:
+        return 0
+    return round(rating_sum / rating_count, 1)
+
 def get_product_rating(product_id):
     """Get average rating for a product"""
-    from modules.database import get_db_connection
-    
-    conn = get_db_connection()
-    
-    try:
-        result = conn.execute('''
-            SELECT AVG(rating) as avg_rating, COUNT(*) as review_count
-            FROM reviews 
-            WHERE product_id = ? AND is_approved = 1
-        ''', (product_id,)).fetchone()
-        
-        avg_rating = round(result['avg_rating'], 1) if result['avg_rating'] else 0
-        review_count = result['review_count'] if result['review_count'] else 0
-        
-        return avg_rating, review_count
-    
-    except Exception as e:
-        print(f"Get product rating error: {e}")
-        return 0, 0
-    
-    finally:
-        conn.close()
+    avg_rating, review_count = get_product_ratings([product_id]).get(product_id, (0, 0))
+    return avg_rating, review_count
 
 def get_farmer_rating(farmer_id):
     """Get average rating for a farmer"""
+    avg_rating, rating_count = get_farmer_ratings([farmer_id]).get(farmer_id, (0, 0))
+    return avg_rating, rating_count
+
+def get_product_ratings(product_ids):
+    """Get (average rating, review count) for many products in one pass"""
+    return _get_rating_aggregates('products', product_ids)
+
+def get_farmer_ratings(farmer_ids):
+    """Get (average rating, rating count) for many farmers in one pass"""
+    return _get_rating_aggregates('users', farmer_ids)
+
+def _get_rating_aggregates(table, ids, chunk_size=500):
+    """Read rating_sum/rating_count for a list of ids, keyed by id"""
     from modules.database import get_db_connection
     
+    ids = list(dict.fromkeys(i for i in ids if i is not None))
+    if not ids:
+        return {}
+    
     conn = get_db_connection()
+    ratings = {}
     
     try:
-        result = conn.execute('''
-            SELECT AVG(rating) as avg_rating, COUNT(*) as rating_count
-            FROM farmer_ratings 
-            WHERE farmer_id = ? AND is_approved = 1
-        ''', (farmer_id,)).fetchone()
-        
-        avg_rating = round(result['avg_rating'], 1) if result['avg_rating'] else 0
-        rating_count = result['rating_count'] if result['rating_count'] else 0
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f'''
+                SELECT id, rating_sum, rating_count FROM {table}
+                WHERE id IN ({placeholders})
+            ''', chunk).fetchall()
+            
+            for row in rows:
+                ratings[row['id']] = (average_rating(row['rating_sum'], row['rating_count']),
+                                      row['rating_count'])
         
-        return avg_rating, rating_count
+        return ratings
     
     except Exception as e:
-        print(f"Get farmer rating error: {e}")
-        return 0, 0
+        print(f"Get rating aggregates error: {e}")
+        return {}
     
     finally:
         conn.close()
@@ -478,42 +495,55 @@ def get_product_availability_status(product):
     else:
         return {'status': 'in_stock', 'text': 'In Stock', 'class': 'badge-success'}
 
-def format_time_ago(datetime_str):
-    """Format datetime as time ago (e.g., '2 hours ago')"""
-    if not datetime_str:
-        return "Unknown"
+def get_product_card_data(products, user_id=None):
+    """Preload rating, wishlist and stock data for a grid of product rows
     
-    try:
-        from datetime import datetime
-        
-        # Parse the datetime string
-        if isinstance(datetime_str, str):
-            dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-        else:
-            dt = datetime_str
-        
-        now = datetime.now()
-        diff = now - dt
-        
-        seconds = diff.total_seconds()
-        
-        if seconds < 60:
-            return "Just now"
-        elif seconds < 3600:
-            minutes = int(seconds / 60)
-            return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-        elif seconds < 86400:
-            hours = int(seconds / 3600)
-            return f"{hours} hour{'s' if hours != 1 else ''} ago"
-        elif seconds < 2592000:  # 30 days
-            days = int(seconds / 86400)
-            return f"{days} day{'s' if days != 1 else ''} ago"
-        else:
-            return dt.strftime("%b %d, %Y")
+    Returns a mapping of product id -> card data, resolved with at most one
+    query for ratings (skipped when the rows already carry rating_sum and
+    rating_count) and one query for the user's wishlist.
+    """
+    from modules.database import get_db_connection
     
-    except Exception as e:
-        print(f"Format time ago error: {e}")
-        return str(datetime_str)
+    products = [product for product in products if product]
+    if not products:
+        return {}
+    
+    product_ids = [product['id'] for product in products]
+    
+    # Ratings come straight from the denormalized columns when selected
+    if 'rating_count' in products[0].keys():
+        ratings = {product['id']: (average_rating(product['rating_sum'], product['rating_count']),
+                                   product['rating_count'])
+                   for product in products}
+    else:
+        ratings = get_product_ratings(product_ids)
+    
+    wishlisted = set()
+    if user_id:
+        conn = get_db_connection()
+        try:
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f'''
+                    SELECT product_id FROM wishlists
+                    WHERE user_id = ? AND product_id IN ({placeholders})
+                ''', [user_id] + chunk).fetchall()
+                wishlisted.update(row['product_id'] for row in rows)
+        finally:
+            conn.close()
+    
+    cards = {}
+    for product in products:
+        avg_rating, review_count = ratings.get(product['id'], (0, 0))
+        cards[product['id']] = {
+            'rating': avg_rating,
+            'review_count': review_count,
+            'in_wishlist': product['id'] in wishlisted,
+            'availability': get_product_availability_status(product)
+        }
+    
+    return cards
 
 def generate_slug(text):
     """Generate URL-friendly slug from text"""
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+ASGI production runner for Farmer Connect
+
+Serves app:asgi_app with uvicorn (pip install uvicorn). Page views, JSON APIs
+and exports each run on their own thread pool per worker; event streams run
+on the event loop.
+
+    python run_asgi.py --workers 4 --page-threads 16 --api-threads 8 --export-threads 2
+"""
+
+import os
+import sys
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help='Worker processes')
+    parser.add_argument('--page-threads', type=int, default=int(os.environ.get('ASGI_PAGE_THREADS', 16)),
+                        help='Threads per worker for page views')
+    parser.add_argument('--api-threads', type=int, default=int(os.environ.get('ASGI_API_THREADS', 8)),
+                        help='Threads per worker for JSON APIs and event log reads')
+    parser.add_argument('--export-threads', type=int, default=int(os.environ.get('ASGI_EXPORT_THREADS', 2)),
+                        help='Threads per worker for CSV/PDF exports')
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ ASGI mode needs uvicorn: pip install uvicorn")
+        sys.exit(1)
+
+    # Workers import app.py themselves and read their pool sizes from the environment
+    os.environ['ASGI_PAGE_THREADS'] = str(args.page_threads)
+    os.environ['ASGI_API_THREADS'] = str(args.api_threads)
+    os.environ['ASGI_EXPORT_THREADS'] = str(args.export_threads)
+
+    print(f"Starting Farmer Connect (ASGI) on http://{args.host}:{args.port}")
+    print(f"{args.workers} workers x {args.page_threads} page / {args.api_threads} API / "
+          f"{args.export_threads} export threads")
+    uvicorn.run('app:asgi_app', host=args.host, port=args.port, workers=args.workers,
+                log_level=args.log_level, lifespan='on')
+
+if __name__ == '__main__':
+    main()
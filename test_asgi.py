@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for the ASGI serving mode
+"""
+
+import os
+import sys
+import json
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import asgi, database, events
+from modules.utils import send_notification
+from conftest import temp_database
+
+def http_scope(method, path, query=b'', headers=()):
+    return {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'http_version': '1.1',
+            'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+            'headers': [(name.encode(), value.encode()) for name, value in headers]}
+
+async def call(application, method, path, body=b'', headers=()):
+    """(status, headers, body) for one request through the ASGI app"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(http_scope(method, path, headers=headers), receive, send)
+    start = messages[0]
+    assert start['type'] == 'http.response.start'
+    assert not messages[-1].get('more_body')
+    return start['status'], dict(start['headers']), b''.join(m.get('body', b'') for m in messages[1:])
+
+def test_asgi():
+    """Views run on their pools with sessions intact, and event streams are served on the loop"""
+    from app import app
+
+    with temp_database():
+        lifetime = events.STREAM_LIFETIME
+        application = asgi.AsgiApp(app, {'page': 2, 'api': 2, 'export': 1})
+        try:
+            conn = database.get_db_connection()
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+                VALUES (12, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice', 1),
+                       (20, 'ravi', 'ravi@example.com', 'x', 'farmer', 'Ravi', 1)
+            ''')
+            conn.execute('''
+                INSERT INTO products (id, farmer_id, name, category, price, unit, quantity, is_approved)
+                VALUES (1, 20, 'Tomatoes', 'vegetables', 40, 'kg', 100, 1)
+            ''')
+            conn.commit()
+
+            assert asgi.pool_for('/consumer/api/cart/update') == 'api'
+            assert asgi.pool_for('/farmer/api/earnings/export/csv/month') == 'export'
+            assert asgi.pool_for('/products') == 'page'
+
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = 12
+                session['user_type'] = 'consumer'
+            cookie = f"{app.config['SESSION_COOKIE_NAME']}={client.get_cookie(app.config['SESSION_COOKIE_NAME']).value}"
+
+            async def scenario():
+                status, headers, body = await call(application, 'GET', '/products')
+                assert status == 200 and headers[b'content-type'].startswith(b'text/html') and b'Tomatoes' in body
+
+                payload = json.dumps({'product_id': 1, 'quantity': 2}).encode()
+                status, _, body = await call(application, 'POST', '/api/cart/add', payload,
+                                             [('content-type', 'application/json'), ('cookie', cookie)])
+                assert status == 200 and json.loads(body)['success'], body
+
+                status, _, _ = await call(application, 'GET', '/api/events')
+                assert status == 401
+
+                # An open stream holds no pool thread and is woken by writes
+                messages, closed = [], asyncio.Event()
+
+                requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+                async def receive():
+                    if requests:
+                        return requests.pop()
+                    await closed.wait()
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    messages.append(message)
+
+                scope = http_scope('GET', '/api/events', headers=[('cookie', cookie), ('last-event-id', '0')])
+                stream = asyncio.ensure_future(application(scope, receive, send))
+                await asyncio.sleep(0.2)
+                assert messages[0]['status'] == 200
+                assert asgi._running == {'page': 0, 'api': 0, 'export': 0}
+
+                def notify():
+                    writer = database.get_db_connection()
+                    send_notification(12, 'Order shipped', 'On its way', conn=writer)
+                    writer.commit()
+                    writer.close()
+                    events.wake()
+                await asyncio.get_running_loop().run_in_executor(None, notify)
+                await asyncio.sleep(0.2)
+                body = b''.join(m.get('body', b'') for m in messages).decode()
+                assert 'event: notification' in body and 'Order shipped' in body
+
+                closed.set()
+                await asyncio.wait_for(stream, 5)
+                assert application.streams == 0
+
+            events.STREAM_LIFETIME = 10.0
+            asyncio.run(scenario())
+            assert conn.execute('SELECT quantity FROM cart_items WHERE user_id = 12').fetchone()[0] == 2
+            conn.close()
+            print("✅ ASGI mode serves views on thread pools and streams on the loop")
+        finally:
+            application.shutdown()
+            events.STREAM_LIFETIME = lifetime
+
+if __name__ == '__main__':
+    test_asgi()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the farmer earnings report
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import template_rendered
+from modules import database, farmer, replica
+from conftest import temp_database
+
+def test_earnings_report():
+    """SQL summary matches the line items and the detail table is paginated"""
+    from app import app
+
+    with temp_database():
+        page_size = farmer.EARNINGS_PAGE_SIZE
+        # Read the rows just written rather than a snapshot
+        replica_enabled, replica._state['enabled'] = replica._state['enabled'], False
+        try:
+            conn = database.get_db_connection()
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+                VALUES (11, 'farmer', 'farmer@example.com', 'x', 'farmer', 'Farmer', 1),
+                       (12, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice', 1)
+            ''')
+            conn.executemany('''
+                INSERT INTO products (id, farmer_id, name, category, price, unit, quantity, is_approved)
+                VALUES (?, 11, ?, ?, 10, 'kg', 5, 1)
+            ''', [(1, 'Tomato', 'Vegetables'), (2, 'Onion', 'Vegetables'), (3, 'Mango', 'Fruits')])
+
+            # Three paid orders and one unpaid: 7 paid line items in total
+            orders = [('paid', [(1, 2, 20), (3, 1, 50)]),
+                      ('paid', [(1, 1, 10), (2, 3, 30), (3, 2, 100)]),
+                      ('paid', [(2, 1, 10), (2, 1, 10)]),
+                      ('pending', [(1, 5, 50)])]
+            for number, (payment_status, items) in enumerate(orders, 1):
+                order_id = conn.execute('''
+                    INSERT INTO orders (order_number, consumer_id, total_amount, delivery_address, payment_status)
+                    VALUES (?, 12, 0, 'Somewhere', ?)
+                ''', (f'FC{number}', payment_status)).lastrowid
+                conn.executemany('''
+                    INSERT INTO order_items (order_id, product_id, farmer_id, quantity, price, subtotal)
+                    VALUES (?, ?, 11, ?, 10, ?)
+                ''', [(order_id, product_id, quantity, subtotal) for product_id, quantity, subtotal in items])
+            conn.commit()
+            conn.close()
+
+            rendered = []
+            def capture(sender, template, context, **extra):
+                rendered.append(context)
+            template_rendered.connect(capture, app)
+
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = 11
+                session['user_type'] = 'farmer'
+                session['is_approved'] = 1
+
+            farmer.EARNINGS_PAGE_SIZE = 3
+            assert client.get('/farmer/earnings/report/all').status_code == 200
+            context = rendered[-1]
+            assert context['total_earnings'] == 230
+            assert context['total_orders'] == 3
+            assert context['total_items_sold'] == 11
+            assert context['category_stats'] == {
+                'Fruits': {'earnings': 150, 'items_sold': 3, 'orders': 2},
+                'Vegetables': {'earnings': 80, 'items_sold': 8, 'orders': 3},
+            }
+            assert context['pagination']['total_pages'] == 3
+            assert len(context['earnings_data']) == 3
+
+            assert client.get('/farmer/earnings/report/all?page=3').status_code == 200
+            assert len(rendered[-1]['earnings_data']) == 1
+
+            # Period filters apply to the summary and the detail page alike
+            assert client.get('/farmer/earnings/report/today').status_code == 200
+            assert rendered[-1]['total_orders'] == 3 and len(rendered[-1]['earnings_data']) == 3
+
+            # A malformed custom range is refused rather than widened to all time
+            response = client.get('/farmer/earnings/report/custom?start=2024-13-45')
+            assert response.status_code == 302 and response.location.endswith('/farmer/earnings/report/month')
+            with client.session_transaction() as session:
+                assert ('error', 'Invalid date range') in session['_flashes']
+            response = client.get('/farmer/api/earnings/export/csv/custom?end=not-a-date')
+            assert response.status_code == 400 and response.get_json() == {'error': 'Invalid date range'}
+            template_rendered.disconnect(capture, app)
+            print("✅ Earnings report summarised in SQL and paginated")
+        finally:
+            farmer.EARNINGS_PAGE_SIZE = page_size
+            replica._state['enabled'] = replica_enabled
+
+if __name__ == '__main__':
+    test_earnings_report()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the Server-Sent Events channel
+"""
+
+import os
+import sys
+import json
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database, events
+from modules.utils import send_notification
+from conftest import temp_database
+
+def parse(chunks):
+    """(id, event, data) for every message in a list of SSE chunks"""
+    messages = []
+    for chunk in chunks:
+        fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            messages.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return messages
+
+def test_events():
+    """Tracking and notification writes reach every party's events, resuming after Last-Event-ID"""
+    from app import app
+
+    with temp_database():
+        probability = events.PRUNE_PROBABILITY
+        try:
+            conn = database.get_db_connection()
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+                VALUES (12, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice', 1),
+                       (20, 'ravi', 'ravi@example.com', 'x', 'farmer', 'Ravi', 1),
+                       (21, 'meena', 'meena@example.com', 'x', 'farmer', 'Meena', 1)
+            ''')
+            conn.execute('''
+                INSERT INTO products (id, farmer_id, name, category, price, unit, quantity)
+                VALUES (1, 20, 'Tomatoes', 'vegetables', 40, 'kg', 100),
+                       (2, 21, 'Rice', 'grains', 60, 'kg', 100)
+            ''')
+            conn.execute('''
+                INSERT INTO orders (id, order_number, consumer_id, total_amount, delivery_address, status)
+                VALUES (7, 'FC-0007', 12, 100, 'Pune', 'shipped')
+            ''')
+            conn.execute('''
+                INSERT INTO order_items (order_id, product_id, farmer_id, quantity, price, subtotal)
+                VALUES (7, 1, 20, 1, 40, 40), (7, 2, 21, 1, 60, 60)
+            ''')
+            conn.execute("INSERT INTO order_tracking (order_id, status, message) VALUES (7, 'shipped', 'Left the farm')")
+            send_notification(12, 'Order shipped', 'On its way', conn=conn)
+            conn.commit()
+
+            # One tracking row fans out to the consumer and each farmer once
+            channels = [row[0] for row in conn.execute("SELECT channel FROM event_log WHERE event = 'order' ORDER BY channel")]
+            assert channels == ['user:12', 'user:20', 'user:21']
+            messages = parse(events.format_event(*row) for row in events.fetch(conn, 12, 0))
+            assert [message[1] for message in messages] == ['order', 'notification']
+            update = messages[0][2]
+            assert update['order_id'] == 7 and update['order_number'] == 'FC-0007'
+            assert update['status'] == 'shipped' and update['message'] == 'Left the farm'
+            assert messages[1][2]['title'] == 'Order shipped'
+
+            # The endpoint needs a session and answers at once with the events after Last-Event-ID
+            client = app.test_client()
+            assert client.get('/api/events').status_code == 401
+            with client.session_transaction() as session:
+                session['user_id'] = 12
+                session['user_type'] = 'consumer'
+            response = client.get('/api/events', headers={'Last-Event-ID': str(messages[0][0])})
+            assert response.mimetype == 'text/event-stream'
+            assert response.headers['Cache-Control'] == 'no-cache'
+            body = response.data.decode()
+            assert body.startswith(f'retry: {events.POLL_RETRY_MS}')
+            assert [message[1] for message in parse(body.split('\n\n'))] == ['notification']
+
+            # With nothing new, the response still carries the id the next poll resumes from
+            body = client.get('/api/events').data.decode()
+            assert 'event:' not in body and f'id: {messages[1][0]}' in body
+
+            writer = database.get_db_connection()
+            writer.execute("INSERT INTO order_tracking (order_id, status, message) VALUES (7, 'delivered', 'Handed over')")
+            writer.commit()
+            writer.close()
+            with client.session_transaction() as session:
+                session['user_id'] = 20
+                session['user_type'] = 'farmer'
+            response = client.get('/api/events', headers={'Last-Event-ID': '0'})
+            statuses = [message[2]['status'] for message in parse(response.data.decode().split('\n\n'))]
+            assert statuses == ['shipped', 'delivered']
+
+            conn.execute("UPDATE event_log SET created_at = datetime('now', '-2 days') WHERE channel = 'user:21'")
+            conn.commit()
+            assert events.prune(conn) == 2
+
+            # Write requests prune now and then without anyone running prune-events
+            conn.execute("UPDATE event_log SET created_at = datetime('now', '-2 days') WHERE channel = 'user:20'")
+            conn.commit()
+            events.PRUNE_PROBABILITY = 1
+            client.post('/api/events')
+            assert conn.execute("SELECT COUNT(*) FROM event_log WHERE channel = 'user:20'").fetchone()[0] == 0
+            conn.close()
+            print("✅ Server-Sent Events fan out, resume and prune")
+        finally:
+            events.PRUNE_PROBABILITY = probability
+
+if __name__ == '__main__':
+    test_events()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for geocoding, the location index and distance-based delivery charges
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database
+from modules.geo import (geocode, haversine_km, users_within, nearest_users,
+                         cart_delivery_distance, update_user_location)
+from modules.utils import calculate_delivery_charge
+from conftest import temp_database
+
+def test_geocode():
+    """Pincodes, aliases and multi-word names resolve from the gazetteer"""
+    assert geocode('Shivajinagar, Pune 411001') == geocode('Pune')
+    assert geocode('411038') == geocode('Pune')          # unknown pincode, same district
+    assert geocode('Bangalore') == geocode('Bengaluru')
+    assert geocode('Connaught Place, New Delhi') != geocode('Delhi')
+    assert geocode('Atlantis') is None
+
+    # Mumbai to Pune is roughly 120 km as the crow flies
+    assert 110 < haversine_km(*geocode('Mumbai'), *geocode('Pune')) < 130
+    print("✅ Geocoding works")
+
+def test_location_index():
+    """The R*Tree follows user edits and answers radius and nearest-N queries"""
+    with temp_database():
+        conn = database.get_db_connection()
+        farmers = {}
+        for name, location in (('pune', 'Pune'), ('satara', 'Satara'), ('mumbai', 'Mumbai'),
+                               ('chennai', 'Chennai'), ('nowhere', 'Somewhere')):
+            farmers[name] = conn.execute('''
+                INSERT INTO users (username, email, password_hash, user_type, full_name,
+                                   location, is_approved)
+                VALUES (?, ?, 'x', 'farmer', ?, ?, 1)
+            ''', (name, f'{name}@example.com', name, location)).lastrowid
+            update_user_location(conn, farmers[name], location)
+        consumer_id = conn.execute('''
+            INSERT INTO users (username, email, password_hash, user_type, full_name, location, is_approved)
+            VALUES ('consumer', 'consumer@example.com', 'x', 'consumer', 'Consumer', 'Pune', 1)
+        ''').lastrowid
+        update_user_location(conn, consumer_id, 'Pune')
+        conn.commit()
+
+        assert conn.execute('SELECT COUNT(*) FROM user_locations').fetchone()[0] == 5
+
+        pune = geocode('Pune')
+        assert [farmer_id for farmer_id, _ in users_within(conn, *pune, 150)] == \
+            [farmers['pune'], farmers['satara'], farmers['mumbai']]
+        assert [farmer_id for farmer_id, _ in nearest_users(conn, *pune, limit=4)][-1] == farmers['chennai']
+
+        # Moving a farmer moves their index entry
+        update_user_location(conn, farmers['mumbai'], 'Chennai')
+        conn.commit()
+        assert farmers['mumbai'] not in dict(users_within(conn, *pune, 150))
+
+        # Delivery distance uses the farthest farmer in the cart
+        product_id = conn.execute('''
+            INSERT INTO products (farmer_id, name, category, price, unit, quantity, is_approved)
+            VALUES (?, 'Grapes', 'Fruits', 80, 'kg', 10, 1)
+        ''', (farmers['satara'],)).lastrowid
+        conn.execute('INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, 1)',
+                     (consumer_id, product_id))
+        conn.commit()
+        distance = cart_delivery_distance(conn, consumer_id)
+        assert 90 < distance < 110
+        assert cart_delivery_distance(conn, consumer_id, origin=geocode('Satara')) == 0
+        assert calculate_delivery_charge(100, distance) > calculate_delivery_charge(100)
+        conn.close()
+
+        print("✅ Location index works")
+
+def test_near_filter_and_checkout_charge():
+    """/products?near= filters by distance; checkout charges the quoted delivery fee, capped"""
+    from app import app
+
+    with temp_database():
+        conn = database.get_db_connection()
+        users = {}
+        for name, user_type, location in (('pune', 'farmer', 'Pune'), ('satara', 'farmer', 'Satara'),
+                                          ('chennai', 'farmer', 'Chennai'), ('buyer', 'consumer', 'Pune')):
+            users[name] = conn.execute('''
+                INSERT INTO users (username, email, password_hash, user_type, full_name, location, is_approved)
+                VALUES (?, ?, 'x', ?, ?, ?, 1)
+            ''', (name, f'{name}@example.com', user_type, name, location)).lastrowid
+            update_user_location(conn, users[name], location)
+        products = {}
+        for farmer, product in (('pune', 'Onions'), ('satara', 'Grapes'), ('chennai', 'Bananas')):
+            products[product] = conn.execute('''
+                INSERT INTO products (farmer_id, name, category, price, unit, quantity, is_approved)
+                VALUES (?, ?, 'Fruits', 80, 'kg', 10, 1)
+            ''', (users[farmer], product)).lastrowid
+        conn.execute('INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, 1)',
+                     (users['buyer'], products['Grapes']))
+        conn.commit()
+        conn.close()
+
+        client = app.test_client()
+        page = client.get('/products?near=Pune&radius=150&sort_by=distance').get_data(as_text=True)
+        assert 'Onions' in page and 'Grapes' in page and 'Bananas' not in page
+        assert page.index('Onions') < page.index('Grapes')
+
+        # About 100 km from Pune would cost 50 + 90 x 5; the charge stops at max_delivery_charge
+        assert calculate_delivery_charge(80, 100) == 250
+
+        with client.session_transaction() as session:
+            session['user_id'] = users['buyer']
+            session['user_type'] = 'consumer'
+        assert 'value="250.00"' in client.get('/consumer/checkout').get_data(as_text=True)
+
+        # A delivery address that changes the charge re-quotes instead of placing the order
+        form = {'delivery_address': 'Satara', 'delivery_phone': '9999999999', 'delivery_type': 'delivery',
+                'payment_method': 'cod', 'quoted_delivery_charge': '250.00'}
+        page = client.post('/consumer/checkout', data=form).get_data(as_text=True)
+        assert 'Delivery to this address costs ₹50' in page and 'value="50.00"' in page
+
+        conn = database.get_db_connection()
+        assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 0
+        response = client.post('/consumer/checkout', data=dict(form, quoted_delivery_charge='50.00'))
+        assert response.status_code == 302
+        assert conn.execute('SELECT total_amount FROM orders').fetchone()[0] == 130
+        conn.close()
+        print("✅ Near filter and quoted delivery charge work")
+
+if __name__ == '__main__':
+    test_geocode()
+    test_location_index()
+    test_near_filter_and_checkout_charge()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for per-request SQL instrumentation
+"""
+
+import os
+import sys
+import time
+import sqlite3
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import g
+from modules import instrumentation
+from modules.instrumentation import normalize_sql
+from conftest import temp_database
+
+def test_normalize_sql():
+    """Literals and IN lists collapse so repeated statements group together"""
+    assert normalize_sql("SELECT *  FROM users\n WHERE id = 42 AND name = 'O''Brien'") == \
+        'SELECT * FROM users WHERE id = ? AND name = ?'
+    assert normalize_sql('SELECT * FROM products WHERE id IN (?, ?, ?)') == \
+        'SELECT * FROM products WHERE id IN (?, ...)'
+    print("✅ SQL normalization works")
+
+def test_request_stats():
+    """Each request reports its queries in Server-Timing and the debugger"""
+    with temp_database():
+        from app import app
+
+        client = app.test_client()
+        response = client.get('/products')
+        assert response.status_code == 200
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+
+        latest = instrumentation.RECENT_REQUESTS[0]
+        assert latest['endpoint'] == 'products'
+        assert latest['queries'] >= 3
+        assert f'desc="{latest["queries"]} queries"' in response.headers['Server-Timing']
+
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+            session['user_type'] = 'admin'
+        data = client.get('/admin/debug/queries?format=json').get_json()
+        assert data['requests'][0]['endpoint'] == 'products'
+        assert data['statements']
+        print("✅ Request SQL stats recorded")
+
+def test_iteration_timed():
+    """Rows stepped through with a for loop count towards the statement's time"""
+    from app import app
+
+    conn = sqlite3.connect(':memory:', factory=instrumentation.InstrumentedConnection)
+    conn.create_function('slow', 1, lambda value: time.sleep(0.01) or value)
+    conn.execute('CREATE TABLE items (id INTEGER)')
+    conn.executemany('INSERT INTO items VALUES (?)', [(i,) for i in range(10)])
+    with app.test_request_context('/'):
+        assert [row[0] for row in conn.execute('SELECT slow(id) FROM items')] == list(range(10))
+        stats = g.query_stats
+        sql, calls, total_ms = stats.top()[0]
+        assert sql == 'SELECT slow(id) FROM items' and calls == 1
+        assert total_ms >= 90, total_ms
+    conn.close()
+    print("✅ Cursor iteration timed")
+
+if __name__ == '__main__':
+    test_normalize_sql()
+    test_request_stats()
+    test_iteration_timed()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for case-insensitive login lookups
+"""
+
+import os
+import sys
+import sqlite3
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database
+from modules.auth import find_user, user_exists
+from conftest import temp_database
+
+class PlanRecorder:
+    """Wraps a connection and records the query plan of every statement"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.plans = []
+
+    def execute(self, sql, params=()):
+        self.plans.append(' '.join(row[3] for row in self.conn.execute('EXPLAIN QUERY PLAN ' + sql, params)))
+        return self.conn.execute(sql, params)
+
+def test_login_lookup():
+    """Usernames and emails match regardless of case through a single index seek"""
+    with temp_database():
+        conn = database.get_db_connection()
+        conn.execute('''
+            INSERT INTO users (id, username, email, password_hash, user_type, full_name)
+            VALUES (12, 'RaviKumar', 'ravi@example.com', 'x', 'consumer', 'Ravi')
+        ''')
+        conn.commit()
+
+        recorder = PlanRecorder(conn)
+        assert find_user(recorder, 'ravikumar')['id'] == 12
+        assert find_user(recorder, 'RAVI@Example.com', 'id')['id'] == 12
+        assert find_user(recorder, 'nobody') is None
+        for plan in recorder.plans:
+            assert 'SEARCH users USING INDEX idx_users_' in plan and '_nocase' in plan, plan
+            assert 'SCAN' not in plan, plan
+        assert len(recorder.plans) == 3
+
+        assert user_exists(conn, 'RAVIKUMAR', 'new@example.com')
+        assert user_exists(conn, 'someone', 'Ravi@Example.COM')
+        assert not user_exists(conn, 'someone', 'someone@example.com')
+
+        # The unique index also rejects case-only duplicates written directly
+        try:
+            conn.execute('''
+                INSERT INTO users (username, email, password_hash, user_type, full_name)
+                VALUES ('ravikumar', 'other@example.com', 'x', 'consumer', 'Copy')
+            ''')
+            assert False, 'expected IntegrityError'
+        except sqlite3.IntegrityError:
+            pass
+        conn.close()
+        print("✅ Case-insensitive login lookups use one index seek")
+
+if __name__ == '__main__':
+    test_login_lookup()
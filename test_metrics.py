@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics endpoint
+"""
+
+import os
+import sys
+import tempfile
+import multiprocessing
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import metrics
+from conftest import temp_database
+
+def worker(path, requests):
+    """Simulate a gunicorn worker recording requests and flushing them"""
+    metrics._aggregator = metrics.SQLiteAggregator(path)
+    for _ in range(requests):
+        metrics.inc(metrics.REQUESTS, {'blueprint': 'farmer', 'endpoint': 'farmer.dashboard',
+                                       'method': 'GET', 'status': 200})
+        metrics.observe(metrics.REQUEST_LATENCY, 0.02, {'blueprint': 'farmer', 'endpoint': 'farmer.dashboard'})
+    metrics.flush(force=True)
+
+def test_multi_process_aggregation():
+    """Counters from several processes add up in one scrape"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.remove(path)
+    previous = metrics._aggregator
+    try:
+        processes = [multiprocessing.Process(target=worker, args=(path, 5)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        metrics._aggregator = metrics.SQLiteAggregator(path)
+        text = metrics.render()
+        assert ('farmer_connect_http_requests_total{blueprint="farmer",endpoint="farmer.dashboard",'
+                'method="GET",status="200"} 15') in text
+        for bound in ('0.005', '0.01'):
+            assert f'farmer_connect_http_request_duration_seconds_bucket{{blueprint="farmer",endpoint="farmer.dashboard",le="{bound}"}} 0' in text
+        assert 'farmer_connect_http_request_duration_seconds_bucket{blueprint="farmer",endpoint="farmer.dashboard",le="0.025"} 15' in text
+        assert 'farmer_connect_http_request_duration_seconds_bucket{blueprint="farmer",endpoint="farmer.dashboard",le="+Inf"} 15' in text
+        assert '# TYPE farmer_connect_http_request_duration_seconds histogram' in text
+        print("✅ Metrics aggregate across processes")
+    finally:
+        metrics._aggregator = previous
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+def test_metrics_endpoint():
+    """/metrics serves per-endpoint request counters to local clients, admins and token holders"""
+    with temp_database():
+        from app import app
+
+        client = app.test_client()
+        client.get('/about')
+        client.open('/about', method='PROPFIND')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        text = response.get_data(as_text=True)
+        assert 'endpoint="about"' in text
+        assert 'method="other"' in text and 'PROPFIND' not in text
+
+        remote = {'REMOTE_ADDR': '203.0.113.7'}
+        assert client.get('/metrics', environ_base=remote).status_code == 403
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+            session['user_type'] = 'admin'
+        assert client.get('/metrics', environ_base=remote).status_code == 200
+
+        previous = app.config['METRICS_TOKEN']
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        try:
+            client = app.test_client()
+            assert client.get('/metrics').status_code == 403
+            assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+            assert client.get('/metrics', environ_base=remote,
+                              headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+        finally:
+            app.config['METRICS_TOKEN'] = previous
+        print("✅ Metrics endpoint works")
+
+if __name__ == '__main__':
+    test_multi_process_aggregation()
+    test_metrics_endpoint()
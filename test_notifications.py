@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the notification inbox
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database, notifications
+from modules.utils import send_notification, get_user_notifications
+from conftest import temp_database
+
+def counters(conn):
+    rows = conn.execute('SELECT user_id, unread FROM notification_counts WHERE unread ORDER BY user_id')
+    return [tuple(row) for row in rows]
+
+def test_inbox():
+    """Counters follow every write, polling returns only new rows and archival keeps them consistent"""
+    from app import app
+
+    with temp_database():
+        conn = database.get_db_connection()
+        conn.execute('''
+            INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+            VALUES (12, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice', 1),
+                   (13, 'bob', 'bob@example.com', 'x', 'consumer', 'Bob', 1)
+        ''')
+        for number in range(1, 8):
+            send_notification(12, f'Update {number}', 'Your order moved', conn=conn)
+        send_notification(13, 'Hello', 'Welcome', conn=conn)
+        conn.commit()
+        assert notifications.unread_count(conn, 12) == 7
+        assert [row['title'] for row in get_user_notifications(12, limit=2)] == ['Update 7', 'Update 6']
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 12
+            session['user_type'] = 'consumer'
+
+        # Incremental polling returns only rows after since_id, oldest first
+        data = client.get('/api/notifications?since_id=0&limit=3').get_json()
+        assert [item['title'] for item in data['notifications']] == ['Update 1', 'Update 2', 'Update 3']
+        assert data['unread'] == 7
+        data = client.get(f"/api/notifications?since_id={data['last_id']}").get_json()
+        assert [item['title'] for item in data['notifications']] == [f'Update {n}' for n in range(4, 8)]
+        last_id = data['last_id']
+        assert client.get(f'/api/notifications?since_id={last_id}').get_json()['notifications'] == []
+
+        # Marking a range only touches that range, and only this user's rows
+        first_id = last_id - 6
+        data = client.post('/api/notifications/read', json={'from_id': first_id, 'upto_id': first_id + 2}).get_json()
+        assert data['marked'] == 3 and data['unread'] == 4
+        assert client.post('/api/notifications/read', json={'upto_id': 10 ** 6}).get_json()['unread'] == 0
+        assert notifications.unread_count(conn, 13) == 1
+
+        # The inbox page marks only what it shows
+        send_notification(12, 'Shipped', 'On its way', conn=conn)
+        conn.commit()
+        response = client.get('/consumer/notifications')
+        assert response.status_code == 200 and b'Shipped' in response.data
+        assert notifications.unread_count(conn, 12) == 0
+
+        # Counters always agree with a full recount
+        conn.execute("UPDATE notifications SET is_read = 0 WHERE title IN ('Update 2', 'Hello')")
+        conn.execute("UPDATE notifications SET user_id = 13 WHERE title = 'Update 5'")
+        conn.execute("DELETE FROM notifications WHERE title = 'Update 2'")
+        conn.commit()
+        maintained = counters(conn)
+        assert maintained == [(13, 1)]
+        database.rebuild_notification_counts(conn)
+        assert counters(conn) == maintained
+
+        # Archival moves read rows past retention and anything past the maximum age
+        conn.execute("UPDATE notifications SET created_at = datetime('now', '-40 days') WHERE title LIKE 'Update%'")
+        conn.execute("UPDATE notifications SET created_at = datetime('now', '-200 days') WHERE title = 'Hello'")
+        conn.commit()
+        assert notifications.archive(conn, batch=2) == 7
+        remaining = [row['title'] for row in conn.execute('SELECT title FROM notifications ORDER BY id')]
+        assert remaining == ['Shipped']
+        assert conn.execute('SELECT COUNT(*) FROM notifications_archive').fetchone()[0] == 7
+        assert counters(conn) == []
+
+        # A maximum age shorter than the read retention still applies to unread rows
+        send_notification(12, 'Stale', 'Never opened', conn=conn)
+        conn.execute("UPDATE notifications SET created_at = datetime('now', '-15 days') WHERE title = 'Stale'")
+        conn.commit()
+        assert notifications.archive(conn, read_days=30, max_days=10) == 1
+        assert [row['title'] for row in conn.execute('SELECT title FROM notifications')] == ['Shipped']
+        conn.close()
+        print("✅ Notification inbox counters, polling and archival")
+
+if __name__ == '__main__':
+    test_inbox()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for pooled password hashing
+"""
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from modules import database, passwords
+from conftest import temp_database
+
+CHEAP = 'pbkdf2:sha256:1000'
+
+def test_pool_and_queue_limit():
+    """Hashes round-trip through the pool, and a full queue fails fast"""
+    previous = passwords.settings()
+    try:
+        passwords.configure(method=CHEAP, workers=1, queue=0)
+        password_hash = passwords.hash_password('secret1')
+        assert password_hash.startswith(CHEAP + '$')
+        assert passwords.verify_password(password_hash, 'secret1')
+        assert not passwords.verify_password(password_hash, 'wrong')
+
+        # With one worker and no queue, a caller is turned away while a hash is in flight
+        passwords._slots.acquire()
+        try:
+            passwords.hash_password('secret2')
+            assert False, 'expected HashingBusy'
+        except passwords.HashingBusy:
+            pass
+        finally:
+            passwords._slots.release()
+        assert passwords.verify_password(password_hash, 'secret1')
+        assert passwords.settings()['pending'] == 0
+        print("✅ Pool hashes and rejects when full")
+    finally:
+        passwords.configure(method=previous['method'], workers=previous['workers'],
+                            queue=previous['queue'], start_method=previous['start_method'])
+
+def test_timeout_and_broken_pool():
+    """Slow hashes and dead workers turn into HashingBusy; the slot is held until the hash ends"""
+    previous = passwords.settings()
+    timeout = passwords.HASH_TIMEOUT
+    try:
+        passwords.configure(method=CHEAP, workers=1, queue=0)
+        passwords.HASH_TIMEOUT = 0.2
+        try:
+            passwords._run(time.sleep, 1.5)
+            assert False, 'expected HashingBusy on timeout'
+        except passwords.HashingBusy:
+            pass
+        # The timed-out hash still occupies the only worker, so the next caller is turned away
+        assert passwords.settings()['pending'] == 1
+        try:
+            passwords.hash_password('secret1')
+            assert False, 'expected HashingBusy while the slot is held'
+        except passwords.HashingBusy:
+            pass
+        deadline = time.time() + 10
+        while passwords.settings()['pending'] and time.time() < deadline:
+            time.sleep(0.05)
+        assert passwords.settings()['pending'] == 0
+
+        passwords.HASH_TIMEOUT = timeout
+        try:
+            passwords._run(os._exit, 1)
+            assert False, 'expected HashingBusy when the worker dies'
+        except passwords.HashingBusy:
+            pass
+        assert passwords.verify_password(passwords.hash_password('secret1'), 'secret1')
+        assert passwords.settings()['pending'] == 0
+        print("✅ Timeouts and broken pools answer busy and recover")
+    finally:
+        passwords.HASH_TIMEOUT = timeout
+        passwords.configure(method=previous['method'], workers=previous['workers'],
+                            queue=previous['queue'], start_method=previous['start_method'])
+
+def test_rehash_on_login():
+    """Logging in with a hash made under old parameters upgrades it"""
+    from app import app
+
+    with temp_database():
+        previous = passwords.settings()
+        try:
+            passwords.configure(method=CHEAP, workers=0)
+            conn = database.get_db_connection()
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+                VALUES (12, 'alice', 'alice@example.com', ?, 'consumer', 'Alice', 1)
+            ''', (generate_password_hash('secret1', 'pbkdf2:sha256:500'),))
+            conn.commit()
+            conn.close()
+
+            client = app.test_client()
+            response = client.post('/auth/login', data={'username_or_email': 'alice', 'password': 'secret1'})
+            assert response.status_code == 302
+
+            conn = database.get_db_connection()
+            stored = conn.execute('SELECT password_hash FROM users WHERE id = 12').fetchone()[0]
+            conn.close()
+            assert stored.startswith(CHEAP + '$') and not passwords.needs_rehash(stored)
+            assert passwords.verify_password(stored, 'secret1')
+
+            response = client.post('/auth/login', data={'username_or_email': 'alice', 'password': 'nope'})
+            assert response.status_code == 200
+            print("✅ Outdated hashes upgraded on login")
+        finally:
+            passwords.configure(method=previous['method'], workers=previous['workers'],
+                                queue=previous['queue'], start_method=previous['start_method'])
+
+if __name__ == '__main__':
+    test_pool_and_queue_limit()
+    test_timeout_and_broken_pool()
+    test_rehash_on_login()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for the sampling profiler
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import profiler
+from conftest import temp_database
+
+def test_classify():
+    """Samples split into DB, template and Python buckets"""
+    sqlite_frame = (os.path.join('lib', 'sqlite3', 'dbapi2.py'), 'execute')
+    jinja_frame = (os.path.join('site-packages', 'jinja2', 'environment.py'), 'render')
+    view_frame = ('app.py', 'products')
+    assert profiler.classify([view_frame, jinja_frame, sqlite_frame]) == 'db'
+    assert profiler.classify([view_frame, jinja_frame]) == 'template'
+    assert profiler.classify([view_frame]) == 'python'
+
+    # Only the cursor and connection methods in instrumentation.py are SQL time
+    cursor_frame = (os.path.join('modules', 'instrumentation.py'), '_timed')
+    hook_frame = (os.path.join('modules', 'instrumentation.py'), 'add_server_timing')
+    assert profiler.classify([view_frame, cursor_frame]) == 'db'
+    assert profiler.classify([view_frame, hook_frame]) == 'python'
+
+    stack, bucket = profiler.capture(sys._getframe())
+    assert stack.endswith('test_profiler.py:test_classify')
+    assert bucket == 'python'
+    print("✅ Stack classification works")
+
+def test_profile_requests():
+    """Sampled requests are aggregated per endpoint and downloadable as collapsed stacks"""
+    with temp_database():
+        from app import app
+
+        previous = profiler.settings()
+        profiler.reset()
+        profiler.configure(enabled=True, rate=0, rates={'products': 1}, interval_ms=1)
+        try:
+            client = app.test_client()
+            for _ in range(5):
+                assert client.get('/products').status_code == 200
+            assert client.get('/').status_code == 200
+
+            summaries = dict(profiler.profiles())
+            assert summaries['products']['requests'] == 5
+            assert 'index' not in summaries
+
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+                session['user_type'] = 'admin'
+            response = client.get('/admin/debug/profile/download?view=products')
+            assert response.mimetype == 'text/plain'
+            for line in response.get_data(as_text=True).splitlines():
+                stack, count = line.rsplit(' ', 1)
+                assert int(count) > 0 and ';' in stack
+            assert client.get('/admin/debug/profile').status_code == 200
+        finally:
+            profiler.configure(enabled=previous['enabled'], rate=previous['rate'],
+                               rates=previous['rates'], interval_ms=previous['interval_ms'])
+            profiler.reset()
+        print("✅ Sampled requests profiled")
+
+if __name__ == '__main__':
+    test_classify()
+    test_profile_requests()
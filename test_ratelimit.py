@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for login rate limiting
+"""
+
+import os
+import sys
+import time
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database, ratelimit
+from conftest import remove_database, temp_database
+
+def test_stores():
+    """Both stores allow a burst of `capacity`, then refill at the configured rate"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        for store in (ratelimit.MemoryStore(), ratelimit.SQLiteStore(path)):
+            capacity, refill = ratelimit.parse_rate('3/60')
+            assert [store.take('k', capacity, refill) for _ in range(3)] == [0, 0, 0]
+            wait = store.take('k', capacity, refill)
+            assert 19 < wait <= 20, wait
+            assert store.take('other', capacity, refill) == 0
+
+            # A fast refill lets the next attempt through shortly afterwards
+            assert store.take('fast', 1, 100) == 0
+            assert store.take('fast', 1, 100) > 0
+            time.sleep(0.02)
+            assert store.take('fast', 1, 100) == 0
+
+            store.reset('k')
+            assert store.take('k', capacity, refill) == 0
+        print("✅ Memory and SQLite token buckets")
+    finally:
+        remove_database(path)
+
+def test_memory_key_cap():
+    """The memory store never holds more than MAX_KEYS buckets and evicts the least recently used"""
+    previous = ratelimit.MAX_KEYS
+    ratelimit.MAX_KEYS = 3
+    try:
+        store = ratelimit.MemoryStore()
+        ip_capacity, ip_refill = ratelimit.parse_rate('20/60')
+        user_capacity, user_refill = ratelimit.parse_rate('2/300')
+        store.take('ip', ip_capacity, ip_refill)
+        for name in ('a', 'b'):
+            store.take(name, user_capacity, user_refill)
+        store.take('ip', ip_capacity, ip_refill)
+
+        # Credential stuffing: every new username is a new drained-ish key
+        for name in ('c', 'd', 'e', 'f'):
+            store.take(name, user_capacity, user_refill)
+            assert len(store.buckets) <= 3
+        assert list(store.buckets) == ['d', 'e', 'f']
+
+        # The IP bucket keeps its own capacity: a user-scope refill never makes it look full
+        store = ratelimit.MemoryStore()
+        store.take('a', 1, 1000)
+        store.take('ip', ip_capacity, ip_refill)
+        time.sleep(0.01)
+        store.take('b', 1, 1000)
+        assert list(store.buckets) == ['ip', 'b']
+        print("✅ Memory store stays within MAX_KEYS")
+    finally:
+        ratelimit.MAX_KEYS = previous
+
+def test_sqlite_prune():
+    """The SQLite store drops buckets idle for a day as a side effect of take()"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    previous = ratelimit.PRUNE_PROBABILITY
+    ratelimit.PRUNE_PROBABILITY = 0
+    try:
+        store = ratelimit.SQLiteStore(path)
+        store.take('stale', 5, 1)
+        store._connect().execute("UPDATE rate_limits SET updated = updated - 2 * 86400 WHERE key = 'stale'")
+        store.take('fresh', 5, 1)
+        assert store._connect().execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0] == 2
+
+        ratelimit.PRUNE_PROBABILITY = 1
+        store.take('other', 5, 1)
+        keys = [row[0] for row in store._connect().execute('SELECT key FROM rate_limits ORDER BY key')]
+        assert keys == ['fresh', 'other']
+        print("✅ SQLite store prunes idle buckets")
+    finally:
+        ratelimit.PRUNE_PROBABILITY = previous
+        remove_database(path)
+
+def test_login_throttled():
+    """Attempts beyond the per-user limit get 429 without touching the database"""
+    from app import app
+
+    with temp_database() as path:
+        try:
+            ratelimit.configure(ip_rate='100/60', user_rate='2/60')
+            client = app.test_client()
+            form = {'username_or_email': 'Nobody@example.com', 'password': 'guess'}
+            assert client.post('/auth/login', data=form).status_code == 200
+            assert client.post('/auth/login', data=form).status_code == 200
+
+            # Removing the database shows the rejected attempt never queries it
+            database.DATABASE = os.path.join(path + '.missing', 'none.db')
+            response = client.post('/auth/login', data=dict(form, username_or_email='nobody@example.com'))
+            assert response.status_code == 429
+            assert int(response.headers['Retry-After']) > 0
+
+            # Other accounts are unaffected until the IP limit is reached
+            database.DATABASE = path
+            assert client.post('/auth/login', data=dict(form, username_or_email='someone')).status_code == 200
+            print("✅ Login attempts throttled per account")
+        finally:
+            ratelimit.configure(ip_rate=app.config['LOGIN_RATE_IP'], user_rate=app.config['LOGIN_RATE_USER'])
+
+if __name__ == '__main__':
+    test_stores()
+    test_memory_key_cap()
+    test_sqlite_prune()
+    test_login_throttled()
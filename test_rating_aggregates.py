@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the denormalized rating aggregates on products and users
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database
+from modules.utils import get_product_ratings, get_farmer_ratings, get_product_rating
+from conftest import temp_database
+
+def seed(conn):
+    """Create a farmer, a consumer, a product and an order to review"""
+    farmer_id = conn.execute('''
+        INSERT INTO users (username, email, password_hash, user_type, full_name)
+        VALUES ('farmer', 'farmer@example.com', 'x', 'farmer', 'Farmer')
+    ''').lastrowid
+    consumer_id = conn.execute('''
+        INSERT INTO users (username, email, password_hash, user_type, full_name)
+        VALUES ('consumer', 'consumer@example.com', 'x', 'consumer', 'Consumer')
+    ''').lastrowid
+    product_id = conn.execute('''
+        INSERT INTO products (farmer_id, name, category, price, unit, quantity)
+        VALUES (?, 'Tomato', 'Vegetables', 40, 'kg', 10)
+    ''', (farmer_id,)).lastrowid
+    order_id = conn.execute('''
+        INSERT INTO orders (order_number, consumer_id, total_amount, delivery_address)
+        VALUES ('FC1', ?, 40, 'Somewhere')
+    ''', (consumer_id,)).lastrowid
+    return farmer_id, consumer_id, product_id, order_id
+
+def test_rating_aggregates():
+    """Triggers keep rating_sum/rating_count in step with reviews"""
+    with temp_database():
+        conn = database.get_db_connection()
+        farmer_id, consumer_id, product_id, order_id = seed(conn)
+
+        conn.execute('''
+            INSERT INTO reviews (product_id, consumer_id, rating) VALUES (?, ?, 4)
+        ''', (product_id, consumer_id))
+        review_id = conn.execute('''
+            INSERT INTO reviews (product_id, consumer_id, order_id, rating) VALUES (?, ?, ?, 5)
+        ''', (product_id, consumer_id, order_id)).lastrowid
+        conn.execute('''
+            INSERT INTO farmer_ratings (farmer_id, consumer_id, order_id, rating) VALUES (?, ?, ?, 3)
+        ''', (farmer_id, consumer_id, order_id))
+        conn.commit()
+
+        assert get_product_rating(product_id) == (4.5, 2)
+        assert get_farmer_ratings([farmer_id, 999]) == {farmer_id: (3.0, 1)}
+
+        # Hiding a review removes it from the aggregate
+        conn.execute('UPDATE reviews SET is_approved = 0 WHERE id = ?', (review_id,))
+        conn.commit()
+        assert get_product_ratings([product_id]) == {product_id: (4.0, 1)}
+
+        # A rebuild from the source tables agrees with the triggers
+        database.rebuild_rating_aggregates(conn)
+        conn.commit()
+        assert get_product_ratings([product_id]) == {product_id: (4.0, 1)}
+        conn.close()
+
+        print("✅ Rating aggregates stay consistent")
+
+def test_product_page_reviews():
+    """The product page shows the rating summary from the aggregates and the approved reviews"""
+    from app import app
+
+    with temp_database():
+        conn = database.get_db_connection()
+        farmer_id, consumer_id, product_id, order_id = seed(conn)
+        conn.execute('UPDATE products SET is_approved = 1 WHERE id = ?', (product_id,))
+        conn.commit()
+        client = app.test_client()
+        assert b'No Reviews Yet' in client.get(f'/product/{product_id}').data
+
+        conn.execute('''
+            INSERT INTO reviews (product_id, consumer_id, rating, comment) VALUES (?, ?, 4, 'Juicy and ripe')
+        ''', (product_id, consumer_id))
+        conn.execute('''
+            INSERT INTO reviews (product_id, consumer_id, order_id, rating, comment, is_approved)
+            VALUES (?, ?, ?, 1, 'Hidden review', 0)
+        ''', (product_id, consumer_id, order_id))
+        conn.commit()
+        conn.close()
+
+        page = client.get(f'/product/{product_id}').get_data(as_text=True)
+        assert '4.0/5' in page and 'Based on 1 review<' in page
+        assert 'Juicy and ripe' in page and 'Hidden review' not in page
+        print("✅ Product page shows ratings and reviews")
+
+if __name__ == '__main__':
+    test_rating_aggregates()
+    test_product_page_reviews()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the co-purchase recommendation model
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database
+from modules.recommendations import refresh_recommendations, refresh_related_products, get_recommended_products
+from conftest import temp_database
+
+def place_order(conn, consumer_id, product_ids, status='pending'):
+    """Insert an order containing the given products"""
+    order_id = conn.execute('''
+        INSERT INTO orders (order_number, consumer_id, total_amount, delivery_address, status)
+        VALUES ('FC' || (SELECT COUNT(*) + 1 FROM orders), ?, 0, 'Somewhere', ?)
+    ''', (consumer_id, status)).lastrowid
+    conn.executemany('''
+        INSERT INTO order_items (order_id, product_id, farmer_id, quantity, price, subtotal)
+        VALUES (?, ?, 11, 1, 10, 10)
+    ''', [(order_id, product_id) for product_id in product_ids])
+    conn.commit()
+    return order_id
+
+def neighbors(conn, product_id):
+    """Stored neighbor scores for one product"""
+    return {row['neighbor_id']: row['score'] for row in conn.execute(
+        'SELECT neighbor_id, score FROM product_neighbors WHERE product_id = ?', (product_id,))}
+
+def test_recommendations():
+    """Incremental refreshes match a full rebuild and drive dashboard and product pages"""
+    with temp_database():
+        conn = database.get_db_connection()
+        conn.execute('''
+            INSERT INTO users (id, username, email, password_hash, user_type, full_name)
+            VALUES (11, 'farmer', 'farmer@example.com', 'x', 'farmer', 'Farmer'),
+                   (12, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice'),
+                   (13, 'bob', 'bob@example.com', 'x', 'consumer', 'Bob')
+        ''')
+        conn.executemany('''
+            INSERT INTO products (id, farmer_id, name, category, price, unit, quantity, is_approved)
+            VALUES (?, 11, ?, 'Vegetables', 10, 'kg', 5, 1)
+        ''', [(i, f'Product {i}') for i in range(1, 6)])
+        conn.commit()
+
+        place_order(conn, 13, [1, 2])
+        place_order(conn, 13, [1, 3])
+        assert refresh_recommendations() == 2
+
+        # Second batch only touches new orders; cancelled ones are ignored
+        place_order(conn, 13, [1, 2, 4])
+        place_order(conn, 13, [4, 5], status='cancelled')
+        assert refresh_recommendations() == 1
+        assert refresh_recommendations() == 0
+
+        incremental = {pid: neighbors(conn, pid) for pid in range(1, 6)}
+        refresh_recommendations(full=True)
+        assert incremental == {pid: neighbors(conn, pid) for pid in range(1, 6)}
+
+        # Product 1: 3 orders, product 2: 2 orders, bought together twice
+        assert abs(incremental[1][2] - 2 / (3 * 2) ** 0.5) < 1e-6
+        assert 5 not in incremental[4]
+
+        # Alice bought product 1, so 2 should rank above 3 and 4; 1 itself is excluded
+        place_order(conn, 12, [1])
+        refresh_recommendations()
+        picks = [row['id'] for row in get_recommended_products(conn, 12)]
+        assert picks[0] == 2 and 1 not in picks
+
+        print("✅ Recommendations refresh incrementally")
+
+        # Related products: co-purchase outranks shared words, which outrank category alone
+        conn.execute("UPDATE products SET name = 'Alphonso Mango' WHERE id IN (3, 5)")
+        conn.commit()
+        assert refresh_related_products() == 5
+        related = [row['related_id'] for row in conn.execute(
+            'SELECT related_id FROM product_related WHERE product_id = 1 ORDER BY rank')]
+        assert related[0] == 2 and set(related) == {2, 3, 4, 5}
+        related = [row['related_id'] for row in conn.execute(
+            'SELECT related_id FROM product_related WHERE product_id = 5 ORDER BY rank')]
+        assert related[0] == 3
+        conn.close()
+
+        print("✅ Related products index built")
+
+def test_order_committed_during_refresh():
+    """An order committed while the baskets are being read is picked up by the next run"""
+    from modules import recommendations
+
+    with temp_database():
+        connect = recommendations.get_db_connection
+        try:
+            conn = database.get_db_connection()
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name)
+                VALUES (11, 'farmer', 'farmer@example.com', 'x', 'farmer', 'Farmer'),
+                       (13, 'bob', 'bob@example.com', 'x', 'consumer', 'Bob')
+            ''')
+            conn.executemany('''
+                INSERT INTO products (id, farmer_id, name, category, price, unit, quantity, is_approved)
+                VALUES (?, 11, ?, 'Vegetables', 10, 'kg', 5, 1)
+            ''', [(i, f'Product {i}') for i in range(1, 4)])
+            conn.commit()
+            place_order(conn, 13, [1, 2])
+
+            class Racing:
+                """The job's connection; a checkout commits right after the baskets query"""
+                def __init__(self, inner):
+                    self.inner = inner
+
+                def execute(self, sql, *args):
+                    cursor = self.inner.execute(sql, *args)
+                    if 'FROM order_items oi' in sql:
+                        other = connect()
+                        place_order(other, 13, [2, 3])
+                        other.close()
+                    return cursor
+
+                def __getattr__(self, name):
+                    return getattr(self.inner, name)
+
+            recommendations.get_db_connection = lambda: Racing(connect())
+            assert refresh_recommendations() == 1
+            recommendations.get_db_connection = connect
+
+            assert recommendations.recommendation_backlog() == 1
+            assert refresh_recommendations() == 1
+            assert 3 in neighbors(conn, 2)
+            conn.close()
+            print("✅ Orders committed mid-refresh are not skipped")
+        finally:
+            recommendations.get_db_connection = connect
+
+def test_cancelled_after_refresh():
+    """Cancelling a folded order takes its pairs back out; reinstating it adds them again"""
+    with temp_database():
+        conn = database.get_db_connection()
+        conn.execute('''
+            INSERT INTO users (id, username, email, password_hash, user_type, full_name)
+            VALUES (11, 'farmer', 'farmer@example.com', 'x', 'farmer', 'Farmer'),
+                   (13, 'bob', 'bob@example.com', 'x', 'consumer', 'Bob')
+        ''')
+        conn.executemany('''
+            INSERT INTO products (id, farmer_id, name, category, price, unit, quantity, is_approved)
+            VALUES (?, 11, ?, 'Vegetables', 10, 'kg', 5, 1)
+        ''', [(i, f'Product {i}') for i in range(1, 4)])
+        conn.commit()
+        place_order(conn, 13, [1, 2])
+        cancelled = place_order(conn, 13, [2, 3])
+        assert refresh_recommendations() == 2
+        assert 3 in neighbors(conn, 2)
+
+        conn.execute("UPDATE orders SET status = 'cancelled' WHERE id = ?", (cancelled,))
+        conn.commit()
+        assert refresh_recommendations() == 0
+        assert neighbors(conn, 2) == {1: 1.0} and neighbors(conn, 3) == {}
+        assert conn.execute('SELECT COUNT(*) FROM copurchase_counts WHERE product_id = 3').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM copurchase_changes').fetchone()[0] == 0
+
+        # Reinstated: the pairs come back and match a full rebuild
+        conn.execute("UPDATE orders SET status = 'confirmed' WHERE id = ?", (cancelled,))
+        conn.commit()
+        refresh_recommendations()
+        incremental = {pid: neighbors(conn, pid) for pid in range(1, 4)}
+        refresh_recommendations(full=True)
+        assert incremental == {pid: neighbors(conn, pid) for pid in range(1, 4)}
+        assert 3 in incremental[2]
+
+        watermark = conn.execute('SELECT order_watermark FROM recommendation_state').fetchone()[0]
+        assert watermark == cancelled
+        assert not conn.execute(
+            "SELECT 1 FROM site_settings WHERE key = 'recommendations_order_watermark'").fetchone()
+        conn.close()
+        print("✅ Cancelled orders leave the co-purchase model")
+
+if __name__ == '__main__':
+    test_recommendations()
+    test_order_committed_during_refresh()
+    test_cancelled_after_refresh()
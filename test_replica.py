@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for report reads from the database snapshot
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database, replica
+from conftest import temp_database
+
+def wait_for_refresh():
+    with replica._refreshing:
+        pass
+
+def source_file(conn):
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+def order_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+
+def add_order(conn, number):
+    conn.execute('''
+        INSERT INTO orders (order_number, consumer_id, total_amount, delivery_address, payment_status)
+        VALUES (?, 12, 100, 'Pune', 'paid')
+    ''', (number,))
+    conn.commit()
+
+def test_replica():
+    """Reports read a bounded-staleness snapshot and fall back to the live file when it is too old"""
+    from app import app
+
+    with temp_database() as path:
+        try:
+            conn = database.get_db_connection()
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+                VALUES (12, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice', 1)
+            ''')
+            add_order(conn, 'FC-1')
+
+            # No snapshot yet: read the live file and build one in the background
+            assert replica.age() is None
+            reader = replica.get_read_connection()
+            assert source_file(reader) == os.path.abspath(path)
+            reader.close()
+            wait_for_refresh()
+            assert replica.age() < 5
+
+            # Within the bound the snapshot is served, even though it lags the live file
+            add_order(conn, 'FC-2')
+            reader = replica.get_read_connection()
+            assert source_file(reader) == os.path.abspath(replica.replica_path())
+            assert order_count(reader) == 1 and order_count(conn) == 2
+            try:
+                reader.execute('DELETE FROM orders')
+                assert False, 'expected a read-only snapshot'
+            except sqlite3.OperationalError:
+                pass
+
+            # A long read on the snapshot does not block writers on the live file
+            cursor = reader.execute('SELECT id FROM orders')
+            cursor.fetchone()
+            writer = sqlite3.connect(path, timeout=0)
+            writer.execute("UPDATE orders SET status = 'confirmed' WHERE order_number = 'FC-2'")
+            writer.commit()
+            writer.close()
+            reader.close()
+
+            # Past the bound, reads go to the live file until the refresh lands
+            old = time.time() - replica.MAX_STALENESS - 10
+            os.utime(replica.replica_path(), (old, old))
+            reader = replica.get_read_connection()
+            assert source_file(reader) == os.path.abspath(path) and order_count(reader) == 2
+            reader.close()
+            wait_for_refresh()
+            reader = replica.get_read_connection()
+            assert source_file(reader) == os.path.abspath(replica.replica_path()) and order_count(reader) == 2
+            reader.close()
+
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+                session['user_type'] = 'admin'
+            response = client.get('/admin/api/reports/export/orders/csv')
+            assert response.status_code == 200 and b'FC-2' in response.data
+            conn.close()
+            print("✅ Reports read a bounded-staleness snapshot")
+        finally:
+            wait_for_refresh()
+
+def test_refresh_under_writes():
+    """A refresh finishes while another connection keeps committing"""
+    with temp_database() as path:
+        stop = threading.Event()
+        commits = []
+
+        def write():
+            writer = sqlite3.connect(path, timeout=5)
+            while not stop.is_set():
+                writer.execute("INSERT INTO search_history (query, results_count) VALUES ('tomato', 3)")
+                writer.commit()
+                commits.append(1)
+                time.sleep(0.002)
+            writer.close()
+
+        try:
+            conn = database.get_db_connection()
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            conn.executemany("INSERT INTO search_history (query, results_count) VALUES (?, 1)",
+                             [(f'query {i} ' + 'x' * 200,) for i in range(20000)])
+            conn.commit()
+            conn.close()
+
+            thread = threading.Thread(target=write)
+            thread.start()
+            while not commits:
+                time.sleep(0.001)
+            seconds = replica.refresh()
+            stop.set()
+            thread.join()
+            assert seconds < 10
+
+            snapshot = sqlite3.connect(f"file:{replica.replica_path()}?mode=ro", uri=True)
+            assert snapshot.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+            assert snapshot.execute('SELECT COUNT(*) FROM search_history').fetchone()[0] >= 20000
+            snapshot.close()
+            print(f"✅ Snapshot refresh finished in {seconds * 1000:.0f} ms under {len(commits)} concurrent commits")
+        finally:
+            stop.set()
+
+if __name__ == '__main__':
+    test_replica()
+    test_refresh_under_writes()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the chart rollups
+"""
+
+import os
+import sys
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database, rollups
+from conftest import temp_database
+
+def snapshot(conn):
+    return conn.execute('''
+        SELECT metric, grain, key, bucket, ROUND(value, 2) FROM rollups
+        WHERE ROUND(value, 2) != 0 ORDER BY 1, 2, 3, 4
+    ''').fetchall()
+
+def test_rollups():
+    """Triggers keep the rollups equal to a full rebuild, and series fill the gaps"""
+    with temp_database():
+        conn = database.get_db_connection(row_factory=None)
+        conn.execute('''
+            INSERT INTO users (id, username, email, password_hash, user_type, full_name, created_at)
+            VALUES (11, 'farm1', 'f1@example.com', 'x', 'farmer', 'Farmer One', '2024-01-05 10:00:00'),
+                   (12, 'farm2', 'f2@example.com', 'x', 'farmer', 'Farmer Two', '2024-03-20 10:00:00'),
+                   (13, 'alice', 'alice@example.com', 'x', 'consumer', 'Alice', '2024-03-21 09:00:00')
+        ''')
+        conn.execute('''
+            INSERT INTO products (id, farmer_id, name, category, price, unit, quantity)
+            VALUES (1, 11, 'Tomato', 'Vegetables', 10, 'kg', 50), (2, 12, 'Mango', 'Fruits', 20, 'kg', 50)
+        ''')
+        # Items are added after the orders, as at checkout
+        for order_id, status, created_at in [(1, 'paid', '2024-01-10 08:00:00'),
+                                             (2, 'pending', '2024-03-01 08:00:00'),
+                                             (3, 'paid', '2024-03-31 23:59:59')]:
+            conn.execute('''
+                INSERT INTO orders (id, order_number, consumer_id, total_amount, delivery_address,
+                                    payment_status, created_at)
+                VALUES (?, ?, 13, 70, 'Somewhere', ?, ?)
+            ''', (order_id, f'FC{order_id}', status, created_at))
+            conn.executemany('''
+                INSERT INTO order_items (order_id, product_id, farmer_id, quantity, price, subtotal)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(order_id, 1, 11, 3, 10, 30), (order_id, 2, 12, 2, 20, 40)])
+        conn.commit()
+
+        end = datetime(2024, 4, 15)
+        earnings = rollups.series(conn, 'farmer_earnings', count=4, key=11, end=end)
+        assert earnings['bucket'] == ['2024-01', '2024-02', '2024-03', '2024-04']
+        assert earnings['label'] == ['01/2024', '02/2024', '03/2024', '04/2024']
+        assert earnings['farmer_earnings'] == [30, 0, 30, 0]
+
+        users = rollups.series(conn, ['farmer_registrations', 'consumer_registrations'], count=4, end=end)
+        assert users['farmer_registrations'] == [1, 0, 1, 0]
+        assert users['consumer_registrations'] == [0, 0, 1, 0]
+
+        daily = rollups.series(conn, ['orders', 'revenue'], grain='day', count=3, end=datetime(2024, 4, 1))
+        assert daily['bucket'] == ['2024-03-30', '2024-03-31', '2024-04-01']
+        assert daily['orders'] == [0, 1, 0] and daily['revenue'] == [0, 70, 0]
+
+        # Payments, edits and deletions adjust the buckets incrementally
+        conn.execute("UPDATE orders SET payment_status = 'paid' WHERE id = 2")
+        conn.execute("UPDATE orders SET payment_status = 'refunded' WHERE id = 1")
+        conn.execute("UPDATE order_items SET subtotal = 45 WHERE order_id = 3 AND farmer_id = 11")
+        conn.execute("DELETE FROM order_items WHERE order_id = 2 AND farmer_id = 12")
+        conn.execute("UPDATE users SET created_at = '2024-02-01 00:00:00' WHERE id = 12")
+        conn.execute("DELETE FROM users WHERE id = 13")
+        conn.commit()
+
+        earnings = rollups.series(conn, 'farmer_earnings', count=4, key=11, end=end)
+        assert earnings['farmer_earnings'] == [0, 0, 75, 0]
+        users = rollups.series(conn, ['farmer_registrations', 'consumer_registrations'], count=4, end=end)
+        assert users['farmer_registrations'] == [1, 1, 0, 0]
+        assert users['consumer_registrations'] == [0, 0, 0, 0]
+
+        incremental = snapshot(conn)
+        database.rebuild_rollups(conn)
+        assert snapshot(conn) == incremental
+
+        # Each chart series is read straight off the primary key
+        plan = ' '.join(row[3] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT metric, bucket, value FROM rollups
+            WHERE metric IN (?) AND grain = ? AND key = ? AND bucket BETWEEN ? AND ?
+        ''', ['revenue', 'month', 0, '2024-01', '2024-12']))
+        assert 'PRIMARY KEY' in plan, plan
+        conn.close()
+        print("✅ Rollups maintained incrementally and gap-filled")
+
+if __name__ == '__main__':
+    test_rollups()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test script for compact row shapes
+"""
+
+import os
+import sys
+import sqlite3
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.rows import fetch_records, fetch_tuples, fetch_columns
+
+def sample_connection():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE items (id INTEGER, name TEXT, count INTEGER)')
+    conn.executemany('INSERT INTO items VALUES (?, ?, ?)', [(1, 'Tomato', 3), (2, 'Onion', 5)])
+    return conn
+
+def test_records():
+    """Records read like sqlite3.Row by name, attribute and index"""
+    conn = sample_connection()
+    rows = fetch_records(conn, 'SELECT id, name, count, COUNT(*) OVER () FROM items ORDER BY id')
+    first = rows[0]
+    assert first['name'] == first.name == first[1] == 'Tomato'
+    assert first.count == 3
+    assert first['COUNT(*) OVER ()'] == 2
+    assert dict(first) == {'id': 1, 'name': 'Tomato', 'count': 3, 'COUNT(*) OVER ()': 2}
+    assert not hasattr(first, '__dict__')
+    assert fetch_records(conn, 'SELECT * FROM items WHERE id = ?', (9,)) == []
+    print("✅ Records work")
+
+def test_tuples_and_columns():
+    """Tuples come with a column map; columns come back as one list per column"""
+    conn = sample_connection()
+    columns, rows = fetch_tuples(conn, 'SELECT id, name FROM items ORDER BY id')
+    assert columns == {'id': 0, 'name': 1}
+    assert rows == [(1, 'Tomato'), (2, 'Onion')]
+
+    assert fetch_columns(conn, 'SELECT name, count FROM items ORDER BY id') == \
+        {'name': ['Tomato', 'Onion'], 'count': [3, 5]}
+    assert fetch_columns(conn, 'SELECT name FROM items WHERE 0') == {'name': []}
+    print("✅ Tuples and columns work")
+
+if __name__ == '__main__':
+    test_records()
+    test_tuples_and_columns()
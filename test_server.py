@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the pre-fork production launcher
+"""
+
+import os
+import re
+import sys
+import signal
+import subprocess
+import urllib.request
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import database, server
+from conftest import temp_database
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def test_settings_cache():
+    """Settings are read once per process and refreshed by update_setting"""
+    from app import app
+
+    with temp_database():
+        try:
+            phases = server.warm_up(app)
+            assert [phase[0] for phase in phases] == ['database', 'settings', 'templates']
+
+            conn = database.get_db_connection()
+            conn.execute("INSERT OR REPLACE INTO site_settings (key, value) VALUES ('delivery_charge', '50')")
+            conn.commit()
+            assert database.get_setting('delivery_charge') == '50'
+
+            # Direct writes wait for the TTL; update_setting is seen straight away
+            conn.execute("UPDATE site_settings SET value = '60' WHERE key = 'delivery_charge'")
+            conn.commit()
+            conn.close()
+            assert database.get_setting('delivery_charge') == '50'
+            database.update_setting('delivery_charge', '70')
+            assert database.get_setting('delivery_charge') == '70'
+            assert database.get_setting('missing', 'default') == 'default'
+            print("✅ Site settings are cached per process")
+        finally:
+            database.clear_settings()
+
+def test_profiler_in_forked_worker():
+    """A worker forked after the master profiled requests still records samples of its own"""
+    from app import app
+    from modules import profiler
+
+    with temp_database():
+        previous = profiler.settings()
+        try:
+            profiler.configure(enabled=True, rate=1.0, interval_ms=1)
+            client = app.test_client()
+            client.get('/auth/login')
+
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    profiler.reset()
+                    child = app.test_client()
+                    for _ in range(200):
+                        child.get('/auth/login')
+                        if any(summary['samples'] for _, summary in profiler.profiles()):
+                            code = 0
+                            break
+                finally:
+                    os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0, 'forked worker recorded no samples'
+            print("✅ Profiler samples in forked workers")
+        finally:
+            profiler.configure(enabled=previous['enabled'], rate=previous['rate'],
+                               interval_ms=previous['interval_ms'])
+
+def test_serve_reload():
+    """Workers answer on the shared socket, survive a SIGHUP reload and drain on SIGTERM"""
+    with temp_database() as path:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', TEMPLATE_WARMUP='0')
+        code = 'from app import app; from modules import server; server.Arbiter(app, "127.0.0.1", 0, 2, 5).run()'
+        process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            def wait_for(pattern):
+                for line in process.stdout:
+                    match = re.search(pattern, line)
+                    if match:
+                        return match
+                raise AssertionError(f'launcher exited before printing {pattern!r}')
+
+            port = wait_for(r'Serving on http://127\.0\.0\.1:(\d+)').group(1)
+            started = wait_for(r'Started in \d+ ms: (.*)').group(1)
+            for phase in ('bind', 'database', 'settings', 'templates', 'workers'):
+                assert phase in started, started
+
+            url = f'http://127.0.0.1:{port}/auth/login'
+            assert urllib.request.urlopen(url).status == 200
+            process.send_signal(signal.SIGHUP)
+            wait_for(r'Reloaded in')
+            assert urllib.request.urlopen(url).status == 200
+
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=20) == 0
+            print("✅ Launcher serves, reloads and stops cleanly")
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+
+if __name__ == '__main__':
+    test_settings_cache()
+    test_profiler_in_forked_worker()
+    test_serve_reload()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for server-side sessions and the user cache
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from modules import database, passwords, sessions
+from conftest import temp_database
+
+def session_rows(conn):
+    return conn.execute('SELECT user_id, user_stamp FROM sessions').fetchall()
+
+def test_server_sessions():
+    """Approval and deactivation apply on the next request, without signing in again"""
+    from app import app
+
+    with temp_database():
+        previous = passwords.settings()
+        try:
+            passwords.configure(method='pbkdf2:sha256:1000', workers=0)
+            conn = database.get_db_connection(row_factory=None)
+            conn.execute('''
+                INSERT INTO users (id, username, email, password_hash, user_type, full_name, is_approved)
+                VALUES (11, 'farmer', 'farmer@example.com', ?, 'farmer', 'Farmer', 0)
+            ''', (generate_password_hash('secret1', 'pbkdf2:sha256:1000'),))
+            conn.commit()
+
+            client = app.test_client()
+            client.get('/auth/login')
+            anonymous = client.get_cookie('session')
+            response = client.post('/auth/login', data={'username_or_email': 'farmer', 'password': 'secret1'})
+            assert response.status_code == 302
+
+            # The cookie holds a fresh opaque id; the data stays in the database
+            cookie = client.get_cookie('session').value
+            assert anonymous is None or anonymous.value != cookie
+            assert conn.execute('SELECT user_id FROM sessions WHERE id = ?', (cookie,)).fetchone() == (11,)
+
+            assert client.get('/farmer/dashboard').status_code == 302
+
+            # Approval is picked up by the next request through the bumped stamp
+            stamp = session_rows(conn)[0][1]
+            conn.execute('UPDATE users SET is_approved = 1 WHERE id = 11')
+            conn.commit()
+            assert session_rows(conn) == [(11, stamp + 1)]
+            assert client.get('/farmer/dashboard').status_code == 200
+
+            # Later requests take the user from the cache
+            hits = sessions.cache_info().hits
+            assert client.get('/farmer/products').status_code == 200
+            assert sessions.cache_info().hits == hits + 1
+
+            # Deactivation signs the farmer out everywhere
+            conn.execute('UPDATE users SET is_active = 0 WHERE id = 11')
+            conn.commit()
+            assert session_rows(conn) == []
+            response = client.get('/farmer/dashboard')
+            assert response.status_code == 302 and '/auth/login' in response.headers['Location']
+
+            conn.execute('UPDATE users SET is_active = 1 WHERE id = 11')
+            conn.commit()
+            client.post('/auth/login', data={'username_or_email': 'farmer', 'password': 'secret1'})
+            assert len(session_rows(conn)) == 1
+            client.get('/auth/logout')
+            assert [row[0] for row in session_rows(conn)] == [None]
+            conn.close()
+            print("✅ Server-side sessions follow the user's row")
+        finally:
+            passwords.configure(method=previous['method'], workers=previous['workers'],
+                                queue=previous['queue'], start_method=previous['start_method'])
+
+if __name__ == '__main__':
+    test_server_sessions()